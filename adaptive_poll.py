@@ -0,0 +1,76 @@
+import math
+import time
+
+# --- Configuration ---
+
+DEFAULT_MIN_INTERVAL = 2        # Seconds; never poll faster than this, however close the level
+DEFAULT_MAX_INTERVAL = 300      # Seconds; never wait longer than this, however quiet the market
+DEFAULT_SAFETY_SIGMAS = 3.0     # Wake up before a move this many standard deviations large could reach a level
+DEFAULT_ANNUAL_VOL = 0.6        # Prior volatility (annualised) until enough ticks have been seen
+VOL_HALFLIFE_TICKS = 30         # EWMA half-life of the per-second variance estimate
+SECONDS_PER_YEAR = 365 * 86400
+
+# --- Adaptive Poller ---
+
+class AdaptivePoller:
+    """Picks the wait before the next price poll from how far the nearest armed level is.
+
+    Volatility is tracked as an EWMA of squared log returns per second between
+    polls. A move of d (log distance) takes about (d / (k * sigma))^2 seconds to
+    become a k-sigma event, so that is how long we can sleep before the level
+    could plausibly be reached. The result is clipped to [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 safety_sigmas=DEFAULT_SAFETY_SIGMAS, annual_vol=DEFAULT_ANNUAL_VOL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.safety_sigmas = safety_sigmas
+        self.variance_per_second = annual_vol ** 2 / SECONDS_PER_YEAR
+        self.alpha = 1 - 0.5 ** (1 / VOL_HALFLIFE_TICKS)
+        self.last_price = None
+        self.last_time = None
+        self.polls = 0
+
+    def seed_volatility(self, log_returns, bar_seconds):
+        """Starts the estimate from historical bar returns (e.g. the daily klines a monitor already fetched)."""
+        returns = [r for r in log_returns if r == r]  # drop NaN
+        if len(returns) > 1:
+            self.variance_per_second = sum(r * r for r in returns) / len(returns) / bar_seconds
+
+    def observe(self, price, now=None):
+        """Feeds a polled price into the volatility estimate."""
+        now = time.time() if now is None else now
+        self.polls += 1
+        if self.last_price is not None and price > 0 and now > self.last_time:
+            r = math.log(price / self.last_price)
+            sample = r * r / (now - self.last_time)
+            self.variance_per_second += self.alpha * (sample - self.variance_per_second)
+        if price > 0:
+            self.last_price, self.last_time = price, now
+
+    def sigma_per_second(self):
+        return math.sqrt(max(self.variance_per_second, 0.0))
+
+    def next_interval(self, price, levels, rearm_bounds=None):
+        """Seconds to wait before the next poll, given the current price and the armed grid levels.
+
+        rearm_bounds is AlertGate.rearm_bounds(): the prices at which fired levels re-arm are
+        wake targets too, so a level that re-arms and is crossed again is not slept through.
+        """
+        if price is None or price <= 0:
+            return self.min_interval
+        targets = list(levels) + [bound for bound in (rearm_bounds or ()) if math.isfinite(bound)]
+        distances = [abs(math.log(level / price)) for level in targets if level > 0]
+        if not distances:
+            return self.max_interval
+        sigma = self.sigma_per_second()
+        if sigma <= 0:
+            return self.max_interval
+        wait = (min(distances) / (self.safety_sigmas * sigma)) ** 2
+        return min(self.max_interval, max(self.min_interval, wait))
+
+def armed_levels(alert_gate, buy_levels, sell_levels, key_format="{:.2f}"):
+    """Levels the alert gate would still fire for; levels waiting to re-arm cannot alert and are skipped."""
+    return ([level for level in buy_levels if alert_gate.is_armed("BUY:" + key_format.format(level))] +
+            [level for level in sell_levels if alert_gate.is_armed("SELL:" + key_format.format(level))])
@@ -0,0 +1,139 @@
+import json
+import math
+import os
+import time
+
+# --- Configuration ---
+
+DEFAULT_HYSTERESIS_PCT = 0.5    # Price must move this % back past a level before it can alert again
+DEFAULT_COOLDOWN_SECONDS = 300  # Minimum time between two alerts for the same level/side
+
+# --- State Store ---
+
+class AlertStateStore:
+    """Keeps per-level alert state, optionally persisted to a JSON file.
+
+    Only fire/re-arm transitions are written, so the file is touched once per
+    real crossing and not once per poll.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not load alert state from {path}: {e}")
+
+    def get(self, key):
+        return self.state.get(key)
+
+    def set(self, key, value):
+        self.state[key] = value
+        self.save()
+
+    def delete(self, keys):
+        removed = False
+        for key in keys:
+            removed = self.state.pop(key, None) is not None or removed
+        if removed:
+            self.save()
+
+    def keys(self):
+        return list(self.state)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save alert state to {self.path}: {e}")
+
+# --- Alert Gate ---
+
+class AlertGate:
+    """Decides whether a level alert should actually be sent.
+
+    A BUY alert fires when price is at or below its level, a SELL alert when at or
+    above. After firing, the key is disarmed until price moves back beyond the
+    hysteresis band (level * (1 + band) for BUY, level * (1 - band) for SELL), and
+    a cooldown stops repeats even if the band is crossed quickly.
+    """
+
+    def __init__(self, hysteresis_pct=DEFAULT_HYSTERESIS_PCT, cooldown_seconds=DEFAULT_COOLDOWN_SECONDS, store=None):
+        self.band = hysteresis_pct / 100.0
+        self.cooldown_seconds = cooldown_seconds
+        self.store = store if store is not None else AlertStateStore()
+        # Keys waiting to re-arm; update() only looks at these, however many levels have ever fired
+        self.disarmed = {key for key in self.store.keys() if not self.store.get(key)['armed']}
+
+    def _rearm_price(self, side, level):
+        return level * (1 + self.band) if side == 'BUY' else level * (1 - self.band)
+
+    def _maybe_rearm(self, key, entry, price):
+        if entry['armed']:
+            return entry
+        rearm_at = self._rearm_price(entry['side'], entry['level'])
+        if (entry['side'] == 'BUY' and price >= rearm_at) or (entry['side'] == 'SELL' and price <= rearm_at):
+            entry = dict(entry, armed=True)
+            self.store.set(key, entry)
+            self.disarmed.discard(key)
+        return entry
+
+    def should_alert(self, key, side, level, price, now=None):
+        """Returns True (and records the alert) if `price` triggers an armed, cooled-down level."""
+        now = time.time() if now is None else now
+        entry = self.store.get(key)
+        if entry is not None:
+            entry = self._maybe_rearm(key, entry, price)
+
+        triggered = price <= level if side == 'BUY' else price >= level
+        if not triggered:
+            return False
+        if entry is not None:
+            if not entry['armed'] or now - entry['last_alert'] < self.cooldown_seconds:
+                return False
+        self.store.set(key, {'side': side, 'level': level, 'armed': False, 'last_alert': now})
+        self.disarmed.add(key)
+        return True
+
+    def update(self, price):
+        """Re-arms every disarmed key whose hysteresis band the price has cleared."""
+        for key in list(self.disarmed):
+            self._maybe_rearm(key, self.store.get(key), price)
+
+    def rearm_bounds(self):
+        """(up, down): update() can only re-arm a level once price is >= up (BUY) or <= down (SELL)."""
+        up, down = math.inf, -math.inf
+        for key in self.disarmed:
+            entry = self.store.get(key)
+            rearm_at = self._rearm_price(entry['side'], entry['level'])
+            if entry['side'] == 'BUY':
+                up = min(up, rearm_at)
+            else:
+                down = max(down, rearm_at)
+        return up, down
+
+    def is_armed(self, key):
+        entry = self.store.get(key)
+        return entry is None or entry['armed']
+
+    def forget(self, keys):
+        """Drops state for the given keys (levels removed from the grid)."""
+        keys = list(keys)
+        self.store.delete(keys)
+        self.disarmed.difference_update(keys)
+
+    def retain(self, keys):
+        """Drops state for keys that are no longer part of the grid."""
+        keep = set(keys)
+        self.forget([key for key in self.store.keys() if key not in keep])
+
+    def reset(self):
+        self.forget(self.store.keys())
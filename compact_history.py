@@ -0,0 +1,258 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from kline_store import CLOSE, HIGH, INTERVAL_MS, INTERVAL_OFFSET_MS, LOW, OPEN, TS
+
+# --- Configuration ---
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+KLINE_COLUMNS = {'open': OPEN, 'high': HIGH, 'low': LOW, 'close': CLOSE}
+MAX_DECIMALS = 8                # Binance quotes prices with at most 8 decimals
+INT32_MAX = np.iinfo(np.int32).max
+DTYPES = ('auto', 'int32', 'float32', 'float64')
+META_FILE = 'meta.json'
+CURRENT_FILE = 'CURRENT'        # Names the generation directory holding the current columns
+
+# --- Price Encoding ---
+
+def price_decimals(prices):
+    """Fewest decimals (<= MAX_DECIMALS) that represent every price exactly as a scaled int32, or None."""
+    prices = np.asarray(prices, dtype=np.float64)
+    if not len(prices):
+        return 0
+    if not np.isfinite(prices).all():
+        return None
+    for decimals in range(MAX_DECIMALS + 1):
+        scaled = np.rint(prices * 10.0 ** decimals)
+        if np.abs(scaled).max() > INT32_MAX:
+            return None
+        if np.array_equal(scaled / 10.0 ** decimals, prices):
+            return decimals
+    return None
+
+def choose_encoding(prices, dtype='auto'):
+    """(dtype, decimals) used to store prices; decimals is None for float storage.
+
+    'auto' is lossless: scaled int32 if every price fits, float32 if every price
+    round-trips through it, float64 otherwise. Forcing 'int32' rounds to the
+    fewest decimals that fit, forcing 'float32' rounds to ~7 significant digits.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown price dtype {dtype!r} (known: {', '.join(DTYPES)})")
+    if dtype in ('auto', 'int32'):
+        decimals = price_decimals(prices)
+        if decimals is not None:
+            return 'int32', decimals
+        if dtype == 'int32':
+            if not np.isfinite(prices).all():
+                raise ValueError("Prices with NaN or inf cannot be stored as scaled int32.")
+            peak = np.abs(prices).max()
+            decimals = max(0, min(MAX_DECIMALS, int(np.floor(np.log10(INT32_MAX / max(peak, 1e-12))))))
+            return 'int32', decimals
+    if dtype == 'float32' or (dtype == 'auto' and np.array_equal(prices.astype(np.float32).astype(np.float64),
+                                                                  prices, equal_nan=True)):
+        return 'float32', None
+    return 'float64', None
+
+def encode_prices(prices, dtype, decimals):
+    prices = np.asarray(prices, dtype=np.float64)
+    if dtype == 'int32':
+        return np.rint(prices * 10.0 ** decimals).astype(np.int32)
+    return prices.astype(dtype)
+
+def decode_prices(values, decimals):
+    """Stored prices back to float64 (exactly the original values for lossless encodings)."""
+    if decimals is None:
+        return np.asarray(values, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64) / 10.0 ** decimals
+
+# --- Compact History ---
+
+class CompactHistory:
+    """OHLC history kept as an int64 epoch-ms array plus four compact price columns.
+
+    Prices are scaled int32 (or float32) where that is lossless, so a minute costs
+    24 bytes instead of the ~100+ of a kline DataFrame row. Saved as one .npy per
+    column plus meta.json, switched atomically as a set, and loaded memory-mapped;
+    slices are zero-copy views, and float64 arrays, Candles or a DataFrame are
+    only built when asked for.
+    """
+
+    def __init__(self, ts, columns, decimals=None, symbol='', interval=''):
+        self.ts = ts
+        self.columns = columns
+        self.decimals = decimals
+        self.symbol = symbol
+        self.interval = interval
+
+    @classmethod
+    def empty(cls, symbol='', interval=''):
+        return cls(np.empty(0, dtype=np.int64), {name: np.empty(0, dtype=np.float64) for name in PRICE_COLUMNS},
+                   None, symbol, interval)
+
+    @classmethod
+    def from_arrays(cls, ts, open_, high, low, close, symbol='', interval='', dtype='auto'):
+        prices = {'open': open_, 'high': high, 'low': low, 'close': close}
+        prices = {name: np.asarray(values, dtype=np.float64) for name, values in prices.items()}
+        stored_dtype, decimals = choose_encoding(np.concatenate(list(prices.values())), dtype)
+        columns = {name: encode_prices(values, stored_dtype, decimals) for name, values in prices.items()}
+        return cls(np.asarray(ts, dtype=np.int64), columns, decimals, symbol, interval)
+
+    @classmethod
+    def from_klines(cls, klines, symbol='', interval='', dtype='auto'):
+        """From (N, 6) klines (kline_store layout); volume is dropped."""
+        klines = np.asarray(klines, dtype=np.float64).reshape(-1, 6)
+        return cls.from_arrays(klines[:, TS], *(klines[:, col] for col in KLINE_COLUMNS.values()),
+                               symbol=symbol, interval=interval, dtype=dtype)
+
+    @classmethod
+    def from_dataframe(cls, df, symbol='', interval='', dtype='auto'):
+        """From a kline DataFrame (any column capitalisation); open times come from a timestamp/'Open time'
+        column or the DatetimeIndex."""
+        columns = {str(c).lower(): c for c in df.columns}
+        if 'timestamp' in columns:
+            ts = df[columns['timestamp']].to_numpy(dtype=np.int64)
+        elif 'open time' in columns:
+            ts = df[columns['open time']].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        else:
+            ts = df.index.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        return cls.from_arrays(ts, *(df[columns[name]].to_numpy(dtype=np.float64) for name in PRICE_COLUMNS),
+                               symbol=symbol, interval=interval, dtype=dtype)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, index):
+        """Row slice as a CompactHistory sharing this one's memory."""
+        if not isinstance(index, slice):
+            raise TypeError("CompactHistory only supports slicing; use price() or to_dataframe() for rows.")
+        return CompactHistory(self.ts[index], {name: values[index] for name, values in self.columns.items()},
+                              self.decimals, self.symbol, self.interval)
+
+    @property
+    def dtype(self):
+        return self.columns['close'].dtype.name
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def last_ts(self):
+        return int(self.ts[-1]) if len(self) else None
+
+    def between(self, start_ms=None, end_ms=None):
+        """Rows with start_ms <= open time < end_ms (zero-copy)."""
+        start = 0 if start_ms is None else int(np.searchsorted(self.ts, start_ms, side='left'))
+        end = len(self) if end_ms is None else int(np.searchsorted(self.ts, end_ms, side='left'))
+        return self[start:end]
+
+    def price(self, name):
+        """One price column as float64."""
+        return decode_prices(self.columns[name], self.decimals)
+
+    def ohlc(self):
+        """(open, high, low, close) as float64 arrays."""
+        return tuple(self.price(name) for name in PRICE_COLUMNS)
+
+    def resample(self, interval):
+        """Aggregates into a coarser interval on the stored values (exact for int32), aligned like kline_store."""
+        interval_ms = INTERVAL_MS[interval]
+        if not len(self):
+            return CompactHistory(self.ts[:0], dict(self.columns), self.decimals, self.symbol, interval)
+        offset = INTERVAL_OFFSET_MS.get(interval, 0)
+        ts = np.asarray(self.ts)
+        buckets = (ts - offset) // interval_ms * interval_ms + offset
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ts)] - 1
+        columns = {
+            'open': np.asarray(self.columns['open'])[starts],
+            'high': np.maximum.reduceat(self.columns['high'], starts),
+            'low': np.minimum.reduceat(self.columns['low'], starts),
+            'close': np.asarray(self.columns['close'])[ends],
+        }
+        return CompactHistory(buckets[starts], columns, self.decimals, self.symbol, interval)
+
+    def to_candles(self):
+        """range_algorithms Candles (float64), versioned by symbol, interval and last open time."""
+        from range_algorithms import Candles
+        open_, high, low, close = self.ohlc()
+        return Candles(high, low, close, open_, self.symbol, self.interval, self.last_ts())
+
+    def to_dataframe(self, index='open'):
+        """The Open/High/Low/Close DataFrame layout of kline_store.to_dataframe (without Volume)."""
+        import pandas as pd
+        open_time = pd.to_datetime(np.asarray(self.ts), unit='ms')
+        df = pd.DataFrame(dict(zip(('Open', 'High', 'Low', 'Close'), self.ohlc())), index=open_time)
+        if self.interval:
+            df['Close time'] = open_time + pd.Timedelta(milliseconds=INTERVAL_MS[self.interval] - 1)
+        if index == 'close' and self.interval:
+            df['Open time'] = open_time
+            df.index = df['Close time']
+            df.index.name = 'Date'
+        else:
+            df.index.name = 'Open time'
+        return df
+
+    def save(self, root):
+        """Writes a new generation directory under root and switches to it atomically.
+
+        The columns and meta.json go into root/gen-NNNNNN/; only then is root/CURRENT
+        replaced to name it, so a crash leaves either the old or the new set, never a
+        mix. Older generations are removed afterwards (maps other processes still hold
+        stay valid on POSIX; files that cannot be removed yet are retried next save).
+        """
+        os.makedirs(root, exist_ok=True)
+        generation = f"gen-{_current_generation(root) + 1:06d}"
+        gen_dir = os.path.join(root, generation)
+        shutil.rmtree(gen_dir, ignore_errors=True)  # left by a save that crashed before switching
+        os.makedirs(gen_dir)
+        for name, values in dict(self.columns, ts=self.ts).items():
+            np.save(os.path.join(gen_dir, f"{name}.npy"), np.asarray(values))
+        meta = {'symbol': self.symbol, 'interval': self.interval, 'dtype': self.dtype, 'decimals': self.decimals}
+        with open(os.path.join(gen_dir, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        tmp_path = os.path.join(root, f"{CURRENT_FILE}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(generation)
+        os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if name.startswith('gen-') and name != generation:
+                    shutil.rmtree(path)
+                elif name.endswith('.npy') or name == META_FILE:  # single-directory layout of older stores
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, root, mmap=True):
+        """Opens a saved history (memory-mapped by default). Raises FileNotFoundError if there is none.
+
+        Directories without CURRENT hold the columns directly; without meta.json
+        (plain float64 column files) they load as float storage.
+        """
+        mmap_mode = 'r' if mmap else None
+        data_dir = root
+        if os.path.exists(os.path.join(root, CURRENT_FILE)):
+            with open(os.path.join(root, CURRENT_FILE)) as f:
+                data_dir = os.path.join(root, f.read().strip())
+        ts = np.load(os.path.join(data_dir, 'ts.npy'), mmap_mode=mmap_mode)
+        columns = {name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode=mmap_mode) for name in PRICE_COLUMNS}
+        meta = {}
+        meta_path = os.path.join(data_dir, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        return cls(ts, columns, meta.get('decimals'), meta.get('symbol', ''), meta.get('interval', ''))
+
+def _current_generation(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip().split('-')[-1])
+    except (OSError, ValueError):
+        return 0
@@ -0,0 +1,120 @@
+import sys
+
+import numpy as np
+
+from monte_carlo import bars_to_path
+
+# --- Configuration ---
+
+MAX_CANDIDATE_GRIDS = 300       # Largest grid count the optimizer considers
+MIN_ORDER_NOTIONAL = 5.0        # Exchange minimum order value in quote currency (Binance spot: 5 USDT)
+
+# --- Crossing Index ---
+
+def turning_points(path):
+    """Local extremes of a price path (flat runs collapsed), endpoints included."""
+    path = np.asarray(path, dtype=np.float64)
+    path = path[np.r_[True, np.diff(path) != 0]]
+    if len(path) < 3:
+        return path
+    direction = np.sign(np.diff(path))
+    keep = np.r_[True, direction[1:] != direction[:-1], True]
+    return path[keep]
+
+def rainflow_cycles(points):
+    """Rainflow cycle counting (ASTM E1049). Returns (lows, highs, counts); counts are 1 or 0.5 (half cycles)."""
+    lows, highs, counts = [], [], []
+    stack = []
+    for point in points:
+        stack.append(point)
+        while len(stack) >= 3:
+            x = abs(stack[-1] - stack[-2])
+            y = abs(stack[-2] - stack[-3])
+            if x < y:
+                break
+            a, b = stack[-3], stack[-2]
+            lows.append(min(a, b))
+            highs.append(max(a, b))
+            if len(stack) == 3:
+                counts.append(0.5)
+                del stack[0]
+            else:
+                counts.append(1.0)
+                del stack[-3:-1]
+    for a, b in zip(stack[:-1], stack[1:]):
+        lows.append(min(a, b))
+        highs.append(max(a, b))
+        counts.append(0.5)
+    return np.array(lows), np.array(highs), np.array(counts)
+
+class CrossingIndex:
+    """Round-trip counts of a kline history for any evenly spaced grid.
+
+    The bars are flattened into a price path (open, extremes, close) and reduced
+    to rainflow cycles once. A grid slot buying at L and selling at L + step
+    completes one round trip for every cycle whose low reaches L and whose high
+    reaches L + step, so repeated wiggles around a single level are not counted.
+    Evaluating a grid is then a vectorized pass over the cycles.
+    """
+
+    def __init__(self, open_, high, low, close):
+        self.lows, self.highs, self.counts = rainflow_cycles(turning_points(bars_to_path(open_, high, low, close)))
+        self.num_bars = len(np.asarray(close))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(df['Open'], df['High'], df['Low'], df['Close'])
+
+    def round_trips(self, min_price, max_price, num_grids):
+        """Estimated round trips for each adjacent level pair of the grid (num_grids - 1 values)."""
+        step = (max_price - min_price) / (num_grids + 1)
+        # Level k sits at min_price + k * step (k = 1..num_grids); pair k spans levels k and k + 1
+        first = np.maximum(np.ceil((self.lows - min_price) / step), 1).astype(np.int64)
+        last = np.minimum(np.floor((self.highs - min_price) / step) - 1, num_grids - 1).astype(np.int64)
+        valid = last >= first
+        trips = np.zeros(num_grids + 1)
+        np.add.at(trips, first[valid], self.counts[valid])
+        np.add.at(trips, last[valid] + 1, -self.counts[valid])
+        return np.cumsum(trips)[1:num_grids]
+
+# --- Grid Count Optimizer ---
+
+def evaluate_grid_counts(index, min_price, max_price, capital, fee_pct, candidates):
+    """Expected net profit of each candidate grid count over the indexed history.
+
+    Capital is split evenly over the levels; each round trip between adjacent
+    levels earns (step / lower level - 2 * fee) on that level's share.
+    Returns a dict of arrays: num_grids, round_trips, net_profit, per_level.
+    """
+    candidates = np.asarray(candidates, dtype=np.int64)
+    fee = fee_pct / 100.0
+    round_trips = np.zeros(len(candidates))
+    net_profit = np.zeros(len(candidates))
+    for i, num_grids in enumerate(candidates):
+        step = (max_price - min_price) / (num_grids + 1)
+        lower_levels = min_price + step * np.arange(1, num_grids)
+        trips = index.round_trips(min_price, max_price, num_grids)
+        round_trips[i] = trips.sum()
+        net_profit[i] = (trips * (step / lower_levels - 2 * fee)).sum() * capital / num_grids
+    return {'num_grids': candidates, 'round_trips': round_trips, 'net_profit': net_profit,
+            'per_level': capital / candidates}
+
+def optimize_grid_count(index, min_price, max_price, capital, fee_pct,
+                        max_grids=MAX_CANDIDATE_GRIDS, min_order_notional=MIN_ORDER_NOTIONAL):
+    """Grid count with the highest expected net profit whose per-level order still meets the minimum notional.
+
+    Returns (num_grids, evaluation dict for the chosen count), or (None, None) if no count is profitable.
+    """
+    if not all([min_price, max_price]) or min_price <= 0 or min_price >= max_price or capital <= 0:
+        print("Invalid inputs for grid count optimization.", file=sys.stderr)
+        return None, None
+    most = min(max_grids, int(capital // min_order_notional))
+    if most < 2:
+        print(f"Capital {capital:.2f} is too small for two orders of {min_order_notional} each.", file=sys.stderr)
+        return None, None
+    result = evaluate_grid_counts(index, min_price, max_price, capital, fee_pct, np.arange(2, most + 1))
+    best = int(np.argmax(result['net_profit']))
+    if result['net_profit'][best] <= 0:
+        print("No grid count is expected to be profitable after fees on this history.", file=sys.stderr)
+        return None, None
+    return int(result['num_grids'][best]), {key: value[best] for key, value in result.items()}
@@ -0,0 +1,258 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+import requests
+
+# --- Configuration ---
+
+# GRID_DATA_SOURCE=live|record|replay selects the backend used by every script's HTTP and ccxt calls
+DATA_SOURCE_ENV = 'GRID_DATA_SOURCE'
+FIXTURE_DIR_ENV = 'GRID_FIXTURE_DIR'
+REPLAY_LATENCY_ENV = 'GRID_REPLAY_LATENCY_MS'   # a number of ms, or 'recorded' to replay the measured latency
+DEFAULT_FIXTURE_DIR = 'fixtures'
+# Query parameters derived from the wall clock (kline windows, signed requests); left out of fixture keys
+# so a recording still matches when it is replayed later, with repeated calls served in recorded order
+VOLATILE_PARAMS = {'startTime', 'endTime', 'timestamp', 'recvWindow', 'signature'}
+
+# --- Responses ---
+
+class ReplayMiss(requests.exceptions.ConnectionError):
+    """No recording for a request; subclasses a requests error so existing handlers treat it as a network failure."""
+
+class FixtureResponse:
+    """The subset of requests.Response the scripts use, built from a recorded entry."""
+
+    def __init__(self, url, status_code, body, elapsed_ms=0.0):
+        self.url = url
+        self.status_code = status_code
+        self.text = body
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+def request_key(method, url, params=None):
+    """Stable fixture key: method plus URL with query parameters merged and sorted, minus VOLATILE_PARAMS.
+
+    Returns (key, canonical request); the canonical form keeps every parameter for messages and recordings.
+    """
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query) + [(k, str(v)) for k, v in (params or {}).items()])
+    base = f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?"
+    stable = base + urlencode([(k, v) for k, v in query if k not in VOLATILE_PARAMS])
+    return hashlib.sha1(stable.encode()).hexdigest()[:20], base + urlencode(query)
+
+# --- Fixture Files ---
+
+class FixtureStore:
+    """Recorded entries, one gzip JSON file per call: <key>-<seq>.json.gz.
+
+    Repeated calls to the same request (price polling) are stored in order and
+    replayed in order, so a recorded session is reproduced call for call.
+    """
+
+    def __init__(self, fixture_dir=DEFAULT_FIXTURE_DIR):
+        self.fixture_dir = fixture_dir
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._index = None
+
+    def _path(self, key, seq):
+        return os.path.join(self.fixture_dir, f"{key}-{seq:06d}.json.gz")
+
+    def _load_index(self):
+        index = {}
+        if os.path.isdir(self.fixture_dir):
+            for name in os.listdir(self.fixture_dir):
+                if name.endswith('.json.gz') and '-' in name:
+                    key = name.split('-', 1)[0]
+                    index.setdefault(key, []).append(name)
+        return {key: sorted(names) for key, names in index.items()}
+
+    def append(self, key, entry):
+        with self._lock:
+            if key not in self._counts:
+                if self._index is None:
+                    os.makedirs(self.fixture_dir, exist_ok=True)
+                    self._index = self._load_index()
+                self._counts[key] = len(self._index.get(key, []))
+            seq = self._counts[key]
+            self._counts[key] = seq + 1
+        with gzip.open(self._path(key, seq), 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+
+    def entries(self, key):
+        """Names of the recorded files for a key, in call order."""
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return self._index.get(key, [])
+
+    def read(self, name):
+        with gzip.open(os.path.join(self.fixture_dir, name), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+# --- Backends ---
+
+class LiveSource:
+    """Plain HTTP through a shared requests session."""
+
+    name = 'live'
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def get(self, url, params=None, timeout=10):
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def call(self, key_parts, func):
+        return func()
+
+class RecordingSource(LiveSource):
+    """Live requests whose responses (including HTTP errors) are also written to the fixture store."""
+
+    name = 'record'
+
+    def __init__(self, fixture_dir=DEFAULT_FIXTURE_DIR):
+        super().__init__()
+        self.store = FixtureStore(fixture_dir)
+
+    def get(self, url, params=None, timeout=10):
+        started = time.perf_counter()
+        response = super().get(url, params, timeout)
+        key, canonical = request_key('GET', url, params)
+        self.store.append(key, {'request': canonical, 'status': response.status_code, 'body': response.text,
+                                'elapsed_ms': (time.perf_counter() - started) * 1000})
+        return response
+
+    def call(self, key_parts, func):
+        started = time.perf_counter()
+        result = func()
+        key, canonical = request_key('CALL', 'ccxt://' + '/'.join(key_parts))
+        self.store.append(key, {'request': canonical, 'result': result,
+                                'elapsed_ms': (time.perf_counter() - started) * 1000})
+        return result
+
+class ReplaySource:
+    """Serves recorded responses without touching the network.
+
+    Each request key replays its recordings in order and then keeps returning the
+    last one. latency_ms adds a fixed delay per call; 'recorded' sleeps for the
+    latency measured while recording.
+    """
+
+    name = 'replay'
+
+    def __init__(self, fixture_dir=DEFAULT_FIXTURE_DIR, latency_ms=None):
+        self.store = FixtureStore(fixture_dir)
+        self.latency_ms = latency_ms
+        self._positions = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _next(self, key, canonical):
+        names = self.store.entries(key)
+        if not names:
+            raise ReplayMiss(f"No recorded response for {canonical} in {self.store.fixture_dir}")
+        with self._lock:
+            pos = self._positions.get(key, 0)
+            self._positions[key] = pos + 1
+        name = names[min(pos, len(names) - 1)]
+        entry = self._cache.get(name)
+        if entry is None:
+            entry = self._cache[name] = self.store.read(name)
+        delay = entry.get('elapsed_ms', 0.0) if self.latency_ms == 'recorded' else self.latency_ms
+        if delay:
+            time.sleep(delay / 1000.0)
+        return entry
+
+    def get(self, url, params=None, timeout=10):
+        key, canonical = request_key('GET', url, params)
+        entry = self._next(key, canonical)
+        return FixtureResponse(canonical, entry['status'], entry['body'], entry.get('elapsed_ms', 0.0))
+
+    def call(self, key_parts, func):
+        key, canonical = request_key('CALL', 'ccxt://' + '/'.join(key_parts))
+        return self._next(key, canonical)['result']
+
+    def rewind(self):
+        with self._lock:
+            self._positions.clear()
+
+# --- Active Source ---
+
+def create_source(kind=None, fixture_dir=None, latency_ms=None):
+    """Builds a backend from arguments or the GRID_DATA_SOURCE / GRID_FIXTURE_DIR / GRID_REPLAY_LATENCY_MS variables."""
+    kind = (kind or os.getenv(DATA_SOURCE_ENV) or 'live').lower()
+    fixture_dir = fixture_dir or os.getenv(FIXTURE_DIR_ENV) or DEFAULT_FIXTURE_DIR
+    if kind == 'live':
+        return LiveSource()
+    if kind == 'record':
+        return RecordingSource(fixture_dir)
+    if kind == 'replay':
+        if latency_ms is None:
+            latency_ms = os.getenv(REPLAY_LATENCY_ENV) or None
+        if latency_ms not in (None, 'recorded'):
+            latency_ms = float(latency_ms)
+        return ReplaySource(fixture_dir, latency_ms)
+    raise ValueError(f"Unknown data source '{kind}' (use 'live', 'record' or 'replay').")
+
+_source = None
+
+def get_source():
+    global _source
+    if _source is None:
+        _source = create_source()
+    return _source
+
+def set_source(source):
+    """Installs a backend for the whole process (e.g. a ReplaySource in a benchmark)."""
+    global _source
+    _source = source
+
+def http_get(url, params=None, timeout=10):
+    """Drop-in for requests.get(url, params=..., timeout=...) routed through the active backend."""
+    return get_source().get(url, params=params, timeout=timeout)
+
+# --- ccxt ---
+
+class RecordedExchange:
+    """Proxy for a ccxt exchange whose method calls go through the active backend.
+
+    In replay mode the wrapped exchange is never called (it may be None), so a
+    recorded trading session can be rerun offline.
+    """
+
+    def __init__(self, exchange, name='binance', source=None):
+        self._exchange = exchange
+        self._name = name
+        self._source = source
+
+    def __getattr__(self, attr):
+        target = getattr(self._exchange, attr, None) if self._exchange is not None else None
+        if target is not None and not callable(target):
+            return target
+
+        def method(*args, **kwargs):
+            key_parts = (self._name, attr, json.dumps([args, kwargs], sort_keys=True, default=str))
+            return (self._source or get_source()).call(key_parts, lambda: getattr(self._exchange, attr)(*args, **kwargs))
+        return method
+
+def wrap_exchange(exchange, name='binance'):
+    """Returns the exchange itself for live runs and a recording/replaying proxy otherwise."""
+    if get_source().name == 'live':
+        return exchange
+    return RecordedExchange(exchange, name)
@@ -0,0 +1,246 @@
+import copy
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from data_sources import http_get
+
+# --- Configuration ---
+
+EXCHANGE_INFO_API_URL = "https://api.binance.com/api/v3/exchangeInfo"
+EXCHANGE_INFO_CACHE_FILE = '.exchange_info_cache.json'
+EXCHANGE_INFO_MAX_AGE_SECONDS = 86400  # Filters rarely change; refetch a symbol's entry after this long
+FAILED_LOOKUP_RETRY_SECONDS = 300     # A symbol whose filters could not be loaded is not re-requested sooner than this
+ROUNDING_EPSILON = 1e-9                # Absorbs float noise (e.g. 0.3 / 0.1) before floor/ceil to whole ticks
+
+# --- Symbol Filters ---
+
+class SymbolFilters:
+    """A symbol's price/quantity filters, with prices and sizes as integer multiples of tickSize/stepSize.
+
+    Tick and step counts are NumPy int64 arrays: equality, hashing and set or
+    dict lookups are exact, and turning them back into prices or order strings
+    never reintroduces float drift.
+    """
+
+    def __init__(self, symbol, tick_size, step_size, min_qty=0, min_notional=0):
+        self.symbol = symbol
+        self.tick_size = Decimal(str(tick_size)).normalize()
+        self.step_size = Decimal(str(step_size)).normalize()
+        self.tick = float(self.tick_size)
+        self.step = float(self.step_size)
+        self.min_qty = float(min_qty)
+        self.min_notional = float(min_notional)
+        self.price_decimals = max(0, -self.tick_size.as_tuple().exponent)
+        self.qty_decimals = max(0, -self.step_size.as_tuple().exponent)
+
+    @classmethod
+    def from_binance(cls, symbol_info):
+        """Builds the filters from one entry of exchangeInfo's 'symbols' list."""
+        filters = {f['filterType']: f for f in symbol_info['filters']}
+        notional = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL') or {}
+        return cls(symbol_info['symbol'], filters['PRICE_FILTER']['tickSize'], filters['LOT_SIZE']['stepSize'],
+                   filters['LOT_SIZE'].get('minQty', 0), notional.get('minNotional', 0))
+
+    def to_dict(self):
+        return {'symbol': self.symbol, 'tick_size': str(self.tick_size), 'step_size': str(self.step_size),
+                'min_qty': self.min_qty, 'min_notional': self.min_notional}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['symbol'], data['tick_size'], data['step_size'], data['min_qty'], data['min_notional'])
+
+    # Prices
+    def price_to_ticks(self, prices, rounding='nearest'):
+        """Prices as int64 tick counts; rounding is 'nearest', 'down' (never above the price) or 'up'."""
+        ticks = np.asarray(prices, dtype=np.float64) / self.tick
+        if rounding == 'down':
+            ticks = np.floor(ticks + ROUNDING_EPSILON)
+        elif rounding == 'up':
+            ticks = np.ceil(ticks - ROUNDING_EPSILON)
+        else:
+            ticks = np.rint(ticks)
+        return ticks.astype(np.int64)
+
+    def ticks_to_price(self, ticks):
+        return np.round(np.asarray(ticks, dtype=np.int64) * self.tick, self.price_decimals)
+
+    def format_price(self, tick):
+        """Exact decimal string for one tick count (what the exchange expects in an order)."""
+        return f"{Decimal(int(tick)) * self.tick_size:.{self.price_decimals}f}"
+
+    # Quantities
+    def qty_to_steps(self, quantities):
+        """Quantities as int64 step counts, always rounded down (never more than the balance allows)."""
+        return np.floor(np.asarray(quantities, dtype=np.float64) / self.step + ROUNDING_EPSILON).astype(np.int64)
+
+    def steps_to_qty(self, steps):
+        return np.round(np.asarray(steps, dtype=np.int64) * self.step, self.qty_decimals)
+
+    def format_qty(self, steps):
+        return f"{Decimal(int(steps)) * self.step_size:.{self.qty_decimals}f}"
+
+    def min_steps(self, price_ticks):
+        """Smallest order size (in steps) at each price that passes both minQty and minNotional."""
+        prices = self.ticks_to_price(price_ticks)
+        by_notional = np.ceil(self.min_notional / (np.maximum(prices, self.tick) * self.step) - ROUNDING_EPSILON)
+        by_qty = np.ceil(self.min_qty / self.step - ROUNDING_EPSILON)
+        return np.maximum(by_notional, by_qty).astype(np.int64)
+
+    def valid_orders(self, price_ticks, qty_steps):
+        """Boolean mask of orders the exchange would accept (positive size meeting minQty and minNotional)."""
+        qty_steps = np.asarray(qty_steps, dtype=np.int64)
+        return (qty_steps > 0) & (qty_steps >= self.min_steps(price_ticks))
+
+# --- Tick Levels ---
+
+class TickLevels:
+    """Sorted, de-duplicated grid levels in ticks, with O(1) membership and O(log n) crossing queries."""
+
+    def __init__(self, filters, prices):
+        self.filters = filters
+        self.ticks = np.unique(filters.price_to_ticks(prices))
+        self.index = {int(tick): i for i, tick in enumerate(self.ticks)}
+        self.prices = filters.ticks_to_price(self.ticks)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def __contains__(self, tick):
+        return int(tick) in self.index
+
+    def crossed_down(self, last_tick, tick):
+        """Levels L with last > L >= current (price fell onto or through them)."""
+        return self.ticks[np.searchsorted(self.ticks, tick, 'left'):np.searchsorted(self.ticks, last_tick, 'left')]
+
+    def crossed_up(self, last_tick, tick):
+        """Levels L with last < L <= current (price rose onto or through them)."""
+        return self.ticks[np.searchsorted(self.ticks, last_tick, 'right'):np.searchsorted(self.ticks, tick, 'right')]
+
+    def key(self, side, tick):
+        """Alert key for a level, e.g. 'BUY:70397.75'; exact because it comes from the tick count."""
+        return f"{side}:{self.filters.format_price(tick)}"
+
+# --- Cached exchangeInfo ---
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(path, cache):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save exchange info cache {path}: {e}", file=sys.stderr)
+
+_filters = {}
+_failed_at = {}  # symbol -> time.monotonic() of its last failed lookup
+
+def load_symbol_filters(symbol, cache_path=EXCHANGE_INFO_CACHE_FILE, max_age_seconds=EXCHANGE_INFO_MAX_AGE_SECONDS):
+    """Filters for `symbol`: from memory, then the on-disk cache, then one exchangeInfo request.
+
+    A stale cache entry is still used if the request fails. Returns None if neither is available;
+    the failure is remembered, so callers are not held up by the same request again for a while.
+    """
+    return load_filters_for_symbols([symbol], cache_path, max_age_seconds).get(symbol)
+
+def load_filters_for_symbols(symbols, cache_path=EXCHANGE_INFO_CACHE_FILE, max_age_seconds=EXCHANGE_INFO_MAX_AGE_SECONDS):
+    """Filters for many symbols, with one exchangeInfo request for those missing or stale in the cache
+    (plus one unfiltered request if the exchange rejects the list because a symbol is invalid).
+
+    Returns {symbol: SymbolFilters}; symbols with neither a cache entry nor a response are left out,
+    and are not requested again for FAILED_LOOKUP_RETRY_SECONDS.
+    """
+    result = {symbol: _filters[symbol] for symbol in symbols if symbol in _filters}
+    now_monotonic = time.monotonic()
+    missing = [symbol for symbol in symbols if symbol not in result
+               and now_monotonic - _failed_at.get(symbol, -FAILED_LOOKUP_RETRY_SECONDS) >= FAILED_LOOKUP_RETRY_SECONDS]
+    if not missing:
+        return result
+    cache = _load_cache(cache_path) if cache_path else {}
+    now = time.time()
+    stale = [s for s in missing if s not in cache or now - cache[s].get('fetched_at', 0) > max_age_seconds]
+    if stale:
+        try:
+            params = {'symbol': stale[0]} if len(stale) == 1 else {'symbols': json.dumps(stale, separators=(',', ':'))}
+            response = http_get(EXCHANGE_INFO_API_URL, params=params, timeout=10)
+            if response.status_code == 400 and len(stale) > 1:
+                # One invalid symbol fails the whole list; the unfiltered exchangeInfo (one request, same
+                # weight) lists every valid symbol, so only the invalid ones end up without filters
+                response = http_get(EXCHANGE_INFO_API_URL, timeout=30)
+            response.raise_for_status()
+            wanted = set(stale)
+            for symbol_info in response.json()['symbols']:
+                if symbol_info['symbol'] in wanted:
+                    filters = SymbolFilters.from_binance(symbol_info)
+                    cache[filters.symbol] = dict(filters.to_dict(), fetched_at=now)
+            unknown = [symbol for symbol in stale if symbol not in cache]
+            if unknown:
+                print(f"Unknown symbols (no exchange filters): {', '.join(unknown)}", file=sys.stderr)
+            if cache_path:
+                _save_cache(cache_path, cache)
+        except Exception as e:
+            print(f"Error fetching exchange filters for {', '.join(stale)}: {e}", file=sys.stderr)
+    for symbol in missing:
+        if symbol in cache:
+            _filters[symbol] = result[symbol] = SymbolFilters.from_dict(cache[symbol])
+            _failed_at.pop(symbol, None)
+        else:
+            _failed_at[symbol] = now_monotonic
+    return result
+
+# --- Plans ---
+
+def snap_plan(plan, filters):
+    """A GridPlan rounded to what the exchange accepts.
+
+    BUY prices round down and SELL prices round up, so no level is worse
+    than planned. Sizes round down to whole steps, and rows that then fail
+    minQty/minNotional are dropped (with a warning).
+    """
+    is_buy = plan.is_buy
+    price_ticks = np.where(is_buy, filters.price_to_ticks(plan.price, 'down'), filters.price_to_ticks(plan.price, 'up'))
+    prices = filters.ticks_to_price(price_ticks)
+    # BUY rows are sized by the quote they spend, SELL rows by the base they sell
+    base = np.where(is_buy, plan.quote_qty / np.maximum(prices, filters.tick), plan.base_qty)
+    qty_steps = filters.qty_to_steps(base)
+    valid = filters.valid_orders(price_ticks, qty_steps)
+    if (~valid).any():
+        print(f"Dropped {int((~valid).sum())} of {len(plan)} levels below {filters.symbol}'s minimum order "
+              f"({filters.min_notional:g} notional, {filters.min_qty:g} quantity).", file=sys.stderr)
+    base_qty = filters.steps_to_qty(qty_steps)
+    return type(plan)(plan.side[valid], prices[valid], base_qty[valid], (base_qty * prices)[valid],
+                      plan.base_asset, plan.quote_asset)
+
+def snap_batch_plan(batch, filters):
+    """A BatchGridPlan rounded the way snap_plan rounds a single account's plan.
+
+    The shared levels are snapped once; each account's order sizes are rounded down
+    to whole steps and orders that then fail minQty/minNotional are dropped.
+    The sizes are kept as an (accounts, levels) matrix in `base_qty`.
+    """
+    is_buy = batch.is_buy
+    price_ticks = np.where(is_buy, filters.price_to_ticks(batch.levels, 'down'), filters.price_to_ticks(batch.levels, 'up'))
+    prices = filters.ticks_to_price(price_ticks)
+    base = np.where(is_buy, batch.quote_per_buy[:, None] / np.maximum(prices, filters.tick), batch.base_per_sell[:, None])
+    qty_steps = filters.qty_to_steps(base)
+    valid = filters.valid_orders(price_ticks, qty_steps)
+    dropped = (base > 0) & ~valid
+    if dropped.any():
+        print(f"Dropped {int(dropped.sum())} orders in {int(dropped.any(axis=1).sum())} of {len(batch)} accounts below "
+              f"{filters.symbol}'s minimum order ({filters.min_notional:g} notional, {filters.min_qty:g} quantity).",
+              file=sys.stderr)
+    snapped = copy.copy(batch)
+    snapped.levels = prices
+    snapped.base_qty = np.where(valid, filters.steps_to_qty(qty_steps), 0.0)
+    return snapped
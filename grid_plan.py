@@ -0,0 +1,243 @@
+import json
+import struct
+
+import numpy as np
+
+# --- Constants ---
+
+SIDE_BUY = 1
+SIDE_SELL = -1
+_MAGIC = b'GPLN'
+_HEADER = struct.Struct('<4sI')  # magic, json header length
+
+# --- Level Calculation ---
+
+def grid_levels(min_p, max_p, num_grids):
+    """Evenly spaced levels strictly inside (min_p, max_p) as a float64 array (empty on bad inputs)."""
+    if not min_p or not max_p or min_p >= max_p or not num_grids or num_grids <= 0:
+        return np.empty(0)
+    step = (max_p - min_p) / (num_grids + 1)
+    # Ensure levels don't slightly exceed bounds due to float precision
+    return np.clip(min_p + np.arange(1, num_grids + 1) * step, min_p, max_p)
+
+# --- Grid Plan ---
+
+class GridPlan:
+    """Grid actions stored as parallel numpy arrays (side, price, base qty, quote qty).
+
+    BUY rows spend quote_qty and get about base_qty; SELL rows sell base_qty for
+    about quote_qty. Iterating or indexing with an int yields the legacy per-level
+    dicts ('usdt_amount'/'btc_amount_est' for BUY, 'btc_amount'/'usdt_amount_est'
+    for SELL), so code written for the old list of dicts keeps working.
+    """
+
+    __slots__ = ('side', 'price', 'base_qty', 'quote_qty', 'base_asset', 'quote_asset')
+
+    def __init__(self, side, price, base_qty, quote_qty, base_asset='btc', quote_asset='usdt'):
+        self.side = np.asarray(side, dtype=np.int8)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.base_qty = np.asarray(base_qty, dtype=np.float64)
+        self.quote_qty = np.asarray(quote_qty, dtype=np.float64)
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+
+    @classmethod
+    def empty(cls, base_asset='btc', quote_asset='usdt'):
+        return cls(np.empty(0), np.empty(0), np.empty(0), np.empty(0), base_asset, quote_asset)
+
+    @classmethod
+    def from_levels(cls, levels, current_price, user_base, user_quote, base_asset='btc', quote_asset='usdt'):
+        """Splits levels around current_price and the balances evenly over each side.
+
+        Returns (plan, num_buy_grids, num_sell_grids). A side with no balance to
+        allocate gets no rows but is still counted, as in generate_grid_plan.
+        """
+        levels = np.sort(np.asarray(levels, dtype=np.float64))
+        is_buy = levels < current_price
+        num_buy = int(is_buy.sum())
+        num_sell = len(levels) - num_buy
+        quote_per_buy = user_quote / num_buy if num_buy > 0 and user_quote > 0 else 0.0
+        base_per_sell = user_base / num_sell if num_sell > 0 and user_base > 0 else 0.0
+
+        keep = np.where(is_buy, quote_per_buy > 0, base_per_sell > 0)
+        levels, is_buy = levels[keep], is_buy[keep]
+        side = np.where(is_buy, SIDE_BUY, SIDE_SELL)
+        base_qty = np.where(is_buy, quote_per_buy / levels, base_per_sell)
+        quote_qty = np.where(is_buy, quote_per_buy, base_per_sell * levels)
+        return cls(side, levels, base_qty, quote_qty, base_asset, quote_asset), num_buy, num_sell
+
+    @classmethod
+    def from_dicts(cls, items, base_asset='btc', quote_asset='usdt'):
+        """Builds a plan from the legacy list-of-dicts representation."""
+        base_key, quote_key = f'{base_asset}_amount', f'{quote_asset}_amount'
+        side = [SIDE_BUY if item['type'] == 'BUY' else SIDE_SELL for item in items]
+        price = [item['price'] for item in items]
+        base_qty = [item[base_key + '_est'] if item['type'] == 'BUY' else item[base_key] for item in items]
+        quote_qty = [item[quote_key] if item['type'] == 'BUY' else item[quote_key + '_est'] for item in items]
+        return cls(side, price, base_qty, quote_qty, base_asset, quote_asset)
+
+    # Views ---------------------------------------------------------
+
+    def __len__(self):
+        return len(self.price)
+
+    def _row(self, i):
+        base_key, quote_key = f'{self.base_asset}_amount', f'{self.quote_asset}_amount'
+        price, base, quote = float(self.price[i]), float(self.base_qty[i]), float(self.quote_qty[i])
+        if self.side[i] == SIDE_BUY:
+            return {'type': 'BUY', 'price': price, quote_key: quote, base_key + '_est': base}
+        return {'type': 'SELL', 'price': price, base_key: base, quote_key + '_est': quote}
+
+    def __iter__(self):
+        return (self._row(i) for i in range(len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._row(key)
+        return GridPlan(self.side[key], self.price[key], self.base_qty[key], self.quote_qty[key],
+                        self.base_asset, self.quote_asset)
+
+    def __repr__(self):
+        return (f"GridPlan({len(self)} levels: {int(self.is_buy.sum())} BUY, {int(self.is_sell.sum())} SELL, "
+                f"{self.base_asset.upper()}/{self.quote_asset.upper()})")
+
+    def to_dicts(self):
+        return list(self)
+
+    @property
+    def is_buy(self):
+        return self.side == SIDE_BUY
+
+    @property
+    def is_sell(self):
+        return self.side == SIDE_SELL
+
+    @property
+    def buys(self):
+        return self[self.is_buy]
+
+    @property
+    def sells(self):
+        return self[self.is_sell]
+
+    def totals(self):
+        """Quote to spend / base to receive on the buy side, base to sell / quote to receive on the sell side."""
+        buy, sell = self.is_buy, self.is_sell
+        return {
+            'buy_quote': float(self.quote_qty[buy].sum()),
+            'buy_base_est': float(self.base_qty[buy].sum()),
+            'sell_base': float(self.base_qty[sell].sum()),
+            'sell_quote_est': float(self.quote_qty[sell].sum()),
+        }
+
+    @property
+    def nbytes(self):
+        return self.side.nbytes + self.price.nbytes + self.base_qty.nbytes + self.quote_qty.nbytes
+
+    # Serialization -------------------------------------------------
+
+    def to_bytes(self):
+        """Compact binary form: small JSON header followed by the raw column buffers."""
+        header = json.dumps({'n': len(self), 'base': self.base_asset, 'quote': self.quote_asset}).encode()
+        return b''.join((_HEADER.pack(_MAGIC, len(header)), header, self.side.tobytes(), self.price.tobytes(),
+                         self.base_qty.tobytes(), self.quote_qty.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes; the columns are read-only views on `data` (no copy)."""
+        magic, header_len = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized GridPlan.")
+        offset = _HEADER.size
+        header = json.loads(bytes(data[offset:offset + header_len]))
+        offset += header_len
+        n = header['n']
+        side = np.frombuffer(data, dtype=np.int8, count=n, offset=offset)
+        offset += n
+        columns = [np.frombuffer(data, dtype=np.float64, count=n, offset=offset + i * 8 * n) for i in range(3)]
+        return cls(side, *columns, base_asset=header['base'], quote_asset=header['quote'])
+
+# --- Batch Plans ---
+
+class BatchGridPlan:
+    """Plans for many accounts sharing one level array.
+
+    Only the shared levels and one amount per account and side are stored: every
+    BUY level of account i spends quote_per_buy[i] and every SELL level sells
+    base_per_sell[i]. A side an account has no balance for is left empty, as in
+    GridPlan.from_levels. Full (accounts, levels) matrices are built on request only.
+    """
+
+    def __init__(self, levels, current_price, user_base, user_quote, base_asset='btc', quote_asset='usdt',
+                 account_ids=None):
+        self.levels = np.sort(np.asarray(levels, dtype=np.float64))
+        self.is_buy = self.levels < current_price
+        self.num_buy = int(self.is_buy.sum())
+        self.num_sell = len(self.levels) - self.num_buy
+        user_base = np.asarray(user_base, dtype=np.float64)
+        user_quote = np.asarray(user_quote, dtype=np.float64)
+        if user_base.shape != user_quote.shape or user_base.ndim != 1:
+            raise ValueError("Base and quote balances must be 1-D arrays of the same length.")
+        self.quote_per_buy = np.where((user_quote > 0) & (self.num_buy > 0), user_quote / max(self.num_buy, 1), 0.0)
+        self.base_per_sell = np.where((user_base > 0) & (self.num_sell > 0), user_base / max(self.num_sell, 1), 0.0)
+        self.user_base, self.user_quote = user_base, user_quote
+        self.base_asset, self.quote_asset = base_asset, quote_asset
+        self.account_ids = np.arange(len(user_base)) if account_ids is None else np.asarray(account_ids)
+        self.base_qty = None  # (accounts, levels) sizes once snapped to exchange filters (exchange_filters.snap_batch_plan)
+
+    def __len__(self):
+        return len(self.user_base)
+
+    def __getitem__(self, i):
+        """GridPlan of the i-th account (same rows generate_grid_plan would give for its balances)."""
+        if self.base_qty is not None:
+            keep = self.base_qty[i] > 0
+            levels, base = self.levels[keep], self.base_qty[i][keep]
+            return GridPlan(np.where(self.is_buy[keep], SIDE_BUY, SIDE_SELL), levels, base, base * levels,
+                            self.base_asset, self.quote_asset)
+        keep = np.where(self.is_buy, self.quote_per_buy[i] > 0, self.base_per_sell[i] > 0)
+        levels, is_buy = self.levels[keep], self.is_buy[keep]
+        return GridPlan(np.where(is_buy, SIDE_BUY, SIDE_SELL), levels,
+                        np.where(is_buy, self.quote_per_buy[i] / levels, self.base_per_sell[i]),
+                        np.where(is_buy, self.quote_per_buy[i], self.base_per_sell[i] * levels),
+                        self.base_asset, self.quote_asset)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def base_qty_matrix(self):
+        """(accounts, levels) base amounts: estimated buys on BUY levels, sells on SELL levels."""
+        if self.base_qty is not None:
+            return self.base_qty
+        return np.where(self.is_buy, self.quote_per_buy[:, None] / self.levels, self.base_per_sell[:, None])
+
+    def quote_qty_matrix(self):
+        """(accounts, levels) quote amounts: spends on BUY levels, estimated receipts on SELL levels."""
+        if self.base_qty is not None:
+            return self.base_qty * self.levels
+        return np.where(self.is_buy, self.quote_per_buy[:, None], self.base_per_sell[:, None] * self.levels)
+
+    def order_counts(self):
+        """Per-account (buy orders, sell orders) arrays; snapping can leave an account with fewer, or none."""
+        if self.base_qty is not None:
+            placed = self.base_qty > 0
+            return (placed & self.is_buy).sum(axis=1), (placed & ~self.is_buy).sum(axis=1)
+        return np.where(self.quote_per_buy > 0, self.num_buy, 0), np.where(self.base_per_sell > 0, self.num_sell, 0)
+
+    def totals(self):
+        """Per-account totals as arrays, computed without building the full matrices (unless snapped)."""
+        if self.base_qty is not None:
+            base, quote = self.base_qty, self.base_qty * self.levels
+            return {
+                'buy_quote': quote[:, self.is_buy].sum(axis=1),
+                'buy_base_est': base[:, self.is_buy].sum(axis=1),
+                'sell_base': base[:, ~self.is_buy].sum(axis=1),
+                'sell_quote_est': quote[:, ~self.is_buy].sum(axis=1),
+            }
+        buy_levels, sell_levels = self.levels[self.is_buy], self.levels[~self.is_buy]
+        return {
+            'buy_quote': self.quote_per_buy * self.num_buy,
+            'buy_base_est': self.quote_per_buy * (1.0 / buy_levels).sum(),
+            'sell_base': self.base_per_sell * self.num_sell,
+            'sell_quote_est': self.base_per_sell * sell_levels.sum(),
+        }
@@ -1,17 +1,26 @@
-import requests
 import pandas as pd
-import pandas_ta as ta
 import math
 import argparse
 from datetime import datetime, timedelta
 import sys # To exit gracefully
+from concurrent.futures import ThreadPoolExecutor
+from data_sources import http_get
+from kline_store import get_klines_dataframe
+from market_data_hub import read_hub_price
+from monte_carlo import simulate_plan_outcomes, display_simulation
+from grid_plan import GridPlan, BatchGridPlan, grid_levels
+from crossing_index import CrossingIndex, optimize_grid_count
+from exchange_filters import load_symbol_filters, snap_batch_plan, snap_plan
+from order_book import load_order_book, plan_slippage, DEFAULT_TICK_SIZE
+from range_algorithms import Candles, latest_atr, suggest_range as run_range_algorithm
 
 # --- Configuration ---
 
 # API Endpoints (Using Binance public data)
 SYMBOL = "ETHUSDT" # MODIFIED FOR ETH
 CURRENT_PRICE_API_URL = f"https://api.binance.com/api/v3/ticker/price?symbol={SYMBOL}"
-HISTORICAL_KLINE_API_URL = "https://api.binance.com/api/v3/klines"
+KLINE_BASE_INTERVAL = '1h' # Single interval downloaded for all timeframes (see kline_store.py)
+HUB_MAX_AGE_SECONDS = 10 # Use market_data_hub.py's shared-memory price if one is running and this fresh
 
 # Default User Holdings (Can be overridden by command-line args)
 DEFAULT_ETH_BALANCE = 0.02 # MODIFIED FOR ETH (Example value)
@@ -26,11 +35,26 @@ ATR_PERIOD = 14          # Period for ATR calculation (common default)
 ATR_FACTOR = 2.0         # Multiplier for ATR (adjust based on risk: lower=tighter range)
 ## Historical Range Algorithm
 HISTORICAL_LOOKBACK_DAYS = 180 # Use last 180 days within the 1-year data for range
+RANGE_ALGORITHMS = ('ATR', 'Historical') # Compared side by side with --algorithm all
+
+# Exchange Filters (tickSize/stepSize/minNotional from exchangeInfo, cached on disk)
+SNAP_TO_EXCHANGE_FILTERS = True # Round plan prices/quantities to values the exchange accepts
 
 # Grid Density Calculation Parameters
 TARGET_PROFIT_PER_GRID_PCT = 5  # Target gross profit % per grid step (before fees)
 FEE_PCT = 0                     # Estimated trading fee PER trade (e.g., 0.1%)
 
+# Outcome Simulation Parameters (--simulate)
+SIM_NUM_PATHS = 20000           # Number of simulated future price paths
+SIM_HORIZON_DAYS = 30           # Days simulated per path
+
+# Grid Count Optimization Parameters (--grid-count optimize)
+CROSSING_INDEX_INTERVAL = '1h'  # Klines the crossing index is built from (the cached base interval)
+CROSSING_LOOKBACK_DAYS = 90     # History the index covers
+
+# Batch Planning Parameters (--balances)
+BATCH_DISPLAY_ROWS = 20         # Accounts listed on screen; use --batch-output for all of them
+
 # --- Helper Functions ---
 
 def get_current_price(symbol):
@@ -38,7 +62,7 @@ def get_current_price(symbol):
     try:
         # Construct URL within the function to use the passed symbol
         price_api_url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-        response = requests.get(price_api_url, timeout=10)
+        response = http_get(price_api_url, timeout=10)
         response.raise_for_status()
         data = response.json()
         price = float(data['price'])
@@ -48,23 +72,14 @@ def get_current_price(symbol):
         return None
 
 def get_historical_data(symbol, interval, limit):
-    """Fetches historical candlestick data."""
-    params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+    """Fetches historical candlestick data (derived locally from the shared base-interval kline store)."""
     try:
-        response = requests.get(HISTORICAL_KLINE_API_URL, params=params, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        df = pd.DataFrame(data, columns=[
-            'Open time', 'Open', 'High', 'Low', 'Close', 'Volume',
-            'Close time', 'Quote asset volume', 'Number of trades',
-            'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'
-        ])
-        # Use Close time for more accurate date representation of the bar's end
-        df['Date'] = pd.to_datetime(df['Close time'], unit='ms')
+        # Only KLINE_BASE_INTERVAL bars are downloaded (and cached on disk); coarser bars are resampled locally
+        df = get_klines_dataframe(symbol, interval, limit, index='close', base_interval=KLINE_BASE_INTERVAL)
+        if df is None:
+            print(f"Error fetching historical data for {symbol}: no klines returned", file=sys.stderr)
+            return None
         num_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-        df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce')
-        df.set_index('Date', inplace=True)
-        df.sort_index(inplace=True)
         # Drop rows with NaNs potentially introduced by coercion
         df.dropna(subset=num_cols, inplace=True)
         return df
@@ -72,44 +87,58 @@ def get_historical_data(symbol, interval, limit):
         print(f"Error fetching historical data for {symbol}: {e}", file=sys.stderr)
         return None
 
+def history_candles(df):
+    """The daily history as range_algorithms Candles; indicators are cached per (symbol, interval, last candle)."""
+    return Candles.from_dataframe(df, SYMBOL, '1d')
+
 def calculate_atr(df, atr_period):
     """Calculates ATR and returns latest value."""
     if df is None or len(df) < atr_period + 1: return None
-    try:
-        atr_col_name = f'ATRr_{atr_period}'
-        # Ensure the index is a DatetimeIndex for pandas_ta
-        df.index = pd.to_datetime(df.index)
-        df.ta.atr(length=atr_period, append=True)
-
-        if atr_col_name not in df.columns or df[atr_col_name].isnull().all():
-            print(f"Could not calculate ATR column '{atr_col_name}'.", file=sys.stderr)
-            return None
-        latest_atr = df[atr_col_name].iloc[-1]
-        return latest_atr if pd.notna(latest_atr) else None
-    except Exception as e:
-        print(f"Error calculating ATR: {e}", file=sys.stderr)
-        return None
+    value = latest_atr(history_candles(df), atr_period)
+    if value is None:
+        print(f"Could not calculate ATR({atr_period}).", file=sys.stderr)
+    return value
+
+def fetch_market_data(symbol, atr_period=None, crossing_bars=None):
+    """Fetches the current price and the daily history concurrently, so the stage takes as long as the slower call.
+
+    A fresh price from a running market_data_hub.py skips the price request. The ATR is computed on the
+    history thread as soon as the klines arrive, while the price request may still be in flight, and the
+    crossing klines (--grid-count optimize) are derived from the same freshly cached base series.
+    Returns (current_price, df_history, df_crossings); each is None on failure or when not requested.
+    """
+    def history_stage():
+        df_history = get_historical_data(symbol, '1d', HISTORY_DAYS)
+        if df_history is None:
+            return None, None
+        if atr_period:
+            calculate_atr(df_history, atr_period) # Cached; suggest_range_atr reuses it
+        df_crossings = get_historical_data(symbol, CROSSING_INDEX_INTERVAL, crossing_bars) if crossing_bars else None
+        return df_history, df_crossings
+
+    hub_price = read_hub_price(symbol, HUB_MAX_AGE_SECONDS)
+    if hub_price is not None:
+        print(f"Using market data hub price for {symbol}: {hub_price:.2f}")
+        return (hub_price, *history_stage())
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        price_future = pool.submit(get_current_price, symbol)
+        history_future = pool.submit(history_stage)
+        return (price_future.result(), *history_future.result())
 
 def suggest_range_atr(df_history, current_price, atr_period, atr_factor):
     """Calculates range based on ATR around current price."""
-    latest_atr = calculate_atr(df_history, atr_period)
-    if latest_atr is None or current_price is None:
+    if df_history is None: return None, None, None
+    min_price, max_price, info = run_range_algorithm('ATR', history_candles(df_history), current_price,
+                                                     period=atr_period, factor=atr_factor)
+    if min_price is None:
         return None, None, None # Indicate failure
-
-    min_price = current_price - atr_factor * latest_atr
-    max_price = current_price + atr_factor * latest_atr
-    return min_price, max_price, latest_atr
+    return min_price, max_price, info['latest_atr']
 
 def suggest_range_historical(df_history, lookback_days):
     """Calculates range based on High/Low over the lookback period."""
-    if df_history is None or len(df_history) < lookback_days:
-        print(f"Warning: Not enough historical data ({len(df_history)} days) for lookback {lookback_days} days.", file=sys.stderr)
-        lookback_days = len(df_history) # Adjust if needed
-        if lookback_days == 0: return None, None
-
-    recent_data = df_history.iloc[-lookback_days:]
-    min_price = recent_data['Low'].min()
-    max_price = recent_data['High'].max()
+    if df_history is None or len(df_history) == 0: return None, None
+    min_price, max_price, _ = run_range_algorithm('Historical', history_candles(df_history), df_history['Close'].iloc[-1],
+                                                  lookback=lookback_days)
     return min_price, max_price
 
 def suggest_total_grids(min_price, max_price, target_profit_pct, fee_pct):
@@ -132,57 +161,208 @@ def suggest_total_grids(min_price, max_price, target_profit_pct, fee_pct):
     num_grids = math.floor((max_price - min_price) / approx_grid_step_value) - 1
     return max(1, num_grids) # Ensure at least 1 grid
 
+def suggest_range(algorithm, df_history, current_price):
+    """Range for one algorithm. Returns (min_price, max_price, algo_specific_config); the prices are None on failure."""
+    if algorithm == 'ATR':
+        min_price, max_price, latest_atr = suggest_range_atr(df_history, current_price, ATR_PERIOD, ATR_FACTOR)
+        return min_price, max_price, {'atr_period': ATR_PERIOD, 'atr_factor': ATR_FACTOR, 'latest_atr': latest_atr if latest_atr else 'N/A'}
+    min_price, max_price = suggest_range_historical(df_history, HISTORICAL_LOOKBACK_DAYS)
+    return min_price, max_price, {'hist_lookback': HISTORICAL_LOOKBACK_DAYS}
+
+def suggest_grid_count(min_price, max_price, capital, crossing_index=None):
+    """Grid count optimized on the crossing index if one is given; the target profit/grid heuristic otherwise (or if that fails)."""
+    if crossing_index is not None:
+        total_num_grids, expected = optimize_grid_count(crossing_index, min_price, max_price, capital, FEE_PCT)
+        if total_num_grids is not None:
+            print(f"Optimized grid count on {CROSSING_LOOKBACK_DAYS} days of {CROSSING_INDEX_INTERVAL} klines: {total_num_grids} grids, "
+                  f"~{expected['round_trips']:.0f} round trips, expected net profit {expected['net_profit']:.4f} USDT")
+            return total_num_grids
+        print("Grid count optimization unavailable, falling back to the target profit/grid heuristic.", file=sys.stderr)
+    return suggest_total_grids(min_price, max_price, TARGET_PROFIT_PER_GRID_PCT, FEE_PCT)
+
 def calculate_grid_levels(min_p, max_p, num_grids):
-    """Calculates the actual grid price levels."""
-    if not all([min_p, max_p]) or min_p >= max_p or num_grids <= 0:
-        return []
-    step = (max_p - min_p) / (num_grids + 1)
-    # Ensure levels don't slightly exceed bounds due to float precision
-    levels = [min(max_p, max(min_p, min_p + (i + 1) * step)) for i in range(num_grids)]
-    return sorted(levels)
-
-def generate_grid_plan(min_price, max_price, total_num_grids, current_price, user_eth, user_usdt): # MODIFIED user_eth
-    """Generates the specific buy/sell actions based on balances and levels."""
+    """Calculates the actual grid price levels (sorted float array)."""
+    return grid_levels(min_p, max_p, num_grids)
+
+def load_plan_filters():
+    """Exchange filters plans are snapped to, loaded once per run; None if snapping is off or exchangeInfo is unavailable."""
+    return load_symbol_filters(SYMBOL) if SNAP_TO_EXCHANGE_FILTERS else None
+
+def generate_grid_plan(min_price, max_price, total_num_grids, current_price, user_eth, user_usdt, filters=None): # MODIFIED user_eth
+    """Generates the specific buy/sell actions based on balances and levels.
+
+    Returns (GridPlan, num_buy_grids, num_sell_grids); iterating the plan yields the per-level dicts.
+    With `filters` (see load_plan_filters), prices and sizes are rounded to what the exchange accepts
+    and the side counts are those of the snapped plan.
+    """
     if not all([min_price, max_price, total_num_grids, current_price]):
         print("Invalid inputs for generating grid plan.", file=sys.stderr)
-        return [], 0, 0
+        return GridPlan.empty('eth'), 0, 0 # MODIFIED base_asset
 
     all_levels = calculate_grid_levels(min_price, max_price, total_num_grids)
-    if not all_levels:
+    if not len(all_levels):
         print("Failed to calculate grid levels.", file=sys.stderr)
-        return [], 0, 0
+        return GridPlan.empty('eth'), 0, 0 # MODIFIED base_asset
 
-    buy_levels = sorted([level for level in all_levels if level < current_price])
-    sell_levels = sorted([level for level in all_levels if level >= current_price])
+    grid_plan, num_buy, num_sell = GridPlan.from_levels(all_levels, current_price, user_eth, user_usdt, base_asset='eth') # MODIFIED base_asset
+    if filters is not None:
+        grid_plan = snap_plan(grid_plan, filters)
+        num_buy, num_sell = int(grid_plan.is_buy.sum()), int(grid_plan.is_sell.sum())
+    return grid_plan, num_buy, num_sell
 
-    num_buy_grids = len(buy_levels)
-    num_sell_grids = len(sell_levels)
 
-    plan_details = []
-    usdt_per_buy_grid = (user_usdt / num_buy_grids) if num_buy_grids > 0 and user_usdt > 0 else 0
-    eth_per_sell_grid = (user_eth / num_sell_grids) if num_sell_grids > 0 and user_eth > 0 else 0 # MODIFIED eth_per_sell_grid, user_eth
+def compare_algorithms(algorithms, df_history, current_price, user_eth, user_usdt, crossing_index=None, filters=None):
+    """Plans every algorithm from the same history frame and crossing index. Returns one result dict per algorithm that succeeded."""
+    capital = user_usdt + user_eth * current_price
+    results = []
+    for algorithm in algorithms:
+        min_price, max_price, algo_config = suggest_range(algorithm, df_history, current_price)
+        if min_price is None:
+            print(f"Skipping {algorithm}: failed to calculate a range.", file=sys.stderr)
+            continue
+        total_num_grids = suggest_grid_count(min_price, max_price, capital, crossing_index)
+        if total_num_grids is None:
+            print(f"Skipping {algorithm}: failed to suggest number of grids.", file=sys.stderr)
+            continue
+        plan, num_buy, num_sell = generate_grid_plan(min_price, max_price, total_num_grids, current_price, user_eth, user_usdt,
+                                                    filters)
+        results.append({'algorithm': algorithm, 'plan': plan, 'min_price': min_price, 'max_price': max_price,
+                        'total_grids': total_num_grids, 'num_buy': num_buy, 'num_sell': num_sell, **algo_config})
+    return results
+
+def load_balances(path):
+    """Reads per-account balances from a CSV or Parquet file with 'eth' and 'usdt' columns (optional 'account').
+
+    Returns (account_ids, eth_balances, usdt_balances) arrays, or None on error.
+    """
+    try:
+        df = pd.read_parquet(path) if path.lower().endswith(('.parquet', '.pq')) else pd.read_csv(path)
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        balances = df[['eth', 'usdt']].astype(float).fillna(0.0)
+        account_ids = df['account'].to_numpy() if 'account' in df.columns else df.index.to_numpy()
+        return account_ids, balances['eth'].to_numpy(), balances['usdt'].to_numpy()
+    except KeyError:
+        print(f"Balances file {path} needs 'eth' and 'usdt' columns.", file=sys.stderr)
+    except Exception as e:
+        print(f"Error reading balances file {path}: {e}", file=sys.stderr)
+    return None
+
+def generate_grid_plan_batch(min_price, max_price, total_num_grids, current_price, eth_balances, usdt_balances, account_ids=None, filters=None): # MODIFIED ETH
+    """Plans every account in one pass over a shared level array.
 
-    for level in buy_levels:
-        if usdt_per_buy_grid > 0:
-            eth_to_buy_est = usdt_per_buy_grid / level # MODIFIED eth_to_buy_est
-            plan_details.append({
-                'type': 'BUY', 'price': level,
-                'usdt_amount': usdt_per_buy_grid, 'eth_amount_est': eth_to_buy_est # MODIFIED eth_amount_est
-            })
+    Returns (BatchGridPlan, num_buy_grids, num_sell_grids), or (None, 0, 0) on invalid inputs.
+    With `filters` the plan is snapped like generate_grid_plan's, and a level counts if any account still has an order on it.
+    """
+    if not all([min_price, max_price, total_num_grids, current_price]):
+        print("Invalid inputs for generating grid plan.", file=sys.stderr)
+        return None, 0, 0
 
-    for level in sell_levels:
-        if eth_per_sell_grid > 0: # MODIFIED eth_per_sell_grid
-            usdt_to_receive_est = eth_per_sell_grid * level # MODIFIED eth_per_sell_grid
-            plan_details.append({
-                'type': 'SELL', 'price': level,
-                'eth_amount': eth_per_sell_grid, 'usdt_amount_est': usdt_to_receive_est # MODIFIED eth_amount, eth_per_sell_grid
-            })
+    all_levels = calculate_grid_levels(min_price, max_price, total_num_grids)
+    if not len(all_levels):
+        print("Failed to calculate grid levels.", file=sys.stderr)
+        return None, 0, 0
+
+    batch = BatchGridPlan(all_levels, current_price, eth_balances, usdt_balances, base_asset='eth', account_ids=account_ids) # MODIFIED ETH
+    if filters is not None:
+        batch = snap_batch_plan(batch, filters)
+        placed = (batch.base_qty > 0).any(axis=0)
+        return batch, int((placed & batch.is_buy).sum()), int((placed & ~batch.is_buy).sum())
+    return batch, batch.num_buy, batch.num_sell
+
+def batch_summary(batch):
+    """One row per account: balances, order counts, per-level amounts and side totals.
+
+    For a snapped batch the per-level amounts are the averages of the orders actually
+    placed, and accounts whose orders were all dropped show zero orders and amounts.
+    """
+    totals = batch.totals()
+    buy_orders, sell_orders = batch.order_counts()
+    summary = pd.DataFrame({
+        'account': batch.account_ids,
+        'eth': batch.user_base, 'usdt': batch.user_quote,
+        'buy_orders': buy_orders, 'sell_orders': sell_orders,
+        'usdt_per_buy': batch.quote_per_buy, 'eth_per_sell': batch.base_per_sell,
+        'buy_usdt_total': totals['buy_quote'], 'buy_eth_est': totals['buy_base_est'],
+        'sell_eth_total': totals['sell_base'], 'sell_usdt_est': totals['sell_quote_est'],
+    })
+    if batch.base_qty is not None:
+        summary['usdt_per_buy'] = (summary['buy_usdt_total'] / summary['buy_orders']).fillna(0.0)
+        summary['eth_per_sell'] = (summary['sell_eth_total'] / summary['sell_orders']).fillna(0.0)
+    return summary
+
+def display_batch_plan(batch, method_name, config, output_path=None):
+    """Prints the shared levels and a per-account summary; optionally writes the full summary to CSV/Parquet."""
+    print("\n" + "="*60)
+    print(f"--- Batch Grid Trading Plan ({method_name} Algorithm, {len(batch)} Accounts) ---")
+    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Current {config['symbol']} Price: ${config['current_price']:.2f}")
+    print(f"  Price Range: ${config['min_price']:.2f} - ${config['max_price']:.2f}")
+    print(f"  Total Grids: {config['total_grids']} (Buy: {config['num_buy']}, Sell: {config['num_sell']})")
+    print(f"  Buy Levels: {', '.join(f'{p:.2f}' for p in batch.levels[batch.is_buy])}")
+    print(f"  Sell Levels: {', '.join(f'{p:.2f}' for p in batch.levels[~batch.is_buy])}")
+    print("-"*60)
 
-    return plan_details, num_buy_grids, num_sell_grids
+    summary = batch_summary(batch)
+    print("Per Account (USDT per BUY level / ETH per SELL level):")
+    for row in summary.head(BATCH_DISPLAY_ROWS).itertuples(index=False):
+        if row.buy_orders + row.sell_orders == 0:
+            print(f"  {str(row.account):<12} | No orders")
+            continue
+        print(f"  {str(row.account):<12} | Spend ${row.usdt_per_buy:.4f} USDT x {row.buy_orders} | "
+              f"Sell {row.eth_per_sell:.8f} ETH x {row.sell_orders}")
+    if len(summary) > BATCH_DISPLAY_ROWS:
+        print(f"  ... {len(summary) - BATCH_DISPLAY_ROWS} more accounts")
+    idle = int(((summary['buy_orders'] + summary['sell_orders']) == 0).sum())
+    if idle:
+        print(f"  {idle} of {len(summary)} accounts have no orders")
+    print(f"  Totals: Spend ${summary['buy_usdt_total'].sum():.4f} USDT, Sell {summary['sell_eth_total'].sum():.8f} ETH")
+
+    if output_path:
+        try:
+            if output_path.lower().endswith(('.parquet', '.pq')):
+                summary.to_parquet(output_path, index=False)
+            else:
+                summary.to_csv(output_path, index=False)
+            print(f"  Full per-account plan written to {output_path}")
+        except Exception as e:
+            print(f"Error writing batch output {output_path}: {e}", file=sys.stderr)
+    print("="*60)
 
+def display_comparison(results, config):
+    """Prints the algorithms' plans side by side: a summary row each, then their levels in adjacent columns."""
+    print("\n" + "="*60)
+    print(f"--- Grid Trading Plan Comparison ({', '.join(r['algorithm'] for r in results)}) ---")
+    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Current {config['symbol']} Price: ${config['current_price']:.2f}")
+    print(f"Input Balances: {config['user_eth']:.8f} ETH, {config['user_usdt']:.4f} USDT")
+    print(f"Target Profit/Grid: {config['target_profit_pct']}% (Gross), Estimated Fee/Trade: {config['fee_pct']}%")
+    print("-"*60)
+    print(f"  {'Algorithm':<11} {'Price Range':>23} {'Width':>7} {'Grids':>5} {'Buy/Sell':>8} {'Spend USDT':>11} {'Sell ETH':>11}")
+    for r in results:
+        totals = r['plan'].totals()
+        width_pct = (r['max_price'] - r['min_price']) / config['current_price'] * 100
+        print(f"  {r['algorithm']:<11} {r['min_price']:>11.2f}-{r['max_price']:<11.2f} {width_pct:>6.1f}% {r['total_grids']:>5} "
+              f"{r['num_buy']:>3}/{r['num_sell']:<4} {totals['buy_quote']:>11.4f} {totals['sell_base']:>11.8f}")
+    if any('simulation' in r for r in results):
+        print("-"*60)
+        print(f"  {'Algorithm':<11} {'PnL P5':>10} {'PnL P50':>10} {'PnL P95':>10} {'P(Loss)':>8} {'P(Leave)':>9} {'Fills':>6}")
+        for r in results:
+            report = r.get('simulation')
+            if report is None:
+                continue
+            pnl = report['pnl_percentiles']
+            print(f"  {r['algorithm']:<11} {pnl[5]:>+10.4f} {pnl[50]:>+10.4f} {pnl[95]:>+10.4f} "
+                  f"{report['prob_loss']:>8.1%} {report['prob_breakout']:>9.1%} {report['mean_fills']:>6.1f}")
+    print("-"*60)
+    print("Levels (highest first):")
+    columns = [[f"{item['type']:<4} {item['price']:.2f}" for item in sorted(r['plan'], key=lambda item: -item['price'])] for r in results]
+    print("  " + "".join(f"{r['algorithm']:<22}" for r in results))
+    for i in range(max((len(c) for c in columns), default=0)):
+        print("  " + "".join(f"{(c[i] if i < len(c) else ''):<22}" for c in columns))
+    print("="*60)
 
-def display_plan(plan, method_name, config):
-    """Formats and prints the generated plan."""
+def display_plan(plan, method_name, config, slippage=None):
+    """Formats and prints the generated plan (with per-action slippage estimates in bps if given)."""
     print("\n" + "="*60)
     print(f"--- Grid Trading Plan Suggestion ({method_name} Algorithm) ---")
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -208,11 +388,12 @@ def display_plan(plan, method_name, config):
         print("  Consider adjusting parameters (e.g., wider range, different target profit) or balances.")
     else:
         print("\n  Actions:")
-        for item in plan:
+        for i, item in enumerate(plan):
+            slip = f" | Slippage ~{slippage[i]:.1f} bps" if slippage is not None and slippage[i] == slippage[i] else ""
             if item['type'] == 'BUY':
-                print(f"    BUY at ~${item['price']:<9.2f} | Spend ${item['usdt_amount']:.4f} USDT (Est. Buy {item['eth_amount_est']:.8f} ETH)") # MODIFIED eth_amount_est, ETH
+                print(f"    BUY at ~${item['price']:<9.2f} | Spend ${item['usdt_amount']:.4f} USDT (Est. Buy {item['eth_amount_est']:.8f} ETH){slip}") # MODIFIED eth_amount_est, ETH
             elif item['type'] == 'SELL':
-                print(f"    SELL at ~${item['price']:<9.2f} | Sell {item['eth_amount']:.8f} ETH (Est. Recv ${item['usdt_amount_est']:.4f} USDT)") # MODIFIED eth_amount, ETH
+                print(f"    SELL at ~${item['price']:<9.2f} | Sell {item['eth_amount']:.8f} ETH (Est. Recv ${item['usdt_amount_est']:.4f} USDT){slip}") # MODIFIED eth_amount, ETH
 
     print("\n" + "="*60)
     print("Disclaimer:")
@@ -230,17 +411,49 @@ if __name__ == "__main__":
                         help=f"Your current ETH balance (default: {DEFAULT_ETH_BALANCE})") # MODIFIED ETH, DEFAULT_ETH_BALANCE
     parser.add_argument("--usdt", type=float, default=DEFAULT_USDT_BALANCE,
                         help=f"Your current USDT balance (default: {DEFAULT_USDT_BALANCE})")
-    parser.add_argument("--algorithm", type=str, required=True, choices=['ATR', 'Historical'],
-                        help="The algorithm to use for range calculation ('ATR' or 'Historical')")
+    parser.add_argument("--algorithm", type=str, required=True, choices=[*RANGE_ALGORITHMS, 'all'],
+                        help="The algorithm to use for range calculation ('ATR', 'Historical', or 'all' to compare them side by side)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Also run a Monte Carlo simulation of the plan's outcomes")
+    parser.add_argument("--sim-paths", type=int, default=SIM_NUM_PATHS,
+                        help=f"Number of simulated price paths (default: {SIM_NUM_PATHS})")
+    parser.add_argument("--sim-horizon", type=int, default=SIM_HORIZON_DAYS,
+                        help=f"Days to simulate (default: {SIM_HORIZON_DAYS})")
+    parser.add_argument("--sim-method", type=str, default='bootstrap', choices=['bootstrap', 'gbm'],
+                        help="Path model: bootstrapped daily returns or GBM fitted to them (default: bootstrap)")
+    parser.add_argument("--grid-count", type=str, default='heuristic', choices=['heuristic', 'optimize'],
+                        help="'heuristic': spacing from the target profit/grid; 'optimize': count with the best expected net profit "
+                             "from historical level crossings (default: heuristic)")
+    parser.add_argument("--slippage", action="store_true",
+                        help="Estimate each action's slippage from one order book snapshot")
+    parser.add_argument("--balances", type=str, default=None,
+                        help="CSV or Parquet file of account balances ('eth', 'usdt', optional 'account' columns); plans every account at once")
+    parser.add_argument("--batch-output", type=str, default=None,
+                        help="With --balances: write the per-account plan to this CSV/Parquet file")
 
     args = parser.parse_args()
+    if args.algorithm == 'all' and args.balances:
+        parser.error("--balances needs a single --algorithm")
+    if args.algorithm == 'all' and args.slippage:
+        parser.error("--slippage needs a single --algorithm")
+    if args.balances and (args.slippage or args.simulate):
+        parser.error("--slippage and --simulate are not available with --balances")
+    if args.batch_output and not args.balances:
+        parser.error("--batch-output needs --balances")
+    algorithms = RANGE_ALGORITHMS if args.algorithm == 'all' else (args.algorithm,)
 
     print(f"Starting plan generation for {SYMBOL} using '{args.algorithm}' algorithm...") # MODIFIED SYMBOL
-    print(f"Input Balances - ETH: {args.eth:.8f}, USDT: {args.usdt:.4f}") # MODIFIED ETH, args.eth
+    if args.balances:
+        print(f"Input Balances - from {args.balances}")
+    else:
+        print(f"Input Balances - ETH: {args.eth:.8f}, USDT: {args.usdt:.4f}") # MODIFIED ETH, args.eth
 
-    # 1. Fetch Data
-    current_price = get_current_price(SYMBOL)
-    df_history = get_historical_data(SYMBOL, '1d', HISTORY_DAYS) # Fetch 1 year daily data
+    # 1. Fetch Data (price and history concurrently; indicators start as soon as the klines arrive)
+    current_price, df_history, df_crossings = fetch_market_data(
+        SYMBOL,
+        atr_period=ATR_PERIOD if 'ATR' in algorithms else None,
+        crossing_bars=CROSSING_LOOKBACK_DAYS * 24 if args.grid_count == 'optimize' else None,
+    )
 
     if current_price is None or df_history is None:
         print("\nFailed to fetch necessary market data. Exiting.", file=sys.stderr)
@@ -253,32 +466,72 @@ if __name__ == "__main__":
             sys.exit(1)
 
 
-    # 2. Determine Range based on chosen algorithm
-    min_price, max_price = None, None
-    algo_specific_config = {} # To store params used by the chosen algo
+    # Exchange filters the plans are snapped to, loaded once for every plan of this run
+    plan_filters = load_plan_filters()
 
-    if args.algorithm == 'ATR':
-        min_price, max_price, latest_atr = suggest_range_atr(df_history, current_price, ATR_PERIOD, ATR_FACTOR)
-        algo_specific_config = {'atr_period': ATR_PERIOD, 'atr_factor': ATR_FACTOR, 'latest_atr': latest_atr if latest_atr else 'N/A'}
-        if min_price is None:
-            print("\nFailed to calculate range using ATR algorithm. Exiting.", file=sys.stderr)
-            sys.exit(1)
-    elif args.algorithm == 'Historical':
-        min_price, max_price = suggest_range_historical(df_history, HISTORICAL_LOOKBACK_DAYS)
-        algo_specific_config = {'hist_lookback': HISTORICAL_LOOKBACK_DAYS}
-        if min_price is None:
-            print("\nFailed to calculate range using Historical algorithm. Exiting.", file=sys.stderr)
+    # Shared by every algorithm: the crossing index is built once per run
+    crossing_index = None
+    if args.grid_count == 'optimize':
+        if df_crossings is not None and len(df_crossings) > 1:
+            crossing_index = CrossingIndex.from_dataframe(df_crossings)
+        else:
+            print("Grid count optimization unavailable, falling back to the target profit/grid heuristic.", file=sys.stderr)
+
+    # 2-5 (--algorithm all). Plan every algorithm on the same data and compare them
+    if args.algorithm == 'all':
+        results = compare_algorithms(algorithms, df_history, current_price, args.eth, args.usdt, crossing_index,
+                                     plan_filters)
+        if not results:
+            print("\nEvery algorithm failed to produce a plan. Exiting.", file=sys.stderr)
             sys.exit(1)
+        if args.simulate:
+            sim_seed = int(datetime.now().timestamp() * 1e6) # Same random paths for every plan, so differences come from the plans
+            for r in results:
+                r['simulation'] = simulate_plan_outcomes(
+                    r['plan'], df_history, current_price, r['min_price'], r['max_price'],
+                    num_paths=args.sim_paths, horizon=args.sim_horizon, method=args.sim_method,
+                    fee_pct=FEE_PCT, base_asset='eth', seed=sim_seed
+                )
+        display_comparison(results, {
+            'symbol': SYMBOL, 'current_price': current_price, 'user_eth': args.eth, 'user_usdt': args.usdt,
+            'target_profit_pct': TARGET_PROFIT_PER_GRID_PCT, 'fee_pct': FEE_PCT,
+        })
+        sys.exit(0)
 
-    # 3. Suggest Total Grids
-    total_num_grids = suggest_total_grids(min_price, max_price, TARGET_PROFIT_PER_GRID_PCT, FEE_PCT)
+    # 2. Determine Range based on chosen algorithm
+    min_price, max_price, algo_specific_config = suggest_range(args.algorithm, df_history, current_price)
+    if min_price is None:
+        print(f"\nFailed to calculate range using {args.algorithm} algorithm. Exiting.", file=sys.stderr)
+        sys.exit(1)
+
+    # 3. Suggest Total Grids (optionally optimized on historical level crossings)
+    total_num_grids = suggest_grid_count(min_price, max_price, args.usdt + args.eth * current_price, crossing_index)
     if total_num_grids is None:
         print("\nFailed to suggest number of grids. Exiting.", file=sys.stderr)
         sys.exit(1)
 
+    # 4a. Batch mode: plan every account in the balances file against the same levels
+    if args.balances:
+        balances = load_balances(args.balances)
+        if balances is None:
+            sys.exit(1)
+        account_ids, eth_balances, usdt_balances = balances # MODIFIED eth_balances
+        batch, num_buy, num_sell = generate_grid_plan_batch(
+            min_price, max_price, total_num_grids, current_price, eth_balances, usdt_balances, account_ids, # MODIFIED eth_balances
+            plan_filters
+        )
+        if batch is None:
+            sys.exit(1)
+        batch_config = {
+            'symbol': SYMBOL, 'current_price': current_price, 'min_price': min_price, 'max_price': max_price,
+            'total_grids': total_num_grids, 'num_buy': num_buy, 'num_sell': num_sell,
+        }
+        display_batch_plan(batch, args.algorithm, batch_config, args.batch_output)
+        sys.exit(0)
+
     # 4. Generate the detailed plan
     grid_plan, num_buy, num_sell = generate_grid_plan(
-        min_price, max_price, total_num_grids, current_price, args.eth, args.usdt # MODIFIED args.eth
+        min_price, max_price, total_num_grids, current_price, args.eth, args.usdt, plan_filters # MODIFIED args.eth
     )
 
     # 5. Display the plan
@@ -296,4 +549,19 @@ if __name__ == "__main__":
         'fee_pct': FEE_PCT,
         **algo_specific_config # Merge algo-specific params
     }
-    display_plan(grid_plan, args.algorithm, display_config)
\ No newline at end of file
+    slippage = None
+    if args.slippage:
+        filters = plan_filters or load_symbol_filters(SYMBOL)
+        book = load_order_book(SYMBOL, filters.tick if filters else DEFAULT_TICK_SIZE) # One depth request for every level
+        if book is not None:
+            slippage = plan_slippage(grid_plan, book)
+    display_plan(grid_plan, args.algorithm, display_config, slippage)
+
+    # 6. Optionally simulate the spread of outcomes
+    if args.simulate:
+        report = simulate_plan_outcomes(
+            grid_plan, df_history, current_price, min_price, max_price,
+            num_paths=args.sim_paths, horizon=args.sim_horizon, method=args.sim_method,
+            fee_pct=FEE_PCT, base_asset='eth'
+        )
+        display_simulation(report)
@@ -1,17 +1,39 @@
 import ccxt
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import time
+import os
+from data_sources import wrap_exchange
+from range_algorithms import Candles, atr
+
+# 模拟交易配置：设置 PAPER_KLINES_FILE 后使用本地撮合引擎回放K线，不连接真实交易所
+PAPER_KLINES_FILE = os.environ.get('PAPER_KLINES_FILE')  # .npy 或 Binance/ccxt 导出的 CSV
+PAPER_TIMEFRAME = os.environ.get('PAPER_TIMEFRAME')  # 回放K线的周期；不设置时按文件中K线的时间间隔推断
+PAPER_BALANCES = {'BTC': 0.1, 'USDT': 10000}
+ATR_TIMEFRAME = '1h'  # 计算ATR所用K线周期（回放K线比1h更粗时改用回放周期）
 
 # Binance API 配置
-exchange = ccxt.binance({
-    'apiKey': '你的API_KEY',
-    'secret': '你的API_SECRET',
-})
+if PAPER_KLINES_FILE:
+    from paper_exchange import PaperExchange, load_klines, kline_timeframe, TIMEFRAME_MS
+    paper_klines = load_klines(PAPER_KLINES_FILE)
+    PAPER_TIMEFRAME = PAPER_TIMEFRAME or kline_timeframe(paper_klines)
+    if PAPER_TIMEFRAME not in TIMEFRAME_MS:
+        raise SystemExit(f"无法确定 {PAPER_KLINES_FILE} 的K线周期，请设置 PAPER_TIMEFRAME")
+    if TIMEFRAME_MS[PAPER_TIMEFRAME] > TIMEFRAME_MS[ATR_TIMEFRAME]:
+        ATR_TIMEFRAME = PAPER_TIMEFRAME
+    # 文件K线间隔与 PAPER_TIMEFRAME 不一致时 PaperExchange 会报错
+    exchange = PaperExchange(paper_klines, symbol='BTC/USDT', timeframe=PAPER_TIMEFRAME,
+                             balances=PAPER_BALANCES,
+                             start_index=100 * TIMEFRAME_MS[ATR_TIMEFRAME] // TIMEFRAME_MS[PAPER_TIMEFRAME])  # 预留100根K线给ATR计算
+else:
+    # GRID_DATA_SOURCE=record/replay 时录制或回放 ccxt 调用（见 data_sources.py）
+    exchange = wrap_exchange(ccxt.binance({
+        'apiKey': '你的API_KEY',
+        'secret': '你的API_SECRET',
+    }))
 
 # 邮件配置
 sender_email = 'XXX@gmail.com'
@@ -28,10 +50,10 @@ order_amount = 0.001  # 每个订单的数量
 
 # 获取历史数据并计算 ATR
 def get_atr():
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe='1h', limit=100)
+    ohlcv = exchange.fetch_ohlcv(symbol, timeframe=ATR_TIMEFRAME, limit=100)
     df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['ATR'] = ta.atr(df['high'], df['low'], df['close'], length=14)
-    return df['ATR'].mean()
+    # 共享指标缓存（range_algorithms.py）：同一批K线的ATR只计算一次
+    return np.nanmean(atr(Candles.from_dataframe(df, symbol, ATR_TIMEFRAME), 14))
 
 # 获取当前价格
 def get_current_price():
@@ -60,6 +82,9 @@ def place_sell_order(price):
 
 # 发送邮件提醒
 def send_email(subject, body):
+    if PAPER_KLINES_FILE:
+        print(f'[模拟] {subject}: {body}')
+        return
     msg = MIMEMultipart()
     msg['From'] = sender_email
     msg['To'] = receiver_email
@@ -82,7 +107,18 @@ def grid_trading():
         place_sell_order(sell_price)
         buy_price += grid_spacing
         sell_price -= grid_spacing
-        time.sleep(1)  # 避免频繁请求
+        if not PAPER_KLINES_FILE:
+            time.sleep(1)  # 避免频繁请求
+
+# 模拟模式：回放剩余K线并输出成交结果
+def replay_paper_orders():
+    while not exchange.finished():
+        exchange.advance(len(exchange.klines), stop_on_fill=False)
+    balance = exchange.fetch_balance()['total']
+    print(f'模拟成交 {len(exchange.trades)} 笔，未成交挂单 {len(exchange.fetch_open_orders(symbol))} 笔')
+    print(f'最终余额: {balance["BTC"]:.8f} BTC, {balance["USDT"]:.4f} USDT')
 
 if __name__ == '__main__':
     grid_trading()
+    if PAPER_KLINES_FILE:
+        replay_paper_orders()
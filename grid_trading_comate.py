@@ -3,6 +3,11 @@ import smtplib
 from email.mime.text import MIMEText
 from email.header import Header
 import time
+from data_sources import http_get
+from alert_gate import AlertGate, AlertStateStore
+from market_data_hub import read_hub_price
+from hedged_fetch import fetch_price_hedged
+from adaptive_poll import AdaptivePoller, armed_levels
 
 # 配置SMTP邮件发送
 SMTP_SERVER = 'smtp.gmail.com'
@@ -22,10 +27,30 @@ GRID_PERCENTAGE = 0.02  # 网格密度百分比，例如2%
 PRICE_RANGE = (HISTORICAL_LOW, HISTORICAL_HIGH)
 GRID_DENSITY = (PRICE_RANGE[1] - PRICE_RANGE[0]) * GRID_PERCENTAGE
 
+# 提醒去重配置：触发后价格需回撤超过滞后带才会再次提醒，且同一价位有冷却时间
+ALERT_HYSTERESIS_PCT = 0.5  # 滞后带百分比
+ALERT_COOLDOWN_SECONDS = 1800  # 同一价位两次提醒的最短间隔（秒）
+ALERT_STATE_FILE = 'comate_alert_state.json'  # 提醒状态文件，重启后不会重复提醒
+
+# 本机运行 market_data_hub.py 时直接读取共享内存中的价格（USDT≈USD），不再单独请求 CoinGecko
+HUB_SYMBOL = 'BTCUSDT'
+HUB_MAX_AGE_SECONDS = 10
+# 自适应轮询：离最近的可触发价位越近轮询越快，越远越慢（见 adaptive_poll.py）；False 则固定每分钟一次
+ADAPTIVE_POLLING = True
+MIN_CHECK_INTERVAL_SECONDS = 5
+MAX_CHECK_INTERVAL_SECONDS = 600
+
+HEDGED_PRICE_FETCH = True  # 同时向Binance镜像/CoinGecko请求，取最先返回的有效价格（见 hedged_fetch.py）；False 则只用CoinGecko
+
 def get_bitcoin_price():
     """获取比特币价格"""
+    hub_price = read_hub_price(HUB_SYMBOL, HUB_MAX_AGE_SECONDS)
+    if hub_price is not None:
+        return hub_price
+    if HEDGED_PRICE_FETCH:
+        return fetch_price_hedged(HUB_SYMBOL)
     try:
-        response = requests.get('https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd', timeout=10) #add timeout
+        response = http_get('https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd', timeout=10) #add timeout
         response.raise_for_status()  # Raise an exception for bad status codes
         data = response.json()
         return data['bitcoin']['usd']
@@ -68,6 +93,9 @@ def grid_trading_alert():
     # 移除超出范围的卖单价格点
     sell_prices = [p for p in sell_prices if p <= PRICE_RANGE[1]]
 
+    alert_gate = AlertGate(ALERT_HYSTERESIS_PCT, ALERT_COOLDOWN_SECONDS, AlertStateStore(ALERT_STATE_FILE))
+    poller = AdaptivePoller(MIN_CHECK_INTERVAL_SECONDS, MAX_CHECK_INTERVAL_SECONDS)
+
     while True:
         current_price = get_bitcoin_price()
         if current_price is None:
@@ -75,21 +103,24 @@ def grid_trading_alert():
             continue
         print(f"当前比特币价格: {current_price}")
 
-        # 检查是否触发买单
-        for buy_price in buy_prices:
-            if current_price <= buy_price:
-                send_email("网格交易提醒", f"触发买单，当前价格: {current_price}，买单价格: {buy_price}")
-                # 这里可以添加实际下单的代码，但本示例仅发送提醒
-                break  # 假设每次只触发一个买单，触发后跳出循环
+        # 检查是否触发买单：每个价位只在真正穿越时提醒一次，多个价位同时触发只发一封（最近的价位）
+        fired_buys = [p for p in buy_prices if alert_gate.should_alert(f"BUY:{p:.2f}", 'BUY', p, current_price)]
+        if fired_buys:
+            send_email("网格交易提醒", f"触发买单，当前价格: {current_price}，买单价格: {min(fired_buys)}")
+            # 这里可以添加实际下单的代码，但本示例仅发送提醒
 
         # 检查是否触发卖单
-        for sell_price in sell_prices:
-            if current_price >= sell_price:
-                send_email("网格交易提醒", f"触发卖单，当前价格: {current_price}，卖单价格: {sell_price}")
-                # 这里可以添加实际下单的代码，但本示例仅发送提醒
-                break  # 假设每次只触发一个卖单，触发后跳出循环
+        fired_sells = [p for p in sell_prices if alert_gate.should_alert(f"SELL:{p:.2f}", 'SELL', p, current_price)]
+        if fired_sells:
+            send_email("网格交易提醒", f"触发卖单，当前价格: {current_price}，卖单价格: {max(fired_sells)}")
+            # 这里可以添加实际下单的代码，但本示例仅发送提醒
 
-        time.sleep(60)  # 每分钟检查一次价格
+        if ADAPTIVE_POLLING:
+            poller.observe(current_price)
+            time.sleep(poller.next_interval(current_price, armed_levels(alert_gate, buy_prices, sell_prices),
+                                            alert_gate.rearm_bounds()))
+        else:
+            time.sleep(60)  # 每分钟检查一次价格
 
 if __name__ == "__main__":
     grid_trading_alert()
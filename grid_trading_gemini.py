@@ -1,20 +1,33 @@
 import requests
-import pandas as pd
-import pandas_ta as ta
+import numpy as np
 import json
+import math
 import time
 import smtplib
 import os
 from email.mime.text import MIMEText
 from datetime import datetime
 from dotenv import load_dotenv # For loading credentials from .env file
+from data_sources import http_get
+from alert_gate import AlertGate, AlertStateStore
+from kline_store import INTERVAL_MS, get_klines_dataframe
+from market_data_hub import read_hub_price
+from hedged_fetch import fetch_price_hedged
+from adaptive_poll import AdaptivePoller, armed_levels
+from tick_recorder import TickRecorder
+from exchange_filters import SymbolFilters, TickLevels, load_symbol_filters
+from live_candles import CandleRing, IncrementalATR
+from range_algorithms import Candles, suggest_range
 
 # --- Configuration ---
 
 # --- Part 1: Suggestion Parameters ---
 SYMBOL = "BTCUSDT"      # Trading pair (Binance example)
+FALLBACK_TICK_SIZE = '0.01'    # SYMBOL's tickSize/stepSize if exchangeInfo is unreachable and not cached
+FALLBACK_STEP_SIZE = '0.00001'
 INTERVAL = "1d"         # Candlestick interval for historical data ('1h', '4h', '1d')
 HISTORY_LIMIT = 90      # Number of historical candles (e.g., 90 days for '1d')
+KLINE_BASE_INTERVAL = '1h' # Only this interval is downloaded; INTERVAL is resampled from it locally
 
 # Method preference: 'ATR' or 'Historical'. Will use this method's suggested range.
 PREFERRED_METHOD = 'ATR' # Use 'ATR' first, fallback to 'Historical' if ATR fails
@@ -33,6 +46,8 @@ FEE_PCT = 0.1                     # Trading fee PER trade (e.g., 0.1%)
 # --- Part 2: Monitoring & Notification Parameters ---
 # Price API Endpoint for real-time price
 CURRENT_PRICE_API_URL = "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT"
+HUB_MAX_AGE_SECONDS = 10 # Use market_data_hub.py's shared-memory price if one is running and this fresh
+HEDGED_PRICE_FETCH = True # Race Binance mirrors/CoinGecko when the first answer is slow (see hedged_fetch.py)
 
 # Email Configuration (Load from .env file or set directly)
 load_dotenv() # Load variables from .env file into environment
@@ -43,7 +58,23 @@ EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', 'vxju gkgl htsa abcd') # Takes
 EMAIL_RECEIVER = 'XXX@gmail.com' # !!! CHANGE THIS TO YOUR EMAIL !!!
 
 # Monitoring Interval
-CHECK_INTERVAL_SECONDS = 60 # Check price every 60 seconds
+CHECK_INTERVAL_SECONDS = 60 # Check price every 60 seconds (fixed cadence, and the retry delay after a failed fetch)
+ADAPTIVE_POLLING = True     # Poll faster near an armed level and slower far from all of them (see adaptive_poll.py)
+MIN_CHECK_INTERVAL_SECONDS = 5
+MAX_CHECK_INTERVAL_SECONDS = 600
+
+# Alert De-duplication (a level re-arms only after price moves back past the band)
+ALERT_HYSTERESIS_PCT = 0.5      # Hysteresis band around each level, in %
+ALERT_COOLDOWN_SECONDS = 900    # Minimum time between alerts for the same level/side
+ALERT_STATE_FILE = 'gemini_alert_state.json' # Survives restarts; set to None for in-memory only
+
+# Live Re-gridding (candles built from the polled prices; no history refetch or restart)
+LIVE_REGRID = True              # Rebuild the levels when price leaves the range or the refresh interval passes
+REGRID_INTERVAL_SECONDS = 86400 # Periodic rebuild, even while price stays inside the range
+REGRID_MIN_SECONDS = 300        # Never rebuild more often than this (e.g. while a breakout continues)
+
+# Tick Log (every observed price and signal, compressed; read back with tick_recorder.read_logs)
+TICK_LOG_DIR = 'tick_logs'      # Set to None to disable recording
 
 # --- End Configuration ---
 
@@ -65,31 +96,17 @@ GRID_EXPLANATION_TEMPLATE = """
 """
 
 # --- Global Variables ---
-triggered_levels = set() # Keep track of levels that sent a notification
+alert_gate = AlertGate(ALERT_HYSTERESIS_PCT, ALERT_COOLDOWN_SECONDS, AlertStateStore(ALERT_STATE_FILE))
+last_price_source = {'source': 'unknown'} # Where get_current_btc_price got its last price (for the tick log)
 last_price = None        # Store the previous price to detect crossing direction
 
 # --- Functions (Suggestion Part) ---
 
 def get_historical_data(symbol, interval, limit):
-    """Fetches historical candlestick data from Binance."""
-    KLINE_API_URL = "https://api.binance.com/api/v3/klines"
-    params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+    """Fetches historical candlestick data, resampled locally from the shared base-interval kline store."""
     try:
-        response = requests.get(KLINE_API_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        df = pd.DataFrame(data, columns=[
-            'Open time', 'Open', 'High', 'Low', 'Close', 'Volume',
-            'Close time', 'Quote asset volume', 'Number of trades',
-            'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'
-        ])
-        df['Open time'] = pd.to_datetime(df['Open time'], unit='ms')
-        num_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-        df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce')
-        df.set_index('Open time', inplace=True)
-        # Ensure data is sorted chronologically if needed (usually is from API)
-        df.sort_index(inplace=True)
-        return df
+        # One base download (cached on disk) serves every INTERVAL; no extra call per timeframe
+        return get_klines_dataframe(symbol, interval, limit, index='open', base_interval=KLINE_BASE_INTERVAL)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching historical data: {e}")
     except Exception as e:
@@ -99,42 +116,27 @@ def get_historical_data(symbol, interval, limit):
 def suggest_params_historical(df, lookback_period):
     """Suggests grid range based on historical High/Low."""
     if df is None or len(df) < lookback_period:
-        print(f"Not enough historical data ({len(df)} points) for lookback {lookback_period}")
+        print(f"Not enough historical data ({0 if df is None else len(df)} points) for lookback {lookback_period}")
         return None, None
-    recent_data = df.iloc[-lookback_period:]
-    min_price = recent_data['Low'].min()
-    max_price = recent_data['High'].max()
+    candles = Candles.from_dataframe(df, SYMBOL, INTERVAL)
+    min_price, max_price, _ = suggest_range('Historical', candles, candles.close[-1], lookback=lookback_period)
     print(f"[Suggestion] Based on Historical Range ({lookback_period} {INTERVAL}s): Min={min_price:.2f}, Max={max_price:.2f}")
     return min_price, max_price
 
 def suggest_params_atr(df, atr_period, atr_factor):
-    """Suggests grid range based on ATR."""
+    """Suggests grid range based on ATR around the latest close."""
     if df is None or len(df) < atr_period + 1: # Need enough data for ATR calc
-        print(f"Not enough historical data ({len(df)} points) for ATR period {atr_period}")
+        print(f"Not enough historical data ({0 if df is None else len(df)} points) for ATR period {atr_period}")
         return None, None
-    try:
-        # Calculate ATR using pandas_ta - check if column exists before using
-        atr_col_name = f'ATRr_{atr_period}'
-        df.ta.atr(length=atr_period, append=True)
-
-        if atr_col_name not in df.columns or df[atr_col_name].isnull().all():
-             print(f"Could not calculate ATR column '{atr_col_name}'.")
-             return None, None
-
-        latest_atr = df[atr_col_name].iloc[-1]
-        latest_close = df['Close'].iloc[-1]
-
-        if pd.isna(latest_atr) or pd.isna(latest_close):
-            print("Could not retrieve latest ATR or Close price from historical data.")
-            return None, None
-
-        min_price = latest_close - atr_factor * latest_atr
-        max_price = latest_close + atr_factor * latest_atr
-        print(f"[Suggestion] Based on ATR ({atr_period} {INTERVAL}s, Factor={atr_factor}): Min={min_price:.2f}, Max={max_price:.2f} (ATR={latest_atr:.2f}, Close={latest_close:.2f})")
-        return min_price, max_price
-    except Exception as e:
-        print(f"Error calculating ATR suggestion: {e}")
+    # Shared, cached indicator (range_algorithms.py); same Wilder smoothing as pandas_ta's default ATR
+    candles = Candles.from_dataframe(df, SYMBOL, INTERVAL)
+    latest_close = candles.close[-1]
+    min_price, max_price, info = suggest_range('ATR', candles, latest_close, period=atr_period, factor=atr_factor)
+    if min_price is None:
+        print("Could not retrieve latest ATR or Close price from historical data.")
         return None, None
+    print(f"[Suggestion] Based on ATR ({atr_period} {INTERVAL}s, Factor={atr_factor}): Min={min_price:.2f}, Max={max_price:.2f} (ATR={info['latest_atr']:.2f}, Close={latest_close:.2f})")
+    return min_price, max_price
 
 
 def suggest_num_grids(min_price, max_price, target_profit_pct, fee_pct):
@@ -165,10 +167,30 @@ def suggest_num_grids(min_price, max_price, target_profit_pct, fee_pct):
 
 # --- Functions (Monitoring Part) ---
 
+def suggest_live_range(candles, atr, current_price):
+    """Range from the live candle ring and incremental ATR, with Phase 1's preference and fallback.
+
+    Returns (min_price, max_price, method), or (None, None, None) if neither method has enough candles.
+    """
+    if PREFERRED_METHOD == 'ATR' and not math.isnan(atr.value):
+        return current_price - ATR_FACTOR * atr.value, current_price + ATR_FACTOR * atr.value, 'ATR'
+    if len(candles) >= HISTORICAL_LOOKBACK:
+        min_price, max_price = candles.range(HISTORICAL_LOOKBACK)
+        return min_price, max_price, 'Historical'
+    return None, None, None
+
 def get_current_btc_price():
     """Fetches the current BTC price from the specified API."""
+    hub_price = read_hub_price(SYMBOL, HUB_MAX_AGE_SECONDS) # No network when a local hub is publishing
+    if hub_price is not None:
+        last_price_source['source'] = 'hub'
+        return hub_price
+    if HEDGED_PRICE_FETCH:
+        last_price_source['source'] = 'hedged'
+        return fetch_price_hedged(SYMBOL)
+    last_price_source['source'] = 'http'
     try:
-        response = requests.get(CURRENT_PRICE_API_URL, timeout=10)
+        response = http_get(CURRENT_PRICE_API_URL, timeout=10)
         response.raise_for_status()
         data = response.json()
         price = float(data['price'])
@@ -187,6 +209,32 @@ def calculate_monitoring_grid_levels(min_p, max_p, num_grids):
     levels = [min_p + (i + 1) * step for i in range(num_grids)]
     return sorted(levels)
 
+def format_alert(side, level_str, current_price, now_str, explanation):
+    """Subject and body of the email for one crossed level."""
+    subject = f"BTC Grid Alert: Potential {side} near ${level_str}"
+    body = (
+        f"Bitcoin price crossed {'below' if side == 'BUY' else 'above'} grid level ${level_str}.\n\n"
+        f"Current Price: ${current_price:.2f}\n"
+        f"Timestamp: {now_str}\n\n"
+        f"{explanation}" # Use the formatted explanation
+    )
+    return subject, body
+
+def check_grid_crossings(grid, filters, last_price, current_price, now_str, explanation, recorder=None, fetch_latency_ms=0.0):
+    """Alerts (console, tick log, email) for every armed level crossed between last_price and current_price."""
+    last_tick, price_tick = filters.price_to_ticks([last_price, current_price])
+    # Crossings DOWNWARDS are potential buys, crossings UPWARDS potential sells
+    for side, direction, crossed in (('BUY', 'BELOW', grid.crossed_down(last_tick, price_tick)),
+                                     ('SELL', 'ABOVE', grid.crossed_up(last_tick, price_tick))):
+        for tick in crossed:
+            level, level_str = grid.prices[grid.index[int(tick)]], filters.format_price(tick)
+            if not alert_gate.should_alert(grid.key(side, tick), side, level, current_price):
+                continue
+            print(f"\n[{now_str}] --- Potential {side} Signal --- Price crossed {direction} {level_str}") # Print on new line
+            if recorder:
+                recorder.record_signal(side, level, current_price, last_price_source['source'], fetch_latency_ms)
+            send_email(*format_alert(side, level_str, current_price, now_str, explanation))
+
 def send_email(subject, body):
     """Sends an email notification."""
     if not EMAIL_SENDER or '@' not in EMAIL_SENDER or not EMAIL_PASSWORD or EMAIL_PASSWORD == 'YOUR_APP_PASSWORD' or not EMAIL_RECEIVER:
@@ -275,8 +323,28 @@ if __name__ == "__main__":
         print("Error: Calculated monitoring grid levels are empty. Check parameters.")
         exit()
 
-    print(f"Calculated Monitoring Levels: {[f'{lvl:.2f}' for lvl in monitoring_grid_levels]}")
-    print(f"Monitoring Interval: {CHECK_INTERVAL_SECONDS} seconds")
+    # Snap the levels to the exchange's tick grid; crossings below compare integer tick counts
+    filters = load_symbol_filters(SYMBOL) or SymbolFilters(SYMBOL, FALLBACK_TICK_SIZE, FALLBACK_STEP_SIZE)
+    grid = TickLevels(filters, monitoring_grid_levels)
+    monitoring_grid_levels = list(grid.prices)
+    level_key_format = f"{{:.{filters.price_decimals}f}}"
+
+    print(f"Calculated Monitoring Levels: {[filters.format_price(tick) for tick in grid.ticks]}")
+    if ADAPTIVE_POLLING:
+        print(f"Monitoring Interval: adaptive, {MIN_CHECK_INTERVAL_SECONDS}-{MAX_CHECK_INTERVAL_SECONDS} seconds")
+    else:
+        print(f"Monitoring Interval: {CHECK_INTERVAL_SECONDS} seconds")
+    poller = AdaptivePoller(MIN_CHECK_INTERVAL_SECONDS, MAX_CHECK_INTERVAL_SECONDS)
+    poller.seed_volatility(np.log(df_history['Close'].astype(float)).diff().dropna(), INTERVAL_MS[INTERVAL] / 1000)
+
+    # Live candles and ATR for re-gridding, seeded once from the history already fetched (the last candle is still open)
+    candles = CandleRing(INTERVAL_MS[INTERVAL], max(HISTORY_LIMIT, HISTORICAL_LOOKBACK))
+    candles.seed(df_history.index.values.astype('datetime64[ms]').astype(np.int64),
+                 *(df_history[col].to_numpy(dtype=float) for col in ('Open', 'High', 'Low', 'Close')))
+    live_atr = IncrementalATR(ATR_PERIOD)
+    for high, low, close in df_history[['High', 'Low', 'Close']].to_numpy(dtype=float)[:-1]:
+        live_atr.update(high, low, close)
+    grid_built_at = time.time()
     print("-----------------------------------------")
     time.sleep(2) # Brief pause before starting loop
 
@@ -289,42 +357,50 @@ if __name__ == "__main__":
     )
 
     # --- Phase 3: Monitoring Loop ---
+    recorder = TickRecorder(TICK_LOG_DIR, prefix=f"gemini-{SYMBOL}") if TICK_LOG_DIR else None
     while True:
+        fetch_started = time.perf_counter()
         current_price = get_current_btc_price()
+        fetch_latency_ms = (time.perf_counter() - fetch_started) * 1000
 
         if current_price is not None:
             now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             print(f"[{now_str}] Current BTC Price: ${current_price:.2f}", end='\r') # Use end='\r' to overwrite line
+            if recorder:
+                recorder.record_tick(current_price, last_price_source['source'], fetch_latency_ms)
+
+            closed_candle = candles.update(current_price, int(time.time() * 1000))
+            if closed_candle is not None:
+                live_atr.update(*closed_candle[2:]) # high, low, close
+
+            # Rebuild the levels in place after a breakout or once the refresh interval has passed
+            since_build = time.time() - grid_built_at
+            if LIVE_REGRID and since_build >= REGRID_MIN_SECONDS and (
+                    not final_min_price <= current_price <= final_max_price or since_build >= REGRID_INTERVAL_SECONDS):
+                grid_built_at = time.time()
+                new_min, new_max, new_method = suggest_live_range(candles, live_atr, current_price)
+                new_num_grids = suggest_num_grids(new_min, new_max, TARGET_PROFIT_PER_GRID_PCT, FEE_PCT) if new_min is not None else None
+                new_levels = calculate_monitoring_grid_levels(new_min, new_max, new_num_grids) if new_num_grids else []
+                if new_levels:
+                    new_grid = TickLevels(filters, new_levels)
+                    # Trigger state survives for levels that are in both grids; everything else is dropped
+                    alert_gate.retain([new_grid.key(side, tick) for tick in new_grid.ticks for side in ('BUY', 'SELL')])
+                    surviving = len(np.intersect1d(grid.ticks, new_grid.ticks))
+                    grid, monitoring_grid_levels = new_grid, list(new_grid.prices)
+                    final_min_price, final_max_price, final_num_grids, suggestion_method_used = new_min, new_max, new_num_grids, new_method
+                    grid_explanation_dynamic = GRID_EXPLANATION_TEMPLATE.format(
+                        method=suggestion_method_used, min_p=final_min_price, max_p=final_max_price, num_g=final_num_grids
+                    )
+                    print(f"\n[{now_str}] Re-gridded ({new_method}): {final_min_price:.2f} - {final_max_price:.2f}, "
+                          f"{len(grid)} levels ({surviving} kept their alert state)")
+                else:
+                    print(f"\n[{now_str}] Re-gridding skipped: not enough live data for a new range. Keeping the current levels.")
+
+            alert_gate.update(current_price) # Re-arm levels the price has moved away from
 
             if last_price is not None:
-                for level in monitoring_grid_levels:
-                    level_str = f"{level:.2f}" # Use consistent formatting
-
-                    # Check for crossing DOWNWARDS (Potential Buy Signal)
-                    if last_price > level >= current_price and level_str not in triggered_levels:
-                        print(f"\n[{now_str}] --- Potential BUY Signal --- Price crossed BELOW {level_str}") # Print on new line
-                        subject = f"BTC Grid Alert: Potential BUY near ${level_str}"
-                        body = (
-                            f"Bitcoin price crossed below grid level ${level_str}.\n\n"
-                            f"Current Price: ${current_price:.2f}\n"
-                            f"Timestamp: {now_str}\n\n"
-                            f"{grid_explanation_dynamic}" # Use the formatted explanation
-                        )
-                        send_email(subject, body)
-                        triggered_levels.add(level_str) # Mark level as triggered
-
-                    # Check for crossing UPWARDS (Potential Sell Signal)
-                    elif last_price < level <= current_price and level_str not in triggered_levels:
-                        print(f"\n[{now_str}] --- Potential SELL Signal --- Price crossed ABOVE {level_str}") # Print on new line
-                        subject = f"BTC Grid Alert: Potential SELL near ${level_str}"
-                        body = (
-                            f"Bitcoin price crossed above grid level ${level_str}.\n\n"
-                            f"Current Price: ${current_price:.2f}\n"
-                            f"Timestamp: {now_str}\n\n"
-                            f"{grid_explanation_dynamic}" # Use the formatted explanation
-                        )
-                        send_email(subject, body)
-                        triggered_levels.add(level_str) # Mark level as triggered
+                check_grid_crossings(grid, filters, last_price, current_price, now_str, grid_explanation_dynamic,
+                                     recorder, fetch_latency_ms)
 
             last_price = current_price # Update last price for the next check
         else:
@@ -335,4 +411,10 @@ if __name__ == "__main__":
 
 
         # Wait before the next check
-        time.sleep(CHECK_INTERVAL_SECONDS)
\ No newline at end of file
+        if ADAPTIVE_POLLING and current_price is not None:
+            poller.observe(current_price)
+            armed = armed_levels(alert_gate, [lvl for lvl in monitoring_grid_levels if lvl < current_price],
+                                 [lvl for lvl in monitoring_grid_levels if lvl >= current_price], level_key_format)
+            time.sleep(poller.next_interval(current_price, armed, alert_gate.rearm_bounds()))
+        else:
+            time.sleep(CHECK_INTERVAL_SECONDS)
\ No newline at end of file
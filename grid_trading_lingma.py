@@ -1,19 +1,33 @@
 import time
 import smtplib
-import requests
+from collections import deque
 import numpy as np
-from scipy.stats import norm
 from email.mime.text import MIMEText
+from data_sources import http_get
+from alert_gate import AlertGate
+from market_data_hub import read_hub_price
+from hedged_fetch import fetch_price_hedged
+from adaptive_poll import AdaptivePoller, armed_levels
+from kline_store import get_klines_dataframe
+from regime import RegimeClassifier
+from exchange_filters import SymbolFilters, load_symbol_filters
+from range_algorithms import Candles, suggest_range
 
 class BitcoinGridTrader:
     def __init__(self, algorithm_type='volatility'):
         # API配置
         self.api_url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
         self.history_url = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"
+        self.hub_symbol = "BTCUSDT"  # 本机 market_data_hub.py 运行时直接读共享内存价格（USDT≈USD）
+        self.hub_max_age = 10  # 秒
+        self.hedged_fetch = True  # 同时向Binance镜像/CoinGecko请求，取最先返回的有效价格（见 hedged_fetch.py）
         
         # 运行参数
-        self.check_interval = 30  # 秒
+        self.check_interval = 30  # 秒（固定轮询间隔；自适应轮询关闭或取价失败时使用）
+        self.adaptive_poll = True  # 离最近的可触发价位越近轮询越快，越远越慢（见 adaptive_poll.py）
+        self.poller = AdaptivePoller(min_interval=5, max_interval=600)
         self.algorithm_type = algorithm_type  # 算法类型
+        self.trailing_grid = False  # 移动网格：价格越过最外层价位时整体平移（每格O(1)，保留触发状态），不重新获取数据、不重建网格
         self.base_range = 0.1    # 初始范围（10%）
         self.base_density = 10   # 初始密度
         
@@ -28,10 +42,29 @@ class BitcoinGridTrader:
         
         # 状态变量
         self.current_price = None
-        self.buy_levels = []
-        self.sell_levels = []
-        self.triggered_levels = set()
+        # 价位按交易所 tickSize 取整并以整数tick存储（exchangeInfo 缓存在本地），比较和查找都是精确的
+        # 买入/卖出价位各是一个双端队列，按离基准价由近及远排列，移动网格时两端增删都是O(1)
+        self.filters = None
+        self.buy_ticks = deque()
+        self.sell_ticks = deque()
+        self.step_ticks = 0
         self.history_window = 30  # 历史数据天数
+        # 市场状态分类器（regime算法）：日K滚动特征只算一次，之后每根新K线增量更新
+        self.regime = RegimeClassifier(base_range=self.base_range, base_density=self.base_density)
+        self.regime_history_days = 365
+        # 提醒闸门：价位触发后需回撤超过滞后带（%）才会再次提醒，并有冷却时间（秒）
+        self.alert_gate = AlertGate(hysteresis_pct=0.5, cooldown_seconds=900)
+
+    @property
+    def buy_levels(self):
+        return [float(p) for p in self.filters.ticks_to_price(self.buy_ticks)] if self.buy_ticks else []
+
+    @property
+    def sell_levels(self):
+        return [float(p) for p in self.filters.ticks_to_price(self.sell_ticks)] if self.sell_ticks else []
+
+    def level_key(self, side, tick):
+        return f"{side}:{self.filters.format_price(tick)}"
 
     # 核心方法 -------------------------------------------------
     def run(self):
@@ -39,23 +72,34 @@ class BitcoinGridTrader:
         print("比特币网格交易系统启动...")
         print(f"当前使用算法: {self.algorithm_type}")
         while True:
-            self.check_price()
-            time.sleep(self.check_interval)
+            price = self.check_price()
+            time.sleep(self.next_check_interval(price))
+
+    def next_check_interval(self, price):
+        """下次检查前的等待时间（秒）"""
+        if not self.adaptive_poll or price is None:
+            return self.check_interval
+        self.poller.observe(price)
+        key_format = f"{{:.{self.filters.price_decimals}f}}" if self.filters else "{:.2f}"
+        return self.poller.next_interval(price, armed_levels(self.alert_gate, self.buy_levels, self.sell_levels, key_format),
+                                          self.alert_gate.rearm_bounds())
 
     def check_price(self):
-        """价格检查主逻辑"""
+        """价格检查主逻辑，返回本次获取的价格（失败时为None）"""
         new_price = self.get_bitcoin_price()
         if new_price is None:
             return
 
-        # 当需要重新生成网格时
+        # 当需要重新生成网格时（移动网格模式下只平移）
         if self.should_regenerate_grid(new_price):
-            self.generate_grid(new_price)
-            self.triggered_levels.clear()
+            if not (self.trailing_grid and self.buy_ticks and self.shift_grid(new_price)):
+                self.generate_grid(new_price)
+                self.alert_gate.reset()
             self.current_price = new_price
 
         # 检查交易信号
         self.check_trading_signals(new_price)
+        return new_price
 
     # 网格生成相关 ---------------------------------------------
     def generate_grid(self, base_price):
@@ -67,95 +111,127 @@ class BitcoinGridTrader:
         price_range = base_price * self.base_range
         step = price_range / self.base_density
         
-        # 生成买卖点位
-        self.buy_levels = self.calculate_levels(base_price, -step)
-        self.sell_levels = self.calculate_levels(base_price, step)
+        # 生成买卖点位（取整到交易所的价格精度）
+        if self.filters is None:
+            # 取不到 exchangeInfo 且无缓存时使用 BTCUSDT 的默认精度
+            self.filters = load_symbol_filters(self.hub_symbol) or SymbolFilters(self.hub_symbol, '0.01', '0.00001')
+        base_tick = int(self.filters.price_to_ticks(base_price))
+        self.step_ticks = max(1, int(self.filters.price_to_ticks(step)))
+        self.buy_ticks = self.calculate_levels(base_tick, -self.step_ticks)
+        self.sell_ticks = self.calculate_levels(base_tick, self.step_ticks)
         
         print(f"\n【网格更新】价格: ${base_price:.2f} | 范围: ±{self.base_range*100}%")
         print(f"网格密度: {self.base_density}层 | 买入区间: [${self.buy_levels[-1]:.2f} ~ ${base_price:.2f}]")
         print(f"卖出区间: [${base_price:.2f} ~ ${self.sell_levels[-1]:.2f}]")
 
     def calculate_levels(self, base, step):
-        """计算价格层级"""
-        return [base + i*step for i in range(1, self.base_density+1)]
+        """计算价格层级（整数tick，由近及远）"""
+        return deque(base + i*step for i in range(1, self.base_density+1))
 
     def should_regenerate_grid(self, new_price):
         """判断是否需要重新生成网格"""
-        if not self.current_price:
+        if not self.current_price or not self.buy_ticks:
             return True
-        current_min = min(self.buy_levels) if self.buy_levels else 0
-        current_max = max(self.sell_levels) if self.sell_levels else 0
-        return new_price < current_min or new_price > current_max
+        price_tick = self.filters.price_to_ticks(new_price)
+        return price_tick < self.buy_ticks[-1] or price_tick > self.sell_ticks[-1]
+
+    def shift_grid(self, new_price):
+        """移动网格：价格每越过最外层价位一格，前进方向增加一层、另一端丢弃最远的一层
+
+        其余价位的触发状态保留；跳空超过整个网格宽度时返回False，由调用方重建网格
+        """
+        price_tick = int(self.filters.price_to_ticks(new_price))
+        if price_tick > self.sell_ticks[-1]:
+            steps = -(-(price_tick - self.sell_ticks[-1]) // self.step_ticks)  # 向上取整
+        else:
+            steps = -(-(self.buy_ticks[-1] - price_tick) // self.step_ticks)
+        if steps > 2 * len(self.buy_ticks):
+            return False
+        up = price_tick > self.sell_ticks[-1]
+        dropped = []
+        for _ in range(steps):
+            if up:  # 基准价上移一格：原基准价成为最近的买入价位，原最近的卖出价位成为新基准价
+                self.buy_ticks.appendleft(self.sell_ticks[0] - self.step_ticks)
+                dropped.append(self.level_key('BUY', self.buy_ticks.pop()))
+                dropped.append(self.level_key('SELL', self.sell_ticks.popleft()))
+                self.sell_ticks.append(self.sell_ticks[-1] + self.step_ticks)
+            else:
+                self.sell_ticks.appendleft(self.buy_ticks[0] + self.step_ticks)
+                dropped.append(self.level_key('SELL', self.sell_ticks.pop()))
+                dropped.append(self.level_key('BUY', self.buy_ticks.popleft()))
+                self.buy_ticks.append(self.buy_ticks[-1] - self.step_ticks)
+        self.alert_gate.forget(dropped)
+        print(f"\n【网格平移】{'上移' if up else '下移'}{steps}格 | 买入区间: [${self.buy_levels[-1]:.2f} ~ ${self.buy_levels[0]:.2f}] | "
+              f"卖出区间: [${self.sell_levels[0]:.2f} ~ ${self.sell_levels[-1]:.2f}]")
+        return True
 
     # 智能算法部分 ---------------------------------------------
     def auto_update_parameters(self):
-        """根据算法类型自动更新参数"""
-        historical = self.fetch_historical_data()
-        if not historical or len(historical) < 30:
-            return
-
+        """根据算法类型自动更新参数（只有波动率算法需要 CoinGecko 历史价格）"""
         try:
             if self.algorithm_type == 'volatility':
+                historical = self.fetch_historical_data()
+                if not historical or len(historical) < 30:
+                    return
                 self.update_by_volatility(historical)
             elif self.algorithm_type == 'atr':
-                self.update_by_atr(historical)
+                self.update_by_atr()
             elif self.algorithm_type == 'regime':
-                self.update_by_regime(historical)
+                self.update_by_regime()
         except Exception as e:
             print(f"参数更新失败: {e}")
 
     def update_by_volatility(self, prices):
-        """波动率算法更新"""
-        returns = np.diff(prices) / prices[:-1]
-        volatility = np.std(returns)
-        z_score = norm.ppf(0.975)  # 95%置信区间
-        
-        self.base_range = z_score * volatility
-        self.base_density = int(10 / (volatility * 100))
-        self.base_density = np.clip(self.base_density, 5, 20)
-
-    def update_by_atr(self, prices):
-        """ATR算法更新（需要最高/低价数据）"""
-        # 获取高低价数据
-        high_low = self.fetch_high_low_data()
-        if not high_low or len(high_low) < 14:
+        """波动率算法更新（95%置信区间，见 range_algorithms.py 的 volatility 算法）"""
+        candles = Candles.from_closes(prices, 'coingecko:bitcoin', f'{self.history_window}d')
+        _, _, info = suggest_range('volatility', candles, prices[-1])
+        self.base_range = info['base_range']
+        self.base_density = info['base_density']
+
+    def update_by_atr(self):
+        """ATR算法更新（小时K线的最高/最低价，来自共享K线缓存）"""
+        klines = get_klines_dataframe(self.hub_symbol, '1h', self.history_window * 24)
+        if klines is None or len(klines) < 15:
             return
-            
-        # 计算ATR
-        tr = [high_low[0]['high'] - high_low[0]['low']]
-        for i in range(1, len(high_low)):
-            tr.append(max(
-                high_low[i]['high'] - high_low[i]['low'],
-                abs(high_low[i]['high'] - high_low[i-1]['high']),
-                abs(high_low[i]['low'] - high_low[i-1]['low'])
-            ))
-        atr = np.mean(tr[-14:])
-        
-        self.base_range = 3 * atr / prices[-1]  # 转换为百分比
+
+        # 区间 = 当前价 ± 3倍ATR，ATR由共享指标缓存计算（同一份K线只算一次）
+        candles = Candles.from_dataframe(klines, self.hub_symbol, '1h')
+        current_price = float(candles.close[-1])  # 最新一根（未收盘）小时K线的收盘价
+        min_price, max_price, info = suggest_range('ATR', candles, current_price, period=14, factor=3)
+        if min_price is None:
+            return
+        atr = info['latest_atr']
+
+        self.base_range = 3 * atr / current_price  # 转换为百分比
         self.base_density = int((3 * atr) / (0.5 * atr))
         self.base_density = np.clip(self.base_density, 8, 25)
 
-    def update_by_regime(self, prices):
-        """市场状态算法更新"""
-        ma_short = np.mean(prices[-7:])   # 7日均线
-        ma_long = np.mean(prices[-30:])   # 30日均线
-        trend_strength = abs(ma_short - ma_long) / ma_long
-        
-        if trend_strength > 0.05:  # 趋势市场
-            self.base_range *= 0.6
-            self.base_density = int(self.base_density * 0.7)
-        else:  # 震荡市场
-            self.base_range *= 1.3
-            self.base_density = int(self.base_density * 1.4)
-        
-        self.base_density = np.clip(self.base_density, 8, 25)
-        self.base_range = np.clip(self.base_range, 0.05, 0.3)
+    def update_by_regime(self):
+        """市场状态算法更新（7/30日均线趋势强度）
+
+        范围和密度只由最新一根已收盘日K的市场状态决定，与之前重建网格的次数无关
+        """
+        candles = get_klines_dataframe(self.hub_symbol, '1d', self.regime_history_days)
+        if candles is not None and len(candles) > 1:
+            closed = candles.iloc[:-1]  # 最后一根日K尚未收盘
+            timestamps = closed.index.values.astype('datetime64[ms]').astype(np.int64)
+            self.regime.extend(closed['Close'].to_numpy(dtype=float), timestamps)
+        if not len(self.regime):
+            return
+
+        regime, self.base_range, self.base_density = self.regime.params_at()
+        print(f"市场状态: {regime}，网格范围 {self.base_range:.1%}，网格密度 {self.base_density}")
 
     # 数据获取相关 ---------------------------------------------
     def get_bitcoin_price(self):
         """获取实时价格"""
+        hub_price = read_hub_price(self.hub_symbol, self.hub_max_age)
+        if hub_price is not None:
+            return hub_price
+        if self.hedged_fetch:
+            return fetch_price_hedged(self.hub_symbol)
         try:
-            response = requests.get(self.api_url, timeout=5)
+            response = http_get(self.api_url, timeout=5)
             return response.json()['bitcoin']['usd']
         except Exception as e:
             print(f"价格获取失败: {e}")
@@ -165,35 +241,41 @@ class BitcoinGridTrader:
         """获取历史收盘价"""
         try:
             params = {'vs_currency': 'usd', 'days': self.history_window}
-            response = requests.get(self.history_url, params=params)
+            response = http_get(self.history_url, params=params)
             return [x[1] for x in response.json()['prices']]
         except Exception as e:
             print(f"历史数据获取失败: {e}")
             return None
 
-    def fetch_high_low_data(self):
-        """获取高低价数据（用于ATR）"""
-        try:
-            params = {'vs_currency': 'usd', 'days': self.history_window}
-            response = requests.get(self.history_url, params=params)
-            return [{'high': x[1], 'low': x[2]} for x in response.json()['prices']]
-        except:
-            return None
-
     # 交易信号处理 ---------------------------------------------
     def check_trading_signals(self, price):
-        """检查买卖信号"""
-        for level in self.buy_levels:
-            if price <= level and level not in self.triggered_levels:
+        """检查买卖信号（只检查已被价格触及的价位）"""
+        if not self.buy_ticks:
+            return
+        self.alert_gate.update(price)  # 先让远离的价位重新待命
+        price_tick = self.filters.price_to_ticks(price)
+        for tick in self.buy_ticks:  # 由近及远，遇到价格之下的价位即停止
+            if tick < price_tick:
+                break
+            level = float(self.filters.ticks_to_price(tick))
+            if self.alert_gate.should_alert(self.level_key('BUY', tick), 'BUY', level, price):
                 self.trigger_signal(level, price, "买入")
 
-        for level in self.sell_levels:
-            if price >= level and level not in self.triggered_levels:
+        for tick in self.sell_ticks:
+            if tick > price_tick:
+                break
+            level = float(self.filters.ticks_to_price(tick))
+            if self.alert_gate.should_alert(self.level_key('SELL', tick), 'SELL', level, price):
                 self.trigger_signal(level, price, "卖出")
 
     def trigger_signal(self, level, price, signal_type):
         """触发交易信号"""
-        self.triggered_levels.add(level)
+        self.send_email(*self.format_signal(level, price, signal_type))
+        print(f"! {signal_type}信号 @ ${level:.2f}")
+
+    # 邮件服务 ------------------------------------------------
+    def format_signal(self, level, price, signal_type):
+        """信号邮件的标题和正文"""
         subject = f"比特币{signal_type}信号 @ ${level:.2f}"
         message = f"""检测到交易信号：
         类型：{signal_type}
@@ -201,10 +283,8 @@ class BitcoinGridTrader:
         当前价：${price:.2f}
         时间：{time.strftime('%Y-%m-%d %H:%M:%S')}
         """
-        self.send_email(subject, message)
-        print(f"! {signal_type}信号 @ ${level:.2f}")
+        return subject, message
 
-    # 邮件服务 ------------------------------------------------
     def send_email(self, subject, message):
         """发送通知邮件"""
         msg = MIMEText(message)
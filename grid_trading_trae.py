@@ -1,9 +1,13 @@
-import requests
 import time
 import smtplib
-import pandas as pd
-import pandas_ta as ta
 from email.mime.text import MIMEText
+from data_sources import http_get
+from alert_gate import AlertGate
+from kline_store import INTERVAL_MS, get_klines_dataframe
+from market_data_hub import read_hub_price
+from hedged_fetch import fetch_price_hedged
+from adaptive_poll import AdaptivePoller, armed_levels
+from range_algorithms import Candles, suggest_range
 
 # Configuration
 EMAIL_CONFIG = {
@@ -18,16 +22,23 @@ GRID_CONFIG = {
     'interval': '1h',
     'num_grids': 10,
     'price_range_percent': 5,
-    'check_interval': 10,
+    'check_interval': 10,          # 固定轮询间隔（秒）；自适应轮询关闭或取价失败时使用
+    'adaptive_poll': True,         # 离最近的可触发价位越近轮询越快，越远越慢（见 adaptive_poll.py）
+    'min_check_interval': 2,
+    'max_check_interval': 300,
     'historical_days': 14,
     'atr_period': 14,
     'atr_factor': 3,
     'target_profit_pct': 1.5,
     'trading_fee': 0.1,
-    'max_grids': 20
+    'max_grids': 20,
+    'alert_hysteresis_pct': 0.5,   # 触发后价格需回撤超过该百分比才会再次提醒
+    'alert_cooldown': 900,         # 同一价位两次提醒的最短间隔（秒）
+    'price_api_url': 'https://api.binance.com/api/v3/ticker/price',
+    'hub_max_age': 10,             # 本机 market_data_hub.py 共享内存价格的最大可接受延迟（秒）
+    'hedged_fetch': True           # 第一个行情源响应慢时向Binance镜像/CoinGecko补发请求（见 hedged_fetch.py）
 }
 
-BINANCE_API = "https://api.binance.com/api/v3/klines"
 
 def get_historical_data():
     """
@@ -45,49 +56,16 @@ def get_historical_data():
     """
     """Fetch historical candlestick data from Binance"""
     try:
-        params = {
-            'symbol': GRID_CONFIG['symbol'],
-            'interval': GRID_CONFIG['interval'],
-            'limit': GRID_CONFIG['historical_days']*24
-        }
-        response = requests.get(BINANCE_API, params=params, timeout=10)
-        response.raise_for_status()
-        
-        df = pd.DataFrame(response.json(), columns=[
-            'Open time', 'Open', 'High', 'Low', 'Close', 'Volume',
-            'Close time', 'Quote asset volume', 'Number of trades',
-            'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'
-        ])
-        num_cols = ['Open', 'High', 'Low', 'Close', 'Volume']
-        df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce')
-        df['Open time'] = pd.to_datetime(df['Open time'], unit='ms')
-        return df.set_index('Open time').sort_index()
+        # 只下载一种基础周期的K线（磁盘缓存，各脚本共享），GRID_CONFIG['interval'] 在本地重采样得到
+        limit = GRID_CONFIG['historical_days'] * INTERVAL_MS['1d'] // INTERVAL_MS[GRID_CONFIG['interval']]
+        return get_klines_dataframe(GRID_CONFIG['symbol'], GRID_CONFIG['interval'], limit, index='open')
     except Exception as e:
         print(f"Historical data error: {e}")
         return None
     
-def calculate_atr(df):
-    """
-    波动率量化，通过计算指定周期（当前配置为14小时）的ATR指标，衡量市场波动强度。ATR值越大表示市场波动越剧烈。
-    动态风控参数生成，返回最新的ATR值给调用方（如suggest_parameters函数），用于计算动态交易区间。
-
-    Args:
-        df (pandas.DataFrame): 包含价格数据的DataFrame。
-
-    Returns:
-        float: 计算的ATR值，如果发生错误则返回None。
-
-    Raises:
-        Exception: 在计算ATR时发生任何异常。
-
-    """
-    """Calculate Average True Range with error handling"""
-    try:
-        df.ta.atr(length=GRID_CONFIG['atr_period'], append=True)
-        return df[f'ATR_{GRID_CONFIG["atr_period"]}'].iloc[-1]
-    except Exception as e:
-        print(f"ATR calculation error: {e}")
-        return None
+def history_candles(df):
+    """历史K线转换为 range_algorithms 的 Candles（指标缓存按交易对、周期和最后一根K线区分数据版本）"""
+    return Candles.from_dataframe(df, GRID_CONFIG['symbol'], GRID_CONFIG['interval'])
 
 def suggest_parameters(current_price):
     """
@@ -109,11 +87,12 @@ def suggest_parameters(current_price):
     
     if df is not None and not df.empty:
         # ATR-based calculation
-        atr_value = calculate_atr(df)
-        if atr_value:
+        min_price, max_price, _ = suggest_range('ATR', history_candles(df), current_price,
+                                                period=GRID_CONFIG['atr_period'], factor=GRID_CONFIG['atr_factor'])
+        if min_price is not None:
             params.update({
-                'min_price': current_price - GRID_CONFIG['atr_factor'] * atr_value,
-                'max_price': current_price + GRID_CONFIG['atr_factor'] * atr_value
+                'min_price': min_price,
+                'max_price': max_price
             })
         
         # Grid density calculation
@@ -140,7 +119,7 @@ def generate_grid(params, current_price):
     买入网格按升序排列（价格下跌触发买入），卖出网格按降序排列（价格上涨触发卖出），这种排列方式与常规交易逻辑完全匹配
 
     状态跟踪初始化
-    创建与网格数量相同的布尔值列表，用于记录每个网格是否已被触发，避免重复报警
+    创建提醒闸门（AlertGate），按价位和方向记录触发状态，价格回撤超过滞后带后才重新布防，避免重复报警
 
     Args:
         params (dict): 包含网格参数的字典，包括：
@@ -153,7 +132,7 @@ def generate_grid(params, current_price):
         dict: 包含生成的网格等级的字典，包含以下键：
             - 'buy_levels' (list of float): 按升序排列的买入网格等级。
             - 'sell_levels' (list of float): 按降序排列的卖出网格等级。
-            - 'triggered' (list of bool): 一个布尔值列表，表示每个网格是否已触发，默认为 False。
+            - 'alert_gate' (AlertGate): 记录每个网格价位触发状态的提醒闸门。
 
     """
     """Generate grid levels with dynamic parameters"""
@@ -168,7 +147,7 @@ def generate_grid(params, current_price):
     return {
         'buy_levels': sorted(levels),
         'sell_levels': sorted(levels, reverse=True),
-        'triggered': [False] * params['num_grids']
+        'alert_gate': AlertGate(GRID_CONFIG['alert_hysteresis_pct'], GRID_CONFIG['alert_cooldown'])
     }
 
 def get_bitcoin_price():
@@ -186,9 +165,14 @@ def get_bitcoin_price():
 
     """
     """Fetch current Bitcoin price from Binance"""
+    hub_price = read_hub_price(GRID_CONFIG['symbol'], GRID_CONFIG['hub_max_age'])
+    if hub_price is not None:
+        return hub_price
+    if GRID_CONFIG['hedged_fetch']:
+        return fetch_price_hedged(GRID_CONFIG['symbol'])
     try:
-        response = requests.get(
-            f'https://api.binance.com/api/v3/ticker/price?symbol={GRID_CONFIG["symbol"]}'
+        response = http_get(
+            f'{GRID_CONFIG["price_api_url"]}?symbol={GRID_CONFIG["symbol"]}'
         )
         response.raise_for_status()
         data = response.json()
@@ -197,6 +181,24 @@ def get_bitcoin_price():
         print(f"Price fetch error: {e}")
         return None
 
+def format_alert(side, level):
+    """提醒邮件的标题和正文"""
+    if side == 'BUY':
+        return "Buy Signal", f"Price reached buy level: {level:.2f}"
+    return "Sell Signal", f"Price reached sell level: {level:.2f}"
+
+def check_signals(grid, price):
+    """检查买入/卖出价位，对被触发的价位发送提醒邮件"""
+    # Check buy levels
+    for level in grid['buy_levels']:
+        if grid['alert_gate'].should_alert(f"BUY:{level:.2f}", 'BUY', level, price):
+            send_email(*format_alert('BUY', level))
+
+    # Check sell levels
+    for level in grid['sell_levels']:
+        if grid['alert_gate'].should_alert(f"SELL:{level:.2f}", 'SELL', level, price):
+            send_email(*format_alert('SELL', level))
+
 def send_email(subject, message):
     """
     发送电子邮件警告。
@@ -248,23 +250,22 @@ def main():
     print(f"Grid initialized with {params['num_grids']} levels")
     print(f"Price range: {params.get('min_price', 'Auto')} - {params.get('max_price', 'Auto')}")
     
+    poller = AdaptivePoller(GRID_CONFIG['min_check_interval'], GRID_CONFIG['max_check_interval'])
+    sleep_seconds = GRID_CONFIG['check_interval']
     while True:
-        time.sleep(GRID_CONFIG['check_interval'])
+        time.sleep(sleep_seconds)
+        sleep_seconds = GRID_CONFIG['check_interval']
         price = get_bitcoin_price()
         if price is None:
             continue
         
-        # Check buy levels
-        for i, level in enumerate(grid['buy_levels']):
-            if price <= level and not grid['triggered'][i]:
-                send_email("Buy Signal", f"Price reached buy level: {level:.2f}")
-                grid['triggered'][i] = True
-        
-        # Check sell levels
-        for i, level in enumerate(grid['sell_levels']):
-            if price >= level and not grid['triggered'][i]:
-                send_email("Sell Signal", f"Price reached sell level: {level:.2f}")
-                grid['triggered'][i] = True
+        check_signals(grid, price)
+
+        # 根据与最近可触发价位的距离决定下次轮询时间
+        if GRID_CONFIG['adaptive_poll']:
+            poller.observe(price)
+            sleep_seconds = poller.next_interval(price, armed_levels(grid['alert_gate'], grid['buy_levels'], grid['sell_levels']),
+                                                 grid['alert_gate'].rearm_bounds())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
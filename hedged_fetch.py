@@ -0,0 +1,151 @@
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from data_sources import http_get
+
+# --- Configuration ---
+
+BINANCE_PRICE_HOSTS = ["https://api.binance.com", "https://api1.binance.com", "https://api2.binance.com",
+                       "https://api3.binance.com", "https://data-api.binance.vision"]
+COINGECKO_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+COINGECKO_IDS = {'BTC': 'bitcoin', 'ETH': 'ethereum', 'BNB': 'binancecoin', 'SOL': 'solana'}
+
+REQUEST_TIMEOUT_SECONDS = 5
+MAX_IN_FLIGHT = 3               # Primary request plus at most two hedges per fetch
+DEFAULT_HEDGE_DELAY = 0.3       # Seconds, used until a provider has MIN_SAMPLES latencies
+MIN_HEDGE_DELAY = 0.05
+MAX_HEDGE_DELAY = 2.0
+HEDGE_PERCENTILE = 95
+MIN_SAMPLES = 10
+STATS_WINDOW = 200              # Latencies/outcomes remembered per provider
+
+# --- Providers ---
+
+class PriceProvider:
+    """One endpoint able to return a price: a URL, its query parameters and a parser for the JSON body."""
+
+    def __init__(self, name, url, params, parse):
+        self.name = name
+        self.url = url
+        self.params = params
+        self.parse = parse
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.outcomes = deque(maxlen=STATS_WINDOW)   # True for a valid price, False for an error
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        started = time.perf_counter()
+        try:
+            response = http_get(self.url, params=self.params, timeout=REQUEST_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            price = float(self.parse(response.json()))
+            if not price > 0:
+                raise ValueError(f"invalid price {price}")
+        except Exception:
+            self.record(time.perf_counter() - started, False)
+            raise
+        self.record(time.perf_counter() - started, True)
+        return price
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(ok)
+
+    def error_rate(self):
+        with self.lock:
+            return 1.0 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def latency_percentile(self, pct):
+        with self.lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+            return float(np.percentile(self.latencies, pct))
+
+    def expected_cost(self):
+        """Typical latency plus a timeout's worth of penalty per expected failure; lower sorts first."""
+        median = self.latency_percentile(50)
+        return (DEFAULT_HEDGE_DELAY if median is None else median) + self.error_rate() * REQUEST_TIMEOUT_SECONDS
+
+def default_providers(symbol):
+    """Binance and its mirrors for `symbol`, with CoinGecko's USD price as the last resort."""
+    providers = [PriceProvider(host.split('//')[1], f"{host}/api/v3/ticker/price", {'symbol': symbol},
+                               lambda data: data['price'])
+                 for host in BINANCE_PRICE_HOSTS]
+    base = symbol[:-4] if symbol.endswith(('USDT', 'USDC')) else symbol[:-3]
+    coin_id = COINGECKO_IDS.get(base.upper())
+    if coin_id:
+        providers.append(PriceProvider('coingecko', COINGECKO_PRICE_URL, {'ids': coin_id, 'vs_currencies': 'usd'},
+                                       lambda data: data[coin_id]['usd']))
+    return providers
+
+# --- Hedged Fetch ---
+
+class HedgedPriceFetcher:
+    """Asks the best-ranked provider first and hedges to the next one if it is slow.
+
+    The hedge is sent once the current request has been outstanding longer than
+    that provider's p95 latency, so only about 5% of fetches pay for a second
+    request. The first valid price wins; slower requests finish in the background
+    and still feed the latency and error statistics used to reorder providers.
+    """
+
+    def __init__(self, providers, max_in_flight=MAX_IN_FLIGHT):
+        self.providers = list(providers)
+        self.max_in_flight = max_in_flight
+        self.pool = ThreadPoolExecutor(max_workers=max(len(self.providers), 1) * 2, thread_name_prefix='hedged-fetch')
+
+    def ranked(self):
+        return sorted(self.providers, key=lambda p: p.expected_cost())
+
+    def hedge_delay(self, provider):
+        p95 = provider.latency_percentile(HEDGE_PERCENTILE)
+        return DEFAULT_HEDGE_DELAY if p95 is None else min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, p95))
+
+    def fetch(self):
+        """Returns (price, provider_name), or (None, None) when every provider failed."""
+        queue = self.ranked()
+        pending = {}
+        last_error = None
+        deadline = time.perf_counter() + REQUEST_TIMEOUT_SECONDS * 2
+        hedge_at, delay_expired = 0.0, False
+        while queue or pending:
+            if queue and len(pending) < self.max_in_flight and (not pending or delay_expired):
+                provider = queue.pop(0)
+                pending[self.pool.submit(provider.fetch)] = provider
+                hedge_at = time.perf_counter() + self.hedge_delay(provider)
+            can_hedge = queue and len(pending) < self.max_in_flight
+            timeout = max(0.0, (hedge_at if can_hedge else deadline) - time.perf_counter())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            delay_expired = time.perf_counter() >= hedge_at
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result(), provider.name
+                except Exception as e:
+                    last_error = f"{provider.name}: {e}"
+                    delay_expired = True  # a failure hedges immediately
+            if time.perf_counter() >= deadline:
+                break
+        print(f"Hedged price fetch failed ({last_error or 'timed out'})", file=sys.stderr)
+        return None, None
+
+    def stats(self):
+        """Per-provider latency percentiles (seconds) and error rate, best-ranked first."""
+        return [{'provider': p.name, 'p50': p.latency_percentile(50), 'p95': p.latency_percentile(95),
+                 'error_rate': p.error_rate(), 'samples': len(p.latencies)} for p in self.ranked()]
+
+_fetchers = {}
+
+def fetch_price_hedged(symbol):
+    """Latest price for a Binance symbol (e.g. 'BTCUSDT') from the fastest healthy provider, or None."""
+    fetcher = _fetchers.get(symbol)
+    if fetcher is None:
+        fetcher = _fetchers[symbol] = HedgedPriceFetcher(default_providers(symbol))
+    price, _ = fetcher.fetch()
+    return price
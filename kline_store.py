@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_sources import http_get
+
+# --- Configuration ---
+
+KLINE_API_URL = "https://api.binance.com/api/v3/klines"
+MAX_KLINES_PER_REQUEST = 1000     # Binance hard limit per klines call
+DEFAULT_BASE_INTERVAL = '1h'      # The one interval we download; everything coarser is derived locally
+KLINE_CACHE_DIR = os.environ.get('KLINE_CACHE_DIR', '.kline_cache')
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+# Binance weekly candles open on Monday 00:00 UTC; the epoch was a Thursday
+INTERVAL_OFFSET_MS = {'1w': 4 * 86_400_000}
+
+# Kline layout (same as ccxt fetch_ohlcv rows and the first six Binance kline fields)
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+# --- Resampling ---
+
+def resample_ohlcv(klines, interval, drop_partial=False):
+    """Aggregates sorted (N, 6) klines into a coarser interval.
+
+    Buckets are aligned the way Binance aligns them (UTC, Monday for weeks), so a
+    1d bar built from 1h bars matches the exchange's own 1d bar. Open is the first
+    open, Close the last close, High/Low the extremes and Volume the sum.
+    """
+    klines = np.asarray(klines, dtype=np.float64)
+    if len(klines) == 0:
+        return klines.reshape(0, 6)
+    interval_ms = INTERVAL_MS[interval]
+    offset = INTERVAL_OFFSET_MS.get(interval, 0)
+    ts = klines[:, TS].astype(np.int64)
+    buckets = (ts - offset) // interval_ms * interval_ms + offset
+
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(klines)])) - 1
+    out = np.empty((len(starts), 6))
+    out[:, TS] = buckets[starts]
+    out[:, OPEN] = klines[starts, OPEN]
+    out[:, HIGH] = np.maximum.reduceat(klines[:, HIGH], starts)
+    out[:, LOW] = np.minimum.reduceat(klines[:, LOW], starts)
+    out[:, CLOSE] = klines[ends, CLOSE]
+    out[:, VOLUME] = np.add.reduceat(klines[:, VOLUME], starts)
+
+    if drop_partial and len(out):
+        base_ms = int(np.median(np.diff(ts))) if len(ts) > 1 else interval_ms
+        if ts[-1] + base_ms < out[-1, TS] + interval_ms:
+            out = out[:-1]
+    return out
+
+def to_dataframe(klines, interval, index='open'):
+    """Builds the DataFrame layout the scripts expect (Open/High/Low/Close/Volume).
+
+    index='open' matches gemini/trae ('Open time' index); index='close' matches the
+    planners ('Date' index taken from the bar close time).
+    """
+    interval_ms = INTERVAL_MS[interval]
+    df = pd.DataFrame(np.asarray(klines)[:, :6], columns=['Open time', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    df['Close time'] = df['Open time'] + interval_ms - 1
+    df['Open time'] = pd.to_datetime(df['Open time'].astype(np.int64), unit='ms')
+    df['Close time'] = pd.to_datetime(df['Close time'].astype(np.int64), unit='ms')
+    if index == 'close':
+        df['Date'] = df['Close time']
+        return df.set_index('Date')
+    return df.set_index('Open time')
+
+# --- Fetching ---
+
+def fetch_binance_klines(symbol, interval, start_ms, end_ms=None):
+    """Downloads klines in [start_ms, end_ms] page by page. Returns an (N, 6) array or None."""
+    interval_ms = INTERVAL_MS[interval]
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    rows = []
+    cursor = int(start_ms)
+    try:
+        while cursor <= end_ms:
+            params = {'symbol': symbol, 'interval': interval, 'startTime': cursor,
+                      'endTime': end_ms, 'limit': MAX_KLINES_PER_REQUEST}
+            response = http_get(KLINE_API_URL, params=params, timeout=15)
+            response.raise_for_status()
+            page = response.json()
+            if not page:
+                break
+            rows.extend(row[:6] for row in page)
+            cursor = int(page[-1][0]) + interval_ms
+            if len(page) < MAX_KLINES_PER_REQUEST:
+                break
+    except Exception as e:
+        print(f"Error fetching {interval} klines for {symbol}: {e}", file=sys.stderr)
+        return None
+    return np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+# --- Store ---
+
+class KlineStore:
+    """One base-interval kline history per symbol, shared through an on-disk cache.
+
+    Only the base interval is ever downloaded, and a refresh only fetches bars
+    newer than the last stored one. Coarser intervals are derived locally with
+    resample_ohlcv and memoized per data version, so any indicator can ask for
+    any timeframe without another network call.
+    """
+
+    def __init__(self, symbol, base_interval=DEFAULT_BASE_INTERVAL, cache_dir=KLINE_CACHE_DIR):
+        self.symbol = symbol
+        self.base_interval = base_interval
+        self.base_ms = INTERVAL_MS[base_interval]
+        self.path = os.path.join(cache_dir, f"{symbol}_{base_interval}.npy") if cache_dir else None
+        self.klines = np.empty((0, 6))
+        self._resampled = {}
+        self._history_floor_ms = None  # earliest bar the exchange has, once a backfill came back short
+        if self.path and os.path.exists(self.path):
+            try:
+                self.klines = np.load(self.path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable kline cache {self.path}: {e}", file=sys.stderr)
+
+    @property
+    def last_open_ms(self):
+        return int(self.klines[-1, TS]) if len(self.klines) else None
+
+    def _merge(self, new_klines):
+        """Appends new bars, replacing any overlap (the last stored bar may have been still open)."""
+        if new_klines is None or len(new_klines) == 0:
+            return
+        keep = self.klines[self.klines[:, TS] < new_klines[0, TS]]
+        self.klines = np.concatenate((keep, new_klines))
+        self._resampled.clear()
+
+    def ensure_history(self, interval, limit):
+        """Makes sure the base series covers the last `limit` bars of `interval`. Returns False on fetch failure."""
+        now_ms = int(time.time() * 1000)
+        wanted_start = now_ms - limit * INTERVAL_MS[interval]
+        wanted_start -= wanted_start % INTERVAL_MS[interval]
+        fetched = False
+        if not len(self.klines):
+            new_klines = fetch_binance_klines(self.symbol, self.base_interval, wanted_start, now_ms)
+            if new_klines is None:
+                return False
+            self._merge(new_klines)
+            fetched = True
+        elif self.klines[0, TS] > wanted_start and self._history_floor_ms != self.klines[0, TS]:
+            # Backfill only the missing head
+            older = fetch_binance_klines(self.symbol, self.base_interval, wanted_start, int(self.klines[0, TS]) - 1)
+            if older is None:
+                return False
+            if not len(older):
+                self._history_floor_ms = self.klines[0, TS]  # symbol has no older data
+            self.klines = np.concatenate((older[older[:, TS] < self.klines[0, TS]], self.klines))
+            self._resampled.clear()
+            fetched = True
+        if not len(self.klines):
+            return False
+        if self.last_open_ms + self.base_ms <= now_ms:
+            # Refetch from the last stored bar, which may have been stored while still open
+            new_klines = fetch_binance_klines(self.symbol, self.base_interval, self.last_open_ms, now_ms)
+            if new_klines is None:
+                return False
+            self._merge(new_klines)
+            fetched = True
+        if fetched:
+            self.save()
+        return True
+
+    def get(self, interval, limit=None):
+        """Returns the last `limit` bars of `interval` as an (N, 6) array, derived from the base series."""
+        if interval == self.base_interval:
+            bars = self.klines
+        else:
+            if INTERVAL_MS[interval] < self.base_ms:
+                raise ValueError(f"Cannot derive {interval} from {self.base_interval} base data.")
+            key = (interval, self.last_open_ms, len(self.klines))
+            bars = self._resampled.get(key)
+            if bars is None:
+                bars = resample_ohlcv(self.klines, interval)
+                self._resampled[key] = bars
+        return bars[-limit:] if limit else bars
+
+    def get_dataframe(self, interval, limit=None, index='open'):
+        return to_dataframe(self.get(interval, limit), interval, index=index)
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp.npy"
+            np.save(tmp_path, self.klines)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save kline cache {self.path}: {e}", file=sys.stderr)
+
+# --- Convenience ---
+
+_stores = {}
+
+def get_store(symbol, base_interval=DEFAULT_BASE_INTERVAL):
+    """Process-wide store per (symbol, base interval)."""
+    key = (symbol, base_interval)
+    if key not in _stores:
+        _stores[key] = KlineStore(symbol, base_interval)
+    return _stores[key]
+
+def get_klines_dataframe(symbol, interval, limit, index='open', base_interval=DEFAULT_BASE_INTERVAL):
+    """Drop-in for the scripts' get_historical_data: one base download, any coarser interval. None on failure."""
+    if INTERVAL_MS[interval] < INTERVAL_MS[base_interval]:
+        base_interval = interval  # finer than the shared base: keep it as its own base series
+    store = get_store(symbol, base_interval)
+    if not store.ensure_history(interval, limit):
+        return None
+    df = store.get_dataframe(interval, limit, index=index)
+    return df if len(df) else None
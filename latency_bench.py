@@ -0,0 +1,412 @@
+import argparse
+import contextlib
+import email
+import io
+import json
+import os
+import smtplib
+import socket
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from email.header import decode_header, make_header
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import data_sources
+from alert_gate import AlertGate
+from exchange_filters import SymbolFilters, TickLevels
+from grid_plan import grid_levels
+
+# --- Configuration ---
+
+MONITORS = ('gemini', 'trae', 'lingma')
+DEFAULT_STEPS = 200
+DEFAULT_START_PRICE = 60000.0
+DEFAULT_STEP_PCT = 0.3          # Price move per scripted tick, in %
+GRID_WIDTH_PCT = 5.0            # Benchmark grid: start price +/- this %
+GRID_LEVELS = 20
+HISTORY_POINTS = 720            # Hourly closes served as CoinGecko market_chart (lingma's parameter update)
+PERCENTILES = (50, 90, 99)
+# Report order; stages a monitor never enters are left out
+STAGES = ('fetch', 'parse', 'scan', 'format', 'mime', 'smtp_connect', 'smtp_starttls', 'smtp_login', 'smtp_send',
+          'smtp_quit', 'fetch_other', 'tick', 'e2e')
+
+# --- Stand-in Services ---
+
+def _no_delay(sock):
+    # Without this, Nagle's algorithm plus the client's delayed ACK adds ~40 ms to replies sent in two writes
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+class _PriceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real exchange
+
+    def setup(self):
+        _no_delay(self.request)
+        super().setup()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        price = self.server.price
+        if url.path == '/api/v3/ticker/price':
+            body = {'symbol': parse_qs(url.query).get('symbol', ['BTCUSDT'])[0], 'price': f"{price:.2f}"}
+        elif url.path == '/api/v3/simple/price':
+            body = {'bitcoin': {'usd': price}}
+        elif url.path.endswith('/market_chart'):
+            body = {'prices': self.server.history}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class FakePriceServer(ThreadingHTTPServer):
+    """Local stand-in for the Binance ticker and CoinGecko price/market_chart endpoints; the price is set by the harness."""
+
+    daemon_threads = True
+
+    def __init__(self, price, history=()):
+        super().__init__(('127.0.0.1', 0), _PriceHandler)
+        self.price = price
+        self.history = [list(point) for point in history]
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        _no_delay(self.request)
+        super().setup()
+
+    def _reply(self, *lines):
+        # Multi-line replies use '250-' on every line but the last
+        self.wfile.write(''.join(f"{line[:3]}{'-' if i < len(lines) - 1 else ' '}{line[4:]}\r\n"
+                                 for i, line in enumerate(lines)).encode())
+
+    def handle(self):
+        sink = self.server
+        self._reply('220 localhost SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250 localhost', '250 AUTH PLAIN', *(['250 STARTTLS'] if sink.tls_context else []))
+            elif verb == 'STARTTLS' and sink.tls_context:
+                self._reply('220 Ready to start TLS')
+                self.connection = self.request = sink.tls_context.wrap_socket(self.request, server_side=True)
+                self.rfile = self.connection.makefile('rb')
+                self.wfile = self.connection.makefile('wb', buffering=0)
+            elif verb == 'AUTH':
+                self._reply('235 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while (data_line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    lines.append(data_line)
+                received_at = time.perf_counter()
+                message = email.message_from_bytes(b''.join(lines))
+                sink.messages.append((received_at, str(make_header(decode_header(message['Subject'] or '')))))
+                self._reply('250 Queued')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+def self_signed_context(directory):
+    """Server TLS context with a throwaway self-signed certificate (needs the openssl CLI); None without it."""
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    try:
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                        '-nodes', '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=localhost'],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Could not create a TLS certificate ({e}); the SMTP sink will not offer STARTTLS.", file=sys.stderr)
+        return None
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Local SMTP server that accepts STARTTLS, any login and any message, recording when each message arrived.
+
+    smtplib's starttls() does not verify certificates by default, so the monitors'
+    send_email code runs unchanged, TLS handshake included.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, tls_context=None):
+        super().__init__(('127.0.0.1', 0), _SmtpHandler)
+        self.tls_context = tls_context
+        self.messages = []  # (perf_counter at end of DATA, subject)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+# --- Stage Timing ---
+
+class StageTimer:
+    """Latency samples per stage. Stages may nest; each sample is the stage's own time, nested stages excluded."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._nested = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.samples[name].append(elapsed - self._nested.pop())
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    def timed(self, name, fn):
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def summary(self):
+        """{stage: {'n', 'mean_ms', 'p50_ms', ..., 'max_ms'}} in STAGES order."""
+        result = {}
+        for name in sorted(self.samples, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES)):
+            ms = np.asarray(self.samples[name]) * 1000
+            result[name] = {'n': len(ms), 'mean_ms': float(ms.mean()),
+                            **{f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}, 'max_ms': float(ms.max())}
+        return result
+
+class _TimedResponse:
+    """Response proxy whose json() is timed as the 'parse' stage."""
+
+    def __init__(self, response, timer):
+        self._response = response
+        self._timer = timer
+
+    def __getattr__(self, attr):
+        return getattr(self._response, attr)
+
+    def json(self, *args, **kwargs):
+        with self._timer.stage('parse'):
+            return self._response.json(*args, **kwargs)
+
+def timed_http_get(timer, price_url):
+    """http_get timed as 'fetch' for the price endpoint and 'fetch_other' for anything else."""
+    def http_get(url, params=None, timeout=10):
+        with timer.stage('fetch' if url.startswith(price_url) else 'fetch_other'):
+            response = data_sources.http_get(url, params=params, timeout=timeout)
+        return _TimedResponse(response, timer)
+    return http_get
+
+def timed_smtp_class(timer):
+    """smtplib.SMTP with the connection (and greeting/EHLO), STARTTLS, login, send and quit timed separately."""
+    class TimedSMTP(smtplib.SMTP):
+        def __init__(self, *args, **kwargs):
+            with timer.stage('smtp_connect'):
+                super().__init__(*args, **kwargs)
+
+        def starttls(self, *args, **kwargs):
+            with timer.stage('smtp_starttls'):
+                return super().starttls(*args, **kwargs)
+
+        def login(self, *args, **kwargs):
+            with timer.stage('smtp_login'):
+                return super().login(*args, **kwargs)
+
+        def sendmail(self, *args, **kwargs):
+            with timer.stage('smtp_send'):
+                return super().sendmail(*args, **kwargs)
+
+        def quit(self):
+            with timer.stage('smtp_quit'):
+                return super().quit()
+    return TimedSMTP
+
+@contextlib.contextmanager
+def patched(target, **attrs):
+    """Temporarily replaces attributes of a module or object."""
+    saved = {name: getattr(target, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(target, name, value)
+    try:
+        yield target
+    finally:
+        for name, value in saved.items():
+            setattr(target, name, value)
+
+# --- Price Paths ---
+
+def price_path(kind, start, steps, step_pct, seed=0):
+    """Scripted prices: 'sawtooth' sweeps up and down across most of the grid, 'random' is a seeded random walk."""
+    if kind == 'sawtooth':
+        amplitude = GRID_WIDTH_PCT * 0.8
+        phase = (np.arange(steps) * step_pct + amplitude) % (4 * amplitude)
+        return start * (1 + (amplitude - np.abs(phase - 2 * amplitude)) / 100)
+    returns = np.random.default_rng(seed).normal(0, step_pct / 100, steps)
+    return start * np.exp(np.cumsum(returns))
+
+def history_points(start, count=HISTORY_POINTS, seed=0):
+    """Hourly [timestamp_ms, price] pairs ending at the start price (CoinGecko market_chart format)."""
+    walk = np.cumsum(np.random.default_rng(seed).normal(0, 0.004, count))
+    closes = start * np.exp(walk - walk[-1])
+    now_ms = int(time.time() * 1000)
+    return [[now_ms - (count - i) * 3600_000, float(p)] for i, p in enumerate(closes)]
+
+# --- Monitor Drivers ---
+# Each driver configures one monitor against the local services and returns a step() that runs one poll,
+# calling the same functions as the monitor's own loop. Alert gates have no cooldown so every crossing emails.
+
+def drive_gemini(timer, price_url, smtp_port, start):
+    import grid_trading_gemini as monitor
+    filters = SymbolFilters(monitor.SYMBOL, monitor.FALLBACK_TICK_SIZE, monitor.FALLBACK_STEP_SIZE)
+    min_price, max_price = start * (1 - GRID_WIDTH_PCT / 100), start * (1 + GRID_WIDTH_PCT / 100)
+    grid = TickLevels(filters, grid_levels(min_price, max_price, GRID_LEVELS))
+    explanation = monitor.GRID_EXPLANATION_TEMPLATE.format(method='ATR', min_p=min_price, max_p=max_price, num_g=GRID_LEVELS)
+    url = f"{price_url}/api/v3/ticker/price?symbol={monitor.SYMBOL}"
+    stack = contextlib.ExitStack()
+    stack.enter_context(patched(monitor, CURRENT_PRICE_API_URL=url, HEDGED_PRICE_FETCH=False, SMTP_SERVER='127.0.0.1',
+                                SMTP_PORT=smtp_port, alert_gate=AlertGate(monitor.ALERT_HYSTERESIS_PCT, 0),
+                                http_get=timed_http_get(timer, url),
+                                check_grid_crossings=timer.timed('scan', monitor.check_grid_crossings),
+                                format_alert=timer.timed('format', monitor.format_alert),
+                                send_email=timer.timed('mime', monitor.send_email)))
+    last_price = [None]
+
+    def step():
+        current_price = monitor.get_current_btc_price()
+        if current_price is None:
+            return
+        monitor.alert_gate.update(current_price)
+        if last_price[0] is not None:
+            monitor.check_grid_crossings(grid, filters, last_price[0], current_price,
+                                         time.strftime('%Y-%m-%d %H:%M:%S'), explanation)
+        last_price[0] = current_price
+    return step, stack
+
+def drive_trae(timer, price_url, smtp_port, start):
+    import grid_trading_trae as monitor
+    url = f"{price_url}/api/v3/ticker/price"
+    config = dict(monitor.GRID_CONFIG, price_api_url=url, hedged_fetch=False)
+    stack = contextlib.ExitStack()
+    stack.enter_context(patched(monitor, GRID_CONFIG=config,
+                                EMAIL_CONFIG=dict(monitor.EMAIL_CONFIG, smtp_server='127.0.0.1', smtp_port=smtp_port),
+                                http_get=timed_http_get(timer, url),
+                                check_signals=timer.timed('scan', monitor.check_signals),
+                                format_alert=timer.timed('format', monitor.format_alert),
+                                send_email=timer.timed('mime', monitor.send_email)))
+    params = {'min_price': start * (1 - GRID_WIDTH_PCT / 100), 'max_price': start * (1 + GRID_WIDTH_PCT / 100),
+              'num_grids': GRID_LEVELS}
+    grid = monitor.generate_grid(params, start)
+    grid['alert_gate'] = AlertGate(config['alert_hysteresis_pct'], 0)
+
+    def step():
+        price = monitor.get_bitcoin_price()
+        if price is not None:
+            monitor.check_signals(grid, price)
+    return step, stack
+
+def drive_lingma(timer, price_url, smtp_port, start):
+    import grid_trading_lingma as monitor
+    trader = monitor.BitcoinGridTrader(algorithm_type='volatility')
+    trader.api_url = f"{price_url}/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+    trader.history_url = f"{price_url}/api/v3/coins/bitcoin/market_chart"
+    trader.hedged_fetch = False
+    trader.email_config = dict(trader.email_config, smtp_server='127.0.0.1', smtp_port=smtp_port)
+    trader.alert_gate = AlertGate(0.5, 0)
+    trader.filters = SymbolFilters(trader.hub_symbol, '0.01', '0.00001')  # lingma's own fallback; no exchangeInfo request
+    trader.check_trading_signals = timer.timed('scan', trader.check_trading_signals)
+    trader.format_signal = timer.timed('format', trader.format_signal)
+    trader.send_email = timer.timed('mime', trader.send_email)
+    stack = contextlib.ExitStack()
+    stack.enter_context(patched(monitor, http_get=timed_http_get(timer, trader.api_url)))
+    return trader.check_price, stack
+
+DRIVERS = {'gemini': drive_gemini, 'trae': drive_trae, 'lingma': drive_lingma}
+
+# --- Benchmark ---
+
+def run_benchmark(monitor_name, path, server, sink):
+    """Runs one monitor over the price path. Returns (stage summary, emails received)."""
+    timer = StageTimer()
+    server.price = float(path[0])
+    step, stack = DRIVERS[monitor_name](timer, server.url, sink.port, float(path[0]))
+    first_message = len(sink.messages)
+    with stack, patched(smtplib, SMTP=timed_smtp_class(timer)), contextlib.redirect_stdout(io.StringIO()):
+        for price in path:
+            seen = len(sink.messages)
+            server.price = float(price)
+            changed_at = time.perf_counter()  # The "exchange" now shows the new price
+            step()
+            timer.add('tick', time.perf_counter() - changed_at)
+            # The sink recorded every message before the client's send returned
+            for received_at, _ in sink.messages[seen:]:
+                timer.add('e2e', received_at - changed_at)
+    return timer.summary(), len(sink.messages) - first_message
+
+def display_results(results, path_kind, steps):
+    print(f"\nTick-to-alert latency ({path_kind} path, {steps} ticks; stage times exclude nested stages)")
+    for monitor_name, (summary, emails) in results.items():
+        print(f"\n=== {monitor_name}: {emails} emails ===")
+        print(f"  {'Stage':<14}{'n':>7}{'mean':>10}" + ''.join(f"{f'p{p}':>10}" for p in PERCENTILES) + f"{'max':>10}   (ms)")
+        for stage, stats in summary.items():
+            print(f"  {stage:<14}{stats['n']:>7}{stats['mean_ms']:>10.3f}"
+                  + ''.join(f"{stats[f'p{p}_ms']:>10.3f}" for p in PERCENTILES) + f"{stats['max_ms']:>10.3f}")
+
+# --- Main Execution ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage tick-to-alert latency of the monitors against local stand-in services.")
+    parser.add_argument("--monitors", nargs='+', choices=MONITORS, default=list(MONITORS))
+    parser.add_argument("--path", choices=('sawtooth', 'random'), default='sawtooth', help="Scripted price path")
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS, help="Ticks per monitor")
+    parser.add_argument("--step-pct", type=float, default=DEFAULT_STEP_PCT, help="Price move per tick, in %%")
+    parser.add_argument("--start-price", type=float, default=DEFAULT_START_PRICE)
+    parser.add_argument("--output", type=str, default=None, help="Also write the results as JSON (a baseline to compare against)")
+    args = parser.parse_args()
+
+    prices = price_path(args.path, args.start_price, args.steps, args.step_pct)
+    with tempfile.TemporaryDirectory() as tls_dir:
+        price_server = FakePriceServer(args.start_price, history_points(args.start_price))
+        smtp_sink = SmtpSink(self_signed_context(tls_dir))
+        all_results = {name: run_benchmark(name, prices, price_server, smtp_sink) for name in args.monitors}
+        price_server.shutdown()
+        smtp_sink.shutdown()
+
+    display_results(all_results, args.path, args.steps)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'path': args.path, 'steps': args.steps, 'step_pct': args.step_pct,
+                       'monitors': {name: {'emails': emails, 'stages': summary}
+                                    for name, (summary, emails) in all_results.items()}}, f, indent=2)
+        print(f"\nResults written to {args.output}")
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+# --- Candle Ring ---
+
+class CandleRing:
+    """The last `capacity` candles of one interval, built from polled prices.
+
+    Candles live in fixed NumPy arrays used as a ring, so memory stays bounded
+    however long the monitor runs. The newest candle is the one still open; it
+    is updated in place by every tick until a tick falls into the next interval.
+    """
+
+    def __init__(self, interval_ms, capacity):
+        self.interval_ms = int(interval_ms)
+        self.capacity = int(capacity)
+        self.ts = np.zeros(self.capacity, dtype=np.int64)
+        self.ohlc = np.zeros((self.capacity, 4))  # open, high, low, close
+        self.head = -1  # slot of the newest (open) candle
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _push(self, ts, open_, high, low, close):
+        self.head = (self.head + 1) % self.capacity
+        self.ts[self.head] = ts
+        self.ohlc[self.head] = (open_, high, low, close)
+        self.size = min(self.size + 1, self.capacity)
+
+    def seed(self, ts, open_, high, low, close):
+        """Loads historical candles (oldest first; the last one may still be open)."""
+        for row in zip(ts, open_, high, low, close):
+            self._push(*row)
+
+    def update(self, price, now_ms):
+        """Folds a polled price into the open candle. Returns the candle it closed (ts, o, h, l, c), if any."""
+        bucket = int(now_ms) // self.interval_ms * self.interval_ms
+        if self.size and bucket <= self.ts[self.head]:
+            candle = self.ohlc[self.head]
+            candle[1] = max(candle[1], price)
+            candle[2] = min(candle[2], price)
+            candle[3] = price
+            return None
+        closed = (int(self.ts[self.head]), *self.ohlc[self.head]) if self.size else None
+        self._push(bucket, price, price, price, price)
+        return closed
+
+    def last(self, n):
+        """(ts, ohlc) of the newest n candles, oldest first (copies; n is capped at the ring size)."""
+        n = min(n, self.size)
+        idx = (self.head - np.arange(n)[::-1]) % self.capacity
+        return self.ts[idx], self.ohlc[idx]
+
+    def range(self, n):
+        """Lowest low and highest high over the newest n candles, the open one included."""
+        _, ohlc = self.last(n)
+        return (float(ohlc[:, 2].min()), float(ohlc[:, 1].max())) if len(ohlc) else (None, None)
+
+# --- Incremental ATR ---
+
+class IncrementalATR:
+    """Wilder-smoothed ATR updated one closed candle at a time.
+
+    Matches pandas_ta's default ATR (true range smoothed by an adjusted EWM
+    with alpha = 1/length, first true range dropped), so seeding it with the
+    same candles gives the same value as `df.ta.atr(length)` without keeping
+    or recomputing the history.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.prev_close = None
+        self.weighted_sum = 0.0
+        self.weight = 0.0
+        self.count = 0
+
+    def update(self, high, low, close):
+        if self.prev_close is not None:
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            self.weighted_sum = true_range + self.decay * self.weighted_sum
+            self.weight = 1.0 + self.decay * self.weight
+            self.count += 1
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self):
+        return self.weighted_sum / self.weight if self.count >= self.length else math.nan
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from data_sources import http_get
+
+# --- Configuration ---
+
+BULK_PRICE_API_URL = "https://api.binance.com/api/v3/ticker/price"
+KLINE_API_URL = "https://api.binance.com/api/v3/klines"
+DEFAULT_SYMBOLS = ["BTCUSDT"]
+POLL_INTERVAL_SECONDS = 2      # One bulk ticker request per interval, whatever the number of symbols
+CANDLE_INTERVAL = '1m'         # Closed candles published to the candle ring
+CANDLE_REFRESH_SECONDS = 60
+TICK_CAPACITY = 4096           # Ring sizes (records); old records are overwritten
+CANDLE_CAPACITY = 1440
+DEFAULT_MAX_AGE_SECONDS = 10   # Readers ignore the hub if its newest tick is older than this
+
+SEGMENT_PREFIX = "grid_md_"
+MAGIC = 0x47524944             # 'GRID'
+
+# Header slots (int64)
+H_MAGIC, H_TICK_CAP, H_CANDLE_CAP, H_TICK_SEQ, H_CANDLE_SEQ, H_HEARTBEAT_MS, H_PID = range(7)
+HEADER_SLOTS = 16
+# Tick record: [timestamp_ms, price, latency_ms, source]; candle record: [open_ms, open, high, low, close, volume]
+TICK_FIELDS = 4
+CANDLE_FIELDS = 6
+SOURCE_BINANCE = 0
+
+# --- Shared Memory Layout ---
+
+def segment_name(symbol):
+    return f"{SEGMENT_PREFIX}{symbol.lower()}"
+
+def _segment_size(tick_capacity, candle_capacity):
+    return 8 * (HEADER_SLOTS + tick_capacity * TICK_FIELDS + candle_capacity * CANDLE_FIELDS)
+
+def _views(buf, tick_capacity, candle_capacity):
+    """Numpy views over the segment: header, tick ring, candle ring (no copies)."""
+    header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=buf)
+    offset = 8 * HEADER_SLOTS
+    ticks = np.ndarray((tick_capacity, TICK_FIELDS), dtype=np.float64, buffer=buf, offset=offset)
+    offset += 8 * tick_capacity * TICK_FIELDS
+    candles = np.ndarray((candle_capacity, CANDLE_FIELDS), dtype=np.float64, buffer=buf, offset=offset)
+    return header, ticks, candles
+
+def _attach(name):
+    """Attaches to an existing segment without letting this process's resource tracker unlink it on exit."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+def _pid_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True  # exists but belongs to another user (or cannot be probed)
+    return True
+
+# --- Writer ---
+
+class MarketDataRing:
+    """Single-writer ring buffers for one symbol in a shared memory segment.
+
+    A record is written first and the sequence counter bumped after, so readers
+    only ever see complete records; a reader that fell a full ring behind detects
+    it from the counter and retries. Only one live hub may own a symbol's segment;
+    a segment left by a hub that is no longer running is replaced.
+    """
+
+    def __init__(self, symbol, tick_capacity=TICK_CAPACITY, candle_capacity=CANDLE_CAPACITY):
+        self.symbol = symbol
+        name = segment_name(symbol)
+        try:
+            existing = _attach(name)
+        except FileNotFoundError:
+            existing = None
+        if existing is not None:
+            header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=existing.buf)
+            owner_pid = int(header[H_PID]) if header[H_MAGIC] == MAGIC else 0
+            header = None
+            existing.close()
+            if _pid_alive(owner_pid):
+                raise RuntimeError(f"A market data hub (pid {owner_pid}) is already publishing {symbol}.")
+            existing.unlink()  # left behind by a crashed hub
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=_segment_size(tick_capacity, candle_capacity))
+        except FileExistsError:
+            raise RuntimeError(f"Another market data hub is starting up for {symbol}.") from None
+        self.header, self.ticks, self.candles = _views(self.shm.buf, tick_capacity, candle_capacity)
+        self.header[:] = 0
+        self.header[H_TICK_CAP] = tick_capacity
+        self.header[H_CANDLE_CAP] = candle_capacity
+        self.header[H_PID] = os.getpid()
+        self.header[H_MAGIC] = MAGIC  # written last: readers treat the segment as ready from here on
+        self.last_candle_ms = None
+
+    def publish_tick(self, timestamp_ms, price, latency_ms=0.0, source=SOURCE_BINANCE):
+        seq = int(self.header[H_TICK_SEQ])
+        self.ticks[seq % len(self.ticks)] = (timestamp_ms, price, latency_ms, source)
+        self.header[H_TICK_SEQ] = seq + 1
+        self.header[H_HEARTBEAT_MS] = timestamp_ms
+
+    def publish_candle(self, open_ms, open_, high, low, close, volume):
+        if self.last_candle_ms is not None and open_ms <= self.last_candle_ms:
+            return
+        seq = int(self.header[H_CANDLE_SEQ])
+        self.candles[seq % len(self.candles)] = (open_ms, open_, high, low, close, volume)
+        self.header[H_CANDLE_SEQ] = seq + 1
+        self.last_candle_ms = open_ms
+
+    def close(self):
+        # Release our numpy views before closing, otherwise the buffer is still exported
+        self.header = self.ticks = self.candles = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+# --- Reader ---
+
+class MarketDataReader:
+    """Read-only, zero-copy access to a hub segment. Raises FileNotFoundError if no hub publishes the symbol."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.shm = _attach(segment_name(symbol))
+        header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        if header[H_MAGIC] != MAGIC:
+            header = None
+            self.shm.close()
+            raise FileNotFoundError(f"Market data segment for {symbol} is not initialised yet.")
+        self.header, self.ticks, self.candles = _views(self.shm.buf, int(header[H_TICK_CAP]), int(header[H_CANDLE_CAP]))
+
+    def heartbeat_age(self):
+        return time.time() - self.header[H_HEARTBEAT_MS] / 1000.0
+
+    def latest_tick(self, max_age_seconds=None):
+        """Returns (timestamp_ms, price) of the newest tick, or None if there is none or it is too old."""
+        if max_age_seconds is not None and self.heartbeat_age() > max_age_seconds:
+            return None  # cheap check first: no fresh tick was published at all
+        capacity = len(self.ticks)
+        for _ in range(3):
+            seq = int(self.header[H_TICK_SEQ])
+            if seq == 0:
+                return None
+            row = self.ticks[(seq - 1) % capacity]
+            timestamp_ms, price = row[0], row[1]
+            # The writer may be filling slot `seq + capacity - 1`, which is the one just read
+            if int(self.header[H_TICK_SEQ]) - seq < capacity - 1:
+                return int(timestamp_ms), float(price)
+        return None
+
+    def latest_price(self, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        tick = self.latest_tick(max_age_seconds)
+        return tick[1] if tick else None
+
+    def recent_candles(self, count):
+        """Returns up to `count` newest closed candles, oldest first.
+
+        The result is a view into shared memory unless the range wraps around the
+        end of the ring, in which case the two pieces are joined into a copy.
+        """
+        capacity = len(self.candles)
+        seq = int(self.header[H_CANDLE_SEQ])
+        count = min(count, seq, capacity)
+        if count == 0:
+            return self.candles[:0]
+        start, end = (seq - count) % capacity, seq % capacity or capacity
+        if start < end:
+            return self.candles[start:end]
+        return np.concatenate((self.candles[start:], self.candles[:end]))
+
+    def close(self):
+        self.header = self.ticks = self.candles = None
+        self.shm.close()
+
+_readers = {}
+
+def read_hub_price(symbol, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+    """Latest hub price for `symbol`, or None when no hub is running (callers then fetch over HTTP)."""
+    reader = _readers.get(symbol)
+    if reader is None:
+        try:
+            reader = MarketDataReader(symbol)
+        except (FileNotFoundError, ValueError):
+            return None
+        _readers[symbol] = reader
+    price = reader.latest_price(max_age_seconds)
+    if price is None:
+        # Hub stopped (or was restarted under a new segment): re-attach on the next call
+        reader.close()
+        del _readers[symbol]
+    return price
+
+# --- Hub Process ---
+
+def fetch_bulk_prices(symbols):
+    """One request for every symbol's latest price. Returns {symbol: price} (invalid symbols left out) or None."""
+    try:
+        params = {'symbols': json.dumps(symbols, separators=(',', ':'))}
+        response = http_get(BULK_PRICE_API_URL, params=params, timeout=5)
+        if response.status_code == 400 and len(symbols) > 1:
+            # One invalid symbol fails the whole list; the unfiltered ticker lists every valid symbol
+            response = http_get(BULK_PRICE_API_URL, timeout=10)
+        response.raise_for_status()
+        wanted = set(symbols)
+        return {item['symbol']: float(item['price']) for item in response.json() if item['symbol'] in wanted}
+    except Exception as e:
+        print(f"Error fetching bulk prices: {e}", file=sys.stderr)
+        return None
+
+def fetch_last_closed_candle(symbol, interval):
+    try:
+        params = {'symbol': symbol, 'interval': interval, 'limit': 2}
+        response = http_get(KLINE_API_URL, params=params, timeout=5)
+        response.raise_for_status()
+        rows = response.json()
+        return [float(v) for v in rows[0][:6]] if len(rows) == 2 else None  # rows[1] is still open
+    except Exception as e:
+        print(f"Error fetching {interval} candle for {symbol}: {e}", file=sys.stderr)
+        return None
+
+def run_hub(symbols, poll_interval=POLL_INTERVAL_SECONDS, candle_refresh=CANDLE_REFRESH_SECONDS):
+    """Owns the market data connections and publishes every symbol into its own ring."""
+    symbols = list(dict.fromkeys(symbols))
+    rings = {}
+    try:
+        for symbol in symbols:
+            rings[symbol] = MarketDataRing(symbol)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        for ring in rings.values():
+            ring.close()
+        return False
+    running = [True]
+
+    def stop(*_):
+        running[0] = False
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Market data hub publishing {', '.join(symbols)} (poll {poll_interval}s)")
+    next_candle_poll = 0.0
+    try:
+        while running[0]:
+            started = time.time()
+            prices = fetch_bulk_prices(symbols)
+            latency_ms = (time.time() - started) * 1000
+            now_ms = int(time.time() * 1000)
+            for symbol, ring in rings.items():
+                if prices and symbol in prices:
+                    ring.publish_tick(now_ms, prices[symbol], latency_ms)
+
+            if started >= next_candle_poll:
+                for symbol, ring in rings.items():
+                    candle = fetch_last_closed_candle(symbol, CANDLE_INTERVAL)
+                    if candle:
+                        ring.publish_candle(*candle)
+                next_candle_poll = started + candle_refresh
+
+            time.sleep(max(0.0, poll_interval - (time.time() - started)))
+    finally:
+        for ring in rings.values():
+            ring.close()
+        print("Market data hub stopped.")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish market data to shared memory for co-located monitors.")
+    parser.add_argument("--symbols", nargs='+', default=DEFAULT_SYMBOLS, help="Binance symbols to publish")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SECONDS, help="Seconds between price polls")
+    args = parser.parse_args()
+    if not run_hub([s.upper() for s in args.symbols], args.interval):
+        sys.exit(1)
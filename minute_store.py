@@ -0,0 +1,199 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from compact_history import DTYPES, CompactHistory
+from kline_store import INTERVAL_MS, KLINE_CACHE_DIR, TS, fetch_binance_klines
+from monte_carlo import bars_to_path
+
+# --- Configuration ---
+
+DAY_MS = INTERVAL_MS['1d']
+MINUTE_MS = INTERVAL_MS['1m']
+FETCH_CHUNK_DAYS = 30           # Days downloaded per request loop when building the store
+
+# --- Minute Store ---
+
+class MinuteStore:
+    """1m klines kept as a CompactHistory under <cache_dir>/<symbol>_1m/, opened memory-mapped.
+
+    Prices are stored as scaled int32 where that is lossless (see compact_history.py),
+    so years of minutes stay small on disk and in the page cache. A day index (row
+    offset of each UTC day) makes a day's minutes a zero-copy slice, so an evaluation
+    only pages in the days it actually reads. Stores written as float64 columns
+    still open and are re-encoded on the next append.
+    """
+
+    def __init__(self, symbol, cache_dir=KLINE_CACHE_DIR, dtype='auto'):
+        self.symbol = symbol
+        self.root = os.path.join(cache_dir, f"{symbol}_1m")
+        self.dtype = dtype
+        self.history = CompactHistory.empty(symbol, '1m')
+        self.first_day_ms = None
+        self.day_offsets = np.zeros(1, dtype=np.int64)
+        self.open()
+
+    def open(self):
+        """(Re)maps the column files; an empty store if none have been written yet."""
+        try:
+            self.history = CompactHistory.load(self.root)
+        except FileNotFoundError:
+            self.history = CompactHistory.empty(self.symbol, '1m')
+            return
+        ts = self.history.ts
+        if not len(ts):
+            return
+        self.first_day_ms = int(ts[0]) // DAY_MS * DAY_MS
+        day_starts = self.first_day_ms + DAY_MS * np.arange(int(ts[-1] - self.first_day_ms) // DAY_MS + 2)
+        self.day_offsets = np.searchsorted(ts, day_starts)
+
+    def __len__(self):
+        return len(self.history)
+
+    def last_ts(self):
+        return self.history.last_ts()
+
+    def append(self, klines):
+        """Adds (N, 6) 1m klines newer than the stored ones and rewrites the column files atomically."""
+        klines = np.asarray(klines, dtype=np.float64).reshape(-1, 6)
+        if len(self):
+            klines = klines[klines[:, TS] > self.last_ts()]
+        if not len(klines):
+            return 0
+        new = CompactHistory.from_klines(klines)
+        old_ohlc = self.history.ohlc() if len(self) else ((),) * 4
+        ts = np.concatenate((np.asarray(self.history.ts), new.ts))
+        ohlc = (np.concatenate((old, values)) for old, values in zip(old_ohlc, new.ohlc()))
+        self.rewrite(CompactHistory.from_arrays(ts, *ohlc, symbol=self.symbol, interval='1m', dtype=self.dtype))
+        return len(klines)
+
+    def rewrite(self, history):
+        # Drop this store's maps first; save() writes a new generation and never touches the mapped files
+        self.history = CompactHistory.empty(self.symbol, '1m')
+        history.save(self.root)
+        self.open()
+
+    def recompact(self):
+        """Re-encodes the stored minutes with self.dtype (e.g. to convert a float64 store in place)."""
+        if len(self):
+            self.rewrite(CompactHistory.from_arrays(self.history.ts, *self.history.ohlc(),
+                                                    symbol=self.symbol, interval='1m', dtype=self.dtype))
+
+    def has_day(self, day_ms):
+        if not len(self):
+            return False
+        i = (int(day_ms) - self.first_day_ms) // DAY_MS
+        return bool(0 <= i < len(self.day_offsets) - 1 and self.day_offsets[i + 1] > self.day_offsets[i])
+
+    def day(self, day_ms):
+        """(open, high, low, close) float64 arrays for the UTC day starting at day_ms (empty if not stored)."""
+        i = (int(day_ms) - self.first_day_ms) // DAY_MS if len(self) else -1
+        if not 0 <= i < len(self.day_offsets) - 1:
+            return tuple(np.empty(0) for _ in range(4))
+        return self.history[self.day_offsets[i]:self.day_offsets[i + 1]].ohlc()
+
+    def download(self, start_ms, end_ms=None):
+        """Fills the store from Binance up to end_ms, continuing after the newest stored minute.
+
+        Chunks are collected in memory and written with a single append at the end (also
+        when the download is interrupted), so the files are rewritten once, not once per chunk.
+        """
+        end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+        cursor = self.last_ts() + MINUTE_MS if len(self) else int(start_ms)
+        chunks, fetched = [], 0
+        try:
+            while cursor <= end_ms:
+                chunk_end = min(end_ms, cursor + FETCH_CHUNK_DAYS * DAY_MS - 1)
+                klines = fetch_binance_klines(self.symbol, '1m', cursor, chunk_end)
+                if klines is None:
+                    break
+                chunks.append(klines)
+                fetched += len(klines)
+                cursor = chunk_end + 1
+                print(f"{self.symbol} 1m download: {fetched} minutes, up to {time.strftime('%Y-%m-%d', time.gmtime(cursor / 1000))}")
+        finally:
+            added = self.append(np.concatenate(chunks)) if chunks else 0
+        return added
+
+# --- Intrabar Paths ---
+
+def touched_bars(low, high, levels):
+    """Boolean mask of bars whose [low, high] contains at least one of the (sorted) levels."""
+    levels = np.sort(np.asarray(levels, dtype=np.float64))
+    i = np.searchsorted(levels, np.asarray(low, dtype=np.float64), side='left')
+    inside = i < len(levels)
+    inside[inside] = levels[i[inside]] <= np.asarray(high, dtype=np.float64)[inside]
+    return inside
+
+def compress_path(path, levels):
+    """Drops path points that sit on the same side of every level as the point before them.
+
+    Such points cannot trigger or cancel any fill, so the grid outcome is
+    unchanged while a day of 1m bars shrinks to the few points that matter.
+    """
+    levels = np.sort(np.asarray(levels, dtype=np.float64))
+    below = np.searchsorted(levels, path, side='left')   # number of levels strictly below the price
+    above = np.searchsorted(levels, path, side='right')  # ... at or below the price
+    keep = np.r_[True, (below[1:] != below[:-1]) | (above[1:] != above[:-1])]
+    keep[-1] = True  # the final price values the position
+    return path[keep]
+
+def intrabar_path(store, day_ms, open_, high, low, close, levels):
+    """Price path over daily bars using the stored 1m bars of every day that touched a level.
+
+    Days that touched no level cannot produce a fill, so their own open/high/low/close
+    stand in for them; days missing from the store fall back to the same guess.
+    Returns (path, num_days_loaded).
+    """
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    touched = touched_bars(low, high, levels)
+    pieces, loaded = [], 0
+    for i in range(len(close)):
+        if touched[i] and store is not None and store.has_day(day_ms[i]):
+            pieces.append(bars_to_path(*store.day(day_ms[i])))
+            loaded += 1
+        else:
+            pieces.append(bars_to_path(open_[i:i + 1], high[i:i + 1], low[i:i + 1], close[i:i + 1]))
+    if not pieces:
+        return np.empty(0), loaded
+    return compress_path(np.concatenate(pieces), levels), loaded
+
+_stores = {}
+
+def get_minute_store(symbol, cache_dir=KLINE_CACHE_DIR):
+    """Per-process MinuteStore (worker processes map the files themselves)."""
+    key = (symbol, cache_dir)
+    if key not in _stores:
+        _stores[key] = MinuteStore(symbol, cache_dir)
+    return _stores[key]
+
+# --- Main Execution ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped 1m kline store used for intrabar evaluation.")
+    parser.add_argument("--symbol", type=str, default="BTCUSDT")
+    parser.add_argument("--years", type=float, default=3, help="Years of 1m history to download (default: 3)")
+    parser.add_argument("--import-file", type=str, default=None,
+                        help="Import a Binance/ccxt 1m CSV (or .npy) instead of downloading")
+    parser.add_argument("--dtype", choices=DTYPES, default='auto',
+                        help="Price storage: 'auto' (lossless int32/float32, else float64) or a forced dtype")
+    parser.add_argument("--recompact", action="store_true", help="Re-encode the existing store with --dtype")
+    args = parser.parse_args()
+
+    store = MinuteStore(args.symbol.upper(), dtype=args.dtype)
+    if args.recompact:
+        store.recompact()
+    if args.import_file:
+        from paper_exchange import load_klines
+        added = store.append(load_klines(args.import_file))
+    else:
+        added = store.download(int((time.time() - args.years * 365 * 86400) * 1000))
+    if not len(store):
+        print("The 1m store is empty.", file=sys.stderr)
+        sys.exit(1)
+    history = store.history
+    print(f"Added {added} minutes; {store.root} holds {len(store)} minutes "
+          f"({history.dtype} prices, {history.nbytes / 2**20:.1f} MiB).")
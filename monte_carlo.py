@@ -0,0 +1,180 @@
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from grid_plan import GridPlan
+
+# --- Configuration ---
+
+DEFAULT_NUM_PATHS = 20000
+DEFAULT_HORIZON_BARS = 30       # Bars of the history interval to simulate (30 daily bars = ~1 month)
+DEFAULT_METHOD = 'bootstrap'    # 'bootstrap' (resample historical returns) or 'gbm'
+PATHS_PER_WORKER = 5000         # Below this a process pool costs more than it saves
+REPORT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# --- Grid Slots ---
+
+def plan_to_slots(plan, base_asset='btc', step=None):
+    """Turns planner actions (a GridPlan or a list of action dicts) into grid slots that trade back and forth.
+
+    A BUY action at P starts holding quote and re-sells one step higher; a SELL
+    action at P starts holding base and buys back one step lower. The step is
+    taken from the spacing of the plan's levels when not given.
+    Returns (lower, upper, holds_base, base_qty, quote_qty) arrays.
+    """
+    if isinstance(plan, GridPlan):  # columns already in place, no per-level dicts needed
+        prices, is_sell = plan.price, plan.is_sell
+        base_qty = np.where(is_sell, plan.base_qty, 0.0)
+        quote_qty = np.where(is_sell, 0.0, plan.quote_qty)
+    else:
+        prices = np.array([item['price'] for item in plan], dtype=np.float64)
+        is_sell = np.array([item['type'] == 'SELL' for item in plan], dtype=bool)
+        base_qty = np.array([item.get(f'{base_asset}_amount', 0.0) if item['type'] == 'SELL' else 0.0 for item in plan])
+        quote_qty = np.array([item.get('usdt_amount', 0.0) if item['type'] == 'BUY' else 0.0 for item in plan])
+    if step is None:
+        spacing = np.diff(np.unique(prices))
+        step = float(np.median(spacing)) if len(spacing) else math.inf  # single level: no round trips
+    lower = np.where(is_sell, prices - step, prices)
+    upper = np.where(is_sell, prices, prices + step)
+    return lower, upper, is_sell, base_qty, quote_qty
+
+def simulate_slots(paths, lower, upper, holds_base, base_qty, quote_qty, fee_pct=0.0):
+    """Runs every slot over every path at once. paths is (num_paths, num_steps).
+
+    Returns (base, quote, fills): per-path final base and quote held by the grid
+    and the number of fills. Orders fill at their limit price.
+    """
+    num_paths = paths.shape[0]
+    fee = fee_pct / 100.0
+    holding = np.broadcast_to(holds_base, (num_paths, len(lower))).copy()
+    base = np.where(holding, base_qty, 0.0)
+    quote = np.where(holding, 0.0, quote_qty)
+    fills = np.zeros(num_paths, dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        for t in range(paths.shape[1]):
+            price = paths[:, t:t + 1]
+            buy = ~holding & (price <= lower)
+            sell = holding & (price >= upper)
+            if not (buy.any() or sell.any()):
+                continue
+            new_base = np.where(buy, quote / lower * (1 - fee), np.where(sell, 0.0, base))
+            quote = np.where(sell, base * upper * (1 - fee), np.where(buy, 0.0, quote))
+            base = new_base
+            holding = (holding | buy) & ~sell
+            fills += buy.sum(axis=1) + sell.sum(axis=1)
+    return base.sum(axis=1), quote.sum(axis=1), fills
+
+def bars_to_path(open_, high, low, close):
+    """Flattens OHLC bars into a price path (open, extremes, close per bar).
+
+    The intrabar order is a guess: up bars are assumed to visit the low first,
+    down bars the high first.
+    """
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    up = close >= open_
+    path = np.empty((len(open_), 4))
+    path[:, 0] = open_
+    path[:, 1] = np.where(up, low, high)
+    path[:, 2] = np.where(up, high, low)
+    path[:, 3] = close
+    return path.ravel()
+
+# --- Path Generation ---
+
+def historical_log_returns(df_history):
+    close = df_history['Close'].astype(float).dropna().to_numpy()
+    return np.diff(np.log(close[close > 0]))
+
+def generate_paths(log_returns, start_price, num_paths, horizon, method=DEFAULT_METHOD, rng=None):
+    """Future price paths (num_paths, horizon) from bootstrapped returns or a GBM fitted to them."""
+    rng = np.random.default_rng() if rng is None else rng
+    if method == 'bootstrap':
+        steps = rng.choice(log_returns, size=(num_paths, horizon), replace=True)
+    elif method == 'gbm':
+        steps = rng.normal(log_returns.mean(), log_returns.std(ddof=1), size=(num_paths, horizon))
+    else:
+        raise ValueError(f"Unknown simulation method '{method}' (use 'bootstrap' or 'gbm').")
+    return start_price * np.exp(np.cumsum(steps, axis=1))
+
+def _simulate_chunk(args):
+    """Worker: generate one chunk of paths and evaluate the grid on it."""
+    (seed, num_paths, log_returns, start_price, horizon, method, slots, fee_pct, min_price, max_price) = args
+    rng = np.random.default_rng(seed)
+    paths = generate_paths(log_returns, start_price, num_paths, horizon, method, rng)
+    base, quote, fills = simulate_slots(paths, *slots, fee_pct=fee_pct)
+    final_price = paths[:, -1]
+    return {
+        'final_value': quote + base * final_price,
+        'final_price': final_price,
+        'fills': fills,
+        'break_down': paths.min(axis=1) < min_price,
+        'break_up': paths.max(axis=1) > max_price,
+    }
+
+# --- Simulation ---
+
+def simulate_plan_outcomes(plan, df_history, current_price, min_price, max_price,
+                           num_paths=DEFAULT_NUM_PATHS, horizon=DEFAULT_HORIZON_BARS, method=DEFAULT_METHOD,
+                           fee_pct=0.0, base_asset='btc', workers=None, seed=None):
+    """Monte Carlo spread of outcomes for a grid plan. Returns a report dict, or None on bad inputs."""
+    if not plan or df_history is None or current_price is None:
+        print("Nothing to simulate (empty plan or missing market data).", file=sys.stderr)
+        return None
+    log_returns = historical_log_returns(df_history)
+    if len(log_returns) < 2:
+        print("Not enough history to calibrate the simulation.", file=sys.stderr)
+        return None
+
+    slots = plan_to_slots(plan, base_asset)
+    _, _, holds_base, base_qty, quote_qty = slots
+    initial_base, initial_quote = base_qty[holds_base].sum(), quote_qty[~holds_base].sum()
+    initial_value = initial_quote + initial_base * current_price
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, math.ceil(num_paths / PATHS_PER_WORKER)))
+    chunk_sizes = [len(c) for c in np.array_split(np.arange(num_paths), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [(s, n, log_returns, current_price, horizon, method, slots, fee_pct, min_price, max_price)
+            for s, n in zip(seeds, chunk_sizes)]
+    if workers == 1:
+        results = [_simulate_chunk(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_chunk, jobs))
+
+    merged = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    pnl = merged['final_value'] - initial_value
+    hold_value = initial_quote + initial_base * merged['final_price']
+    return {
+        'method': method,
+        'num_paths': num_paths,
+        'horizon': horizon,
+        'initial_value': initial_value,
+        'pnl_percentiles': dict(zip(REPORT_PERCENTILES, np.percentile(pnl, REPORT_PERCENTILES))),
+        'mean_pnl': pnl.mean(),
+        'prob_loss': (pnl < 0).mean(),
+        'mean_excess_vs_hold': (merged['final_value'] - hold_value).mean(),
+        'mean_fills': merged['fills'].mean(),
+        'prob_breakout': (merged['break_down'] | merged['break_up']).mean(),
+        'prob_break_down': merged['break_down'].mean(),
+        'prob_break_up': merged['break_up'].mean(),
+    }
+
+def display_simulation(report, quote_asset='USDT'):
+    """Prints a simulation report under the plan."""
+    if report is None:
+        return
+    print("Outcome Simulation:")
+    print(f"  Method: {report['method']}, Paths: {report['num_paths']}, Horizon: {report['horizon']} bars")
+    print(f"  Starting Value: {report['initial_value']:.4f} {quote_asset}")
+    for pct, value in report['pnl_percentiles'].items():
+        print(f"  PnL P{pct:<2}: {value:+.4f} {quote_asset}")
+    print(f"  Mean PnL: {report['mean_pnl']:+.4f} {quote_asset} (vs. just holding: {report['mean_excess_vs_hold']:+.4f})")
+    print(f"  Probability of Loss: {report['prob_loss']:.1%}, Mean Fills/Path: {report['mean_fills']:.1f}")
+    print(f"  Probability of Leaving Range: {report['prob_breakout']:.1%} "
+          f"(below: {report['prob_break_down']:.1%}, above: {report['prob_break_up']:.1%})")
+    print("="*60)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+from email.mime.text import MIMEText
+
+import numpy as np
+import pandas as pd
+
+from alert_gate import AlertGate
+from exchange_filters import SymbolFilters, TickLevels, load_filters_for_symbols
+from grid_plan import grid_levels
+from market_data_hub import fetch_bulk_prices
+
+# --- Configuration ---
+
+POLL_INTERVAL_SECONDS = 5       # One bulk ticker request per interval for every symbol
+MAX_SYMBOLS_PER_REQUEST = 400   # Bulk requests are split beyond this (keeps the URL short)
+FALLBACK_TICK_SIZE = '0.00000001'  # Used for symbols whose exchange filters are unavailable
+NOTIFY_BATCH_SECONDS = 2        # Signals arriving within this window go out in one email
+STATUS_INTERVAL_SECONDS = 300   # How often polling statistics are printed
+ALERT_HYSTERESIS_PCT = 0.5
+ALERT_COOLDOWN_SECONDS = 300
+
+SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+EMAIL_SENDER = os.environ.get('EMAIL_SENDER', '')
+EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', '')
+EMAIL_RECEIVER = os.environ.get('EMAIL_RECEIVER', '')
+
+# --- Grids ---
+
+NO_LEVEL_BELOW, NO_LEVEL_ABOVE = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+class WatchedGrid:
+    """One grid on one symbol: its levels in ticks and its own alert gate."""
+
+    __slots__ = ('name', 'symbol', 'levels', 'gate')
+
+    def __init__(self, name, symbol, filters, min_price, max_price, num_grids):
+        self.name = name
+        self.symbol = symbol
+        self.levels = TickLevels(filters, grid_levels(min_price, max_price, num_grids))
+        self.gate = AlertGate(ALERT_HYSTERESIS_PCT, ALERT_COOLDOWN_SECONDS)
+
+    def bounds(self, tick):
+        """Nearest level at or below and at or above `tick` (sentinels where there is none).
+
+        Moving from `tick` to another tick crosses a level only if the new tick reaches one of these.
+        """
+        ticks = self.levels.ticks
+        i, j = np.searchsorted(ticks, tick, 'right'), np.searchsorted(ticks, tick, 'left')
+        return (int(ticks[i - 1]) if i > 0 else NO_LEVEL_BELOW), (int(ticks[j]) if j < len(ticks) else NO_LEVEL_ABOVE)
+
+    def crossings(self, last_tick, tick, price):
+        """Signals (grid, symbol, side, level, price) for the levels crossed between two ticks."""
+        if tick < last_tick:
+            side, crossed = 'BUY', self.levels.crossed_down(last_tick, tick)
+        else:
+            side, crossed = 'SELL', self.levels.crossed_up(last_tick, tick)
+        signals = []
+        for level_tick in crossed:
+            key = self.levels.key(side, level_tick)
+            level = float(self.levels.prices[self.levels.index[int(level_tick)]])
+            if self.gate.should_alert(key, side, level, price):
+                signals.append((self.name, self.symbol, side, self.levels.filters.format_price(level_tick), price))
+        return signals
+
+def load_grids(path):
+    """Reads grids from a CSV or Parquet file with 'symbol', 'min_price', 'max_price' and 'grids' columns (optional 'name').
+
+    Returns a list of (name, symbol, min_price, max_price, num_grids), or None on error.
+    """
+    try:
+        df = pd.read_parquet(path) if path.lower().endswith(('.parquet', '.pq')) else pd.read_csv(path)
+        symbols = df['symbol'].astype(str).str.upper()
+        names = df['name'].astype(str) if 'name' in df.columns else [f"{s}#{i}" for i, s in enumerate(symbols)]
+        return list(zip(names, symbols, df['min_price'].astype(float), df['max_price'].astype(float),
+                        df['grids'].astype(int)))
+    except Exception as e:
+        print(f"Error reading grids file {path}: {e}", file=sys.stderr)
+        return None
+
+# --- Monitor ---
+
+class MultiMonitor:
+    """Hundreds of grids over many symbols in one process.
+
+    Symbols and grids each have a slot in fixed NumPy arrays: per symbol the
+    tick size, last tick and last price, per grid the nearest level below and
+    above the last tick. A price update is one vectorized tick conversion and
+    a few comparisons over all grids; only grids whose band was left (a level
+    was crossed) or whose price reached a re-arm threshold run any Python.
+    """
+
+    def __init__(self, grids, filters_by_symbol):
+        self.symbols = sorted({symbol for _, symbol, *_ in grids})
+        self.slot = {symbol: i for i, symbol in enumerate(self.symbols)}
+        fallback = {s: SymbolFilters(s, FALLBACK_TICK_SIZE, FALLBACK_TICK_SIZE) for s in self.symbols
+                    if s not in filters_by_symbol}
+        if fallback:
+            print(f"No exchange filters for {', '.join(fallback)}; using tick size {FALLBACK_TICK_SIZE}.", file=sys.stderr)
+        # With filters for some symbols, the others are not listed on the exchange (typos, delisted pairs)
+        self.unlisted = set(fallback) if len(fallback) < len(self.symbols) else set()
+        filters = {**fallback, **filters_by_symbol}
+        self.tick_size = np.array([filters[s].tick for s in self.symbols])
+        self.last_tick = np.full(len(self.symbols), -1, dtype=np.int64)  # -1: no price seen yet
+        self.last_price = np.zeros(len(self.symbols))
+        self.grids = [WatchedGrid(name, symbol, filters[symbol], min_price, max_price, num_grids)
+                      for name, symbol, min_price, max_price, num_grids in grids]
+        self.grid_slot = np.array([self.slot[grid.symbol] for grid in self.grids], dtype=np.int64)
+        # Every grid is "crossed" on its symbol's first price, which only sets its band
+        self.below = np.full(len(self.grids), NO_LEVEL_ABOVE, dtype=np.int64)
+        self.above = np.full(len(self.grids), NO_LEVEL_BELOW, dtype=np.int64)
+        # Prices at which each grid's gate could re-arm a disarmed level (none: +inf / -inf)
+        self.rearm_up = np.full(len(self.grids), np.inf)
+        self.rearm_down = np.full(len(self.grids), -np.inf)
+
+    @property
+    def num_levels(self):
+        return sum(len(grid.levels) for grid in self.grids)
+
+    def on_prices(self, prices):
+        """Routes a {symbol: price} update (all symbols or a few) to the grids. Returns the signals raised."""
+        known = [(self.slot[s], p) for s, p in prices.items() if s in self.slot]
+        if not known:
+            return []
+        slots = np.fromiter((i for i, _ in known), dtype=np.int64, count=len(known))
+        price_arr = np.fromiter((p for _, p in known), dtype=np.float64, count=len(known))
+        previous = self.last_tick.copy()
+        self.last_tick[slots] = np.rint(price_arr / self.tick_size[slots]).astype(np.int64)
+        self.last_price[slots] = price_arr
+
+        grid_price = self.last_price[self.grid_slot]
+        for g in np.flatnonzero((grid_price >= self.rearm_up) | (grid_price <= self.rearm_down)):
+            gate = self.grids[g].gate
+            gate.update(float(grid_price[g]))
+            self.rearm_up[g], self.rearm_down[g] = gate.rearm_bounds()
+
+        current = self.last_tick[self.grid_slot]
+        moved = (current >= 0) & (current != previous[self.grid_slot])
+        signals = []
+        for g in np.flatnonzero(moved & ((current <= self.below) | (current >= self.above))):
+            grid, slot = self.grids[g], self.grid_slot[g]
+            tick = int(current[g])
+            if previous[slot] >= 0:
+                signals.extend(grid.crossings(int(previous[slot]), tick, float(self.last_price[slot])))
+                self.rearm_up[g], self.rearm_down[g] = grid.gate.rearm_bounds()
+            self.below[g], self.above[g] = grid.bounds(tick)
+        return signals
+
+# --- Notifier ---
+
+def send_email(subject, body):
+    """Sends an email notification."""
+    if not EMAIL_SENDER or '@' not in EMAIL_SENDER or not EMAIL_PASSWORD or not EMAIL_RECEIVER:
+        print("Email configuration incomplete (EMAIL_SENDER/EMAIL_PASSWORD/EMAIL_RECEIVER). Skipping email.")
+        return
+    message = MIMEText(body)
+    message['Subject'] = subject
+    message['From'] = EMAIL_SENDER
+    message['To'] = EMAIL_RECEIVER
+    try:
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+            server.starttls()
+            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
+            server.sendmail(EMAIL_SENDER, EMAIL_RECEIVER, message.as_string())
+        print(f"Email sent successfully to {EMAIL_RECEIVER}")
+    except Exception as e:
+        print(f"Error sending email: {e}")
+
+def format_signals(signals):
+    """Subject and body for one batch of signals."""
+    symbols = sorted({symbol for _, symbol, *_ in signals})
+    subject = f"Grid alert: {len(signals)} signal(s) on {', '.join(symbols[:5])}{' ...' if len(symbols) > 5 else ''}"
+    lines = [f"{side:<4} {symbol:<12} level {level:>14}  price {price:<14g} grid {name}"
+             for name, symbol, side, level, price in signals]
+    return subject, f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n" + "\n".join(lines)
+
+class Notifier:
+    """Shared sink for every grid's signals: one task drains the queue and sends a single email per batch window."""
+
+    def __init__(self, send=send_email, batch_seconds=NOTIFY_BATCH_SECONDS):
+        self.send = send
+        self.batch_seconds = batch_seconds
+        self.queue = asyncio.Queue()
+        self.sent = 0
+
+    def publish(self, signals):
+        for signal in signals:
+            self.queue.put_nowait(signal)
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.batch_seconds)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # SMTP is blocking; keep it off the event loop so polling is never delayed
+            await asyncio.to_thread(self.send, *format_signals(batch))
+            self.sent += len(batch)
+
+def print_signals(subject, body):
+    print(f"{subject}\n{body}\n")
+
+# --- Main Loop ---
+
+async def poll_prices(monitor, notifier, interval=POLL_INTERVAL_SECONDS):
+    """Feeds the monitor from the bulk ticker endpoint (one request per MAX_SYMBOLS_PER_REQUEST symbols).
+
+    Symbols the exchange does not list are not polled: one of them would fail the whole bulk request.
+    """
+    if monitor.unlisted:
+        print(f"Not polling {', '.join(sorted(monitor.unlisted))}: not listed on the exchange.", file=sys.stderr)
+    polled = [symbol for symbol in monitor.symbols if symbol not in monitor.unlisted]
+    batches = [polled[i:i + MAX_SYMBOLS_PER_REQUEST] for i in range(0, len(polled), MAX_SYMBOLS_PER_REQUEST)]
+    polls, dispatch_seconds, next_status = 0, 0.0, time.monotonic() + STATUS_INTERVAL_SECONDS
+    while True:
+        started = time.monotonic()
+        for prices in await asyncio.gather(*(asyncio.to_thread(fetch_bulk_prices, batch) for batch in batches)):
+            if prices:
+                dispatch_started = time.perf_counter()
+                notifier.publish(monitor.on_prices(prices))
+                dispatch_seconds += time.perf_counter() - dispatch_started
+        polls += 1
+        if started >= next_status:
+            print(f"[{time.strftime('%H:%M:%S')}] {polls} polls, {notifier.sent} signals sent, "
+                  f"dispatch {dispatch_seconds / polls * 1e6:.0f} us/poll for {len(polled)} symbols")
+            next_status = started + STATUS_INTERVAL_SECONDS
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+async def run_monitor(grids, interval=POLL_INTERVAL_SECONDS, send=send_email):
+    symbols = sorted({symbol for _, symbol, *_ in grids})
+    filters = await asyncio.to_thread(load_filters_for_symbols, symbols)
+    monitor = MultiMonitor(grids, filters)
+    notifier = Notifier(send)
+    print(f"Watching {len(monitor.grids)} grids ({monitor.num_levels} levels) on {len(monitor.symbols)} symbols, "
+          f"poll every {interval}s")
+    await asyncio.gather(poll_prices(monitor, notifier, interval), notifier.run())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor many grids over many symbols in one process.")
+    parser.add_argument("--grids", type=str, required=True,
+                        help="CSV/Parquet file with symbol, min_price, max_price, grids (optional name) per row")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SECONDS, help="Seconds between price polls")
+    parser.add_argument("--no-email", action="store_true", help="Print signals instead of emailing them")
+    args = parser.parse_args()
+
+    grid_rows = load_grids(args.grids)
+    if not grid_rows:
+        sys.exit(1)
+    try:
+        asyncio.run(run_monitor(grid_rows, args.interval, print_signals if args.no_email else send_email))
+    except KeyboardInterrupt:
+        print("Monitor stopped.")
@@ -0,0 +1,203 @@
+import argparse
+import bisect
+import json
+import sys
+
+import numpy as np
+
+from data_sources import http_get
+
+# --- Configuration ---
+
+DEPTH_API_URL = "https://api.binance.com/api/v3/depth"
+DEFAULT_DEPTH_LIMIT = 5000      # Levels per side in the REST snapshot (Binance maximum)
+DEFAULT_TICK_SIZE = 0.01        # Price step used to key the ladders (use the symbol's tickSize, see exchange_filters.py)
+
+# --- Order Book ---
+
+class BookOutOfSync(Exception):
+    """A diff update does not continue the book's update id sequence; reload a snapshot."""
+
+class OrderBook:
+    """Local L2 book: a depth snapshot kept current by Binance-style diff updates.
+
+    Each side is a sorted list of integer tick prices plus a dict of quantities.
+    Changing the quantity of an existing level is O(1); adding or removing a level
+    is O(n) in the side's depth (bisect finds the slot in O(log n), but the list
+    insert/delete shifts the entries after it), which for a few thousand levels is
+    a short memmove. Fill queries use cumulative quantity and notional arrays
+    rebuilt in O(n) on the first query after an update; further queries on the
+    same book version are a binary search.
+    """
+
+    def __init__(self, symbol, tick_size=DEFAULT_TICK_SIZE):
+        self.symbol = symbol
+        self.tick = float(tick_size)
+        self.last_update_id = None
+        self.ticks = {'bids': [], 'asks': []}   # ascending tick prices
+        self.qty = {'bids': {}, 'asks': {}}     # tick -> quantity
+        self.version = 0
+        self._cumulative = {}
+
+    def _tick(self, price):
+        return int(round(float(price) / self.tick))
+
+    def _set(self, side, price, qty):
+        """Sets one level's quantity (0 removes it): O(1) for an existing level, O(n) to add or remove one."""
+        tick, qty = self._tick(price), float(qty)
+        ladder, sizes = self.ticks[side], self.qty[side]
+        if qty > 0:
+            if tick not in sizes:
+                bisect.insort(ladder, tick)
+            sizes[tick] = qty
+        elif sizes.pop(tick, None) is not None:
+            del ladder[bisect.bisect_left(ladder, tick)]
+
+    def load_snapshot(self, snapshot):
+        """Replaces the book with a REST depth snapshot ({'lastUpdateId', 'bids', 'asks'})."""
+        for side in ('bids', 'asks'):
+            sizes = {self._tick(p): float(q) for p, q in snapshot[side] if float(q) > 0}
+            self.qty[side] = sizes
+            self.ticks[side] = sorted(sizes)
+        self.last_update_id = snapshot['lastUpdateId']
+        self.version += 1
+        return self
+
+    def apply_diff(self, event):
+        """Applies one depth diff event ({'U', 'u', 'b', 'a'}). False if it is older than the book.
+
+        Raises BookOutOfSync if updates were missed between the book and this event.
+        """
+        first_id, last_id = event['U'], event['u']
+        if last_id <= self.last_update_id:
+            return False
+        if first_id > self.last_update_id + 1:
+            raise BookOutOfSync(f"{self.symbol}: update {first_id} after {self.last_update_id}; missed updates")
+        for price, qty in event['b']:
+            self._set('bids', price, qty)
+        for price, qty in event['a']:
+            self._set('asks', price, qty)
+        self.last_update_id = last_id
+        self.version += 1
+        return True
+
+    def best_bid(self):
+        return self.ticks['bids'][-1] * self.tick if self.ticks['bids'] else None
+
+    def best_ask(self):
+        return self.ticks['asks'][0] * self.tick if self.ticks['asks'] else None
+
+    def mid(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        return (bid + ask) / 2 if bid is not None and ask is not None else None
+
+    def _levels(self, side):
+        """(prices, cumulative qty, cumulative notional), best price first; O(n) to build, cached until the next update."""
+        cached = self._cumulative.get(side)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        ladder = self.ticks[side] if side == 'asks' else self.ticks[side][::-1]
+        prices = np.array(ladder, dtype=np.float64) * self.tick
+        sizes = np.array([self.qty[side][t] for t in ladder], dtype=np.float64)
+        levels = (prices, np.cumsum(sizes), np.cumsum(prices * sizes))
+        self._cumulative[side] = (self.version, levels)
+        return levels
+
+    def fill_price(self, side, qty):
+        """Average price for a market order of `qty` base units ('BUY' walks the asks, 'SELL' the bids).
+
+        None if the book does not hold that much. Accepts an array of quantities.
+        """
+        prices, cum_qty, cum_notional = self._levels('asks' if side == 'BUY' else 'bids')
+        qty = np.asarray(qty, dtype=np.float64)
+        if not len(prices):
+            return None if qty.ndim == 0 else np.full(qty.shape, np.nan)
+        # Index of the level where the order is completed
+        i = np.minimum(np.searchsorted(cum_qty, qty, side='left'), len(prices) - 1)
+        prev_qty = np.where(i > 0, cum_qty[i - 1], 0.0)
+        prev_notional = np.where(i > 0, cum_notional[i - 1], 0.0)
+        notional = prev_notional + (qty - prev_qty) * prices[i]
+        avg = np.where((qty > 0) & (qty <= cum_qty[-1]), notional / np.where(qty > 0, qty, 1.0), np.nan)
+        if avg.ndim == 0:
+            return None if np.isnan(avg) else float(avg)
+        return avg
+
+    def slippage_bps(self, side, qty):
+        """Cost of filling `qty` versus the best price, in basis points (positive = worse)."""
+        best = self.best_ask() if side == 'BUY' else self.best_bid()
+        avg = self.fill_price(side, qty)
+        if best is None or avg is None:
+            return None if np.ndim(qty) == 0 else np.full(np.shape(qty), np.nan)
+        sign = 1.0 if side == 'BUY' else -1.0
+        return sign * (np.asarray(avg) - best) / best * 1e4
+
+# --- Sources ---
+
+def fetch_depth_snapshot(symbol, limit=DEFAULT_DEPTH_LIMIT):
+    """One REST depth snapshot, or None on error."""
+    try:
+        response = http_get(DEPTH_API_URL, params={'symbol': symbol, 'limit': limit}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"Error fetching order book for {symbol}: {e}", file=sys.stderr)
+        return None
+
+def load_order_book(symbol, tick_size=DEFAULT_TICK_SIZE, limit=DEFAULT_DEPTH_LIMIT):
+    snapshot = fetch_depth_snapshot(symbol, limit)
+    return OrderBook(symbol, tick_size).load_snapshot(snapshot) if snapshot is not None else None
+
+def apply_stream(book, events):
+    """Feeds diff events (decoded depthUpdate messages from a websocket or a replay file) into the book.
+
+    Events older than the book are skipped. Returns the number applied; raises BookOutOfSync on a gap.
+    """
+    return sum(book.apply_diff(event) for event in events)
+
+def replay_book(path, tick_size=DEFAULT_TICK_SIZE):
+    """Builds a book from a JSON-lines replay file: the snapshot on the first line, diff events after it."""
+    with open(path) as f:
+        snapshot = json.loads(f.readline())
+        book = OrderBook(snapshot.get('symbol', ''), tick_size).load_snapshot(snapshot)
+        apply_stream(book, (json.loads(line) for line in f if line.strip()))
+    return book
+
+# --- Grid Plans ---
+
+def plan_slippage(plan, book):
+    """Expected slippage (bps) of every plan row if it were filled against the current book's depth.
+
+    BUY rows are sized by the quote they spend, SELL rows by their base quantity.
+    The book's impact profile (cost of a given size relative to the touch) is
+    applied to each level, i.e. depth is assumed to look the same when price
+    gets there. NaN where the book is too thin to fill the row.
+    """
+    slippage = np.full(len(plan), np.nan)
+    best_ask = book.best_ask()
+    is_buy, is_sell = plan.is_buy, plan.is_sell
+    if is_buy.any() and best_ask:
+        slippage[is_buy] = book.slippage_bps('BUY', plan.quote_qty[is_buy] / best_ask)
+    if is_sell.any():
+        slippage[is_sell] = book.slippage_bps('SELL', plan.base_qty[is_sell])
+    return slippage
+
+# --- Main Execution ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Average fill price and slippage for order sizes against a local order book.")
+    parser.add_argument("--symbol", type=str, default="BTCUSDT")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="JSON-lines replay file (snapshot, then diff events) instead of a live snapshot")
+    parser.add_argument("--qty", type=float, nargs='+', default=[0.01, 0.1, 1, 10], help="Base quantities to price")
+    args = parser.parse_args()
+
+    order_book = replay_book(args.replay) if args.replay else load_order_book(args.symbol.upper())
+    if order_book is None:
+        sys.exit(1)
+    print(f"{order_book.symbol}: bid {order_book.best_bid()}, ask {order_book.best_ask()}, "
+          f"{len(order_book.ticks['bids'])} bid / {len(order_book.ticks['asks'])} ask levels")
+    for order_side in ('BUY', 'SELL'):
+        avg_prices = order_book.fill_price(order_side, args.qty)
+        slips = order_book.slippage_bps(order_side, args.qty)
+        for q, avg_price, slip in zip(args.qty, avg_prices, slips):
+            print(f"  {order_side:<4} {q:>12g}: " + (f"avg {avg_price:.2f} ({slip:+.2f} bps)" if avg_price == avg_price else "book too thin"))
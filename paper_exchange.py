@@ -0,0 +1,437 @@
+import heapq
+import itertools
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from kline_store import INTERVAL_MS, resample_ohlcv
+
+# --- Configuration ---
+
+DEFAULT_SYMBOL = 'BTC/USDT'
+DEFAULT_TIMEFRAME = '1m'
+DEFAULT_FEE_RATE = 0.001  # 0.1% per fill, charged on the received asset (Binance spot default)
+DEFAULT_BALANCES = {'BTC': 1.0, 'USDT': 100000.0}
+
+# Kline layout used everywhere in this module (same as ccxt fetch_ohlcv rows)
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+TIMEFRAME_MS = INTERVAL_MS
+
+# Bars scanned per numpy search while fast-forwarding through quiet stretches
+SEARCH_CHUNK = 4096
+
+# --- Errors (same names as the ccxt exception classes the scripts would catch) ---
+
+class ExchangeError(Exception):
+    """Base error raised by the paper exchange."""
+
+class InsufficientFunds(ExchangeError):
+    """Not enough free balance to reserve for the order."""
+
+class OrderNotFound(ExchangeError):
+    """Unknown order id."""
+
+class InvalidOrder(ExchangeError):
+    """Order parameters rejected (bad amount, price, symbol or side)."""
+
+# --- Kline Helpers ---
+
+def load_klines(path):
+    """Loads klines from a .npy array or a Binance/ccxt CSV export into an (N, 6) float array."""
+    if path.endswith('.npy'):
+        klines = np.load(path)
+    else:
+        with open(path) as f:
+            first_line = f.readline()
+        # Binance data dumps have no header, ccxt exports usually do
+        skiprows = 0 if first_line[:1].isdigit() else 1
+        klines = np.loadtxt(path, delimiter=',', usecols=range(6), skiprows=skiprows, ndmin=2)
+    klines = np.asarray(klines, dtype=np.float64)[:, :6]
+    # Binance spot dumps switched to microsecond timestamps in 2025
+    if len(klines) and klines[0, TS] > 1e14:
+        klines[:, TS] = np.floor(klines[:, TS] / 1000)
+    return klines[np.argsort(klines[:, TS], kind='stable')]
+
+def kline_timeframe(klines):
+    """Timeframe name matching the klines' typical bar spacing (the median, so gaps do not matter), or None."""
+    ts = np.asarray(klines, dtype=np.float64)[:, TS]
+    if len(ts) < 2:
+        return None
+    spacing = int(np.median(np.diff(ts)))
+    return next((name for name, ms in TIMEFRAME_MS.items() if ms == spacing), None)
+
+def generate_random_klines(num_bars, start_price=60000.0, timeframe=DEFAULT_TIMEFRAME,
+                           volatility=0.0008, start_ms=1_700_000_000_000, seed=None):
+    """Generates GBM-like klines for benchmarks when no recorded data is available."""
+    rng = np.random.default_rng(seed)
+    interval_ms = TIMEFRAME_MS[timeframe]
+    log_returns = rng.normal(0.0, volatility, num_bars)
+    close = start_price * np.exp(np.cumsum(log_returns))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, num_bars))) * close
+    klines = np.empty((num_bars, 6))
+    klines[:, TS] = start_ms + np.arange(num_bars) * interval_ms
+    klines[:, OPEN] = open_
+    klines[:, HIGH] = np.maximum(open_, close) + wick[0]
+    klines[:, LOW] = np.minimum(open_, close) - wick[1]
+    klines[:, CLOSE] = close
+    klines[:, VOLUME] = rng.gamma(2.0, 5.0, num_bars)
+    return klines
+
+def _iso8601(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+# --- Paper Exchange ---
+
+class PaperExchange:
+    """Local stand-in for a ccxt exchange, driven by replayed klines.
+
+    Resting limit orders sit in price-time priority books (one heap per side).
+    Each replayed bar fills every resting order its High/Low range crosses, at the
+    order price, or at the bar open when the market gapped through it. Marketable
+    limit orders fill immediately at the last price.
+    """
+
+    def __init__(self, klines, symbol=DEFAULT_SYMBOL, timeframe=DEFAULT_TIMEFRAME,
+                 balances=None, fee_rate=DEFAULT_FEE_RATE, start_index=0):
+        self.klines = np.ascontiguousarray(klines, dtype=np.float64)
+        if self.klines.ndim != 2 or self.klines.shape[1] < 6 or len(self.klines) == 0:
+            raise ExchangeError("Klines must be a non-empty (N, 6) array of [ts, open, high, low, close, volume].")
+        spacing = kline_timeframe(self.klines)
+        if len(self.klines) > 1 and spacing != timeframe:
+            raise ExchangeError(f"Klines are spaced as {spacing or 'no known timeframe'}, not {timeframe}.")
+        self.symbol = symbol
+        self.base, self.quote = symbol.split('/')
+        self.timeframe = timeframe
+        self.fee_rate = fee_rate
+        self.rateLimit = 0  # ccxt attribute (ms between requests); nothing to throttle locally
+        self.cursor = min(max(start_index, 0), len(self.klines) - 1)  # index of the latest closed bar
+
+        balances = DEFAULT_BALANCES if balances is None else balances
+        self.free = {self.base: 0.0, self.quote: 0.0}
+        self.used = {self.base: 0.0, self.quote: 0.0}
+        for asset, amount in balances.items():
+            self.free[asset] = float(amount)
+            self.used.setdefault(asset, 0.0)
+
+        self.orders = {}
+        self.trades = []
+        self._bids = []  # (-price, seq, order_id)
+        self._asks = []  # (price, seq, order_id)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+
+    # Market data ---------------------------------------------------
+
+    @property
+    def last_price(self):
+        return self.klines[self.cursor, CLOSE]
+
+    @property
+    def now_ms(self):
+        return int(self.klines[self.cursor, TS])
+
+    def milliseconds(self):
+        """Replay clock, so strategies that timestamp with ccxt's helper stay deterministic."""
+        return self.now_ms
+
+    def _check_symbol(self, symbol):
+        if symbol is not None and symbol != self.symbol:
+            raise InvalidOrder(f"Paper exchange only trades {self.symbol}, got {symbol}.")
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        """Returns bars up to the replay cursor, ccxt style; coarser timeframes are resampled locally."""
+        self._check_symbol(symbol)
+        visible = self.klines[:self.cursor + 1]
+        if timeframe != self.timeframe:
+            if TIMEFRAME_MS.get(timeframe, 0) < TIMEFRAME_MS[self.timeframe]:
+                raise ExchangeError(f"Replay data is {self.timeframe}, cannot serve {timeframe}.")
+            if limit and since is None:
+                # Only resample the tail that can contribute to the last `limit` bars
+                first_ts = visible[-1, TS] - (limit + 1) * TIMEFRAME_MS[timeframe]
+                visible = visible[np.searchsorted(visible[:, TS], first_ts):]
+            visible = resample_ohlcv(visible, timeframe)
+        if since is not None:
+            start = np.searchsorted(visible[:, TS], since, side='left')
+            visible = visible[start:start + limit] if limit else visible[start:]
+        elif limit:
+            visible = visible[-limit:]
+        return visible.tolist()
+
+    def fetch_ticker(self, symbol):
+        """Returns a ccxt-shaped ticker for the latest closed bar (24h stats over the replay window)."""
+        self._check_symbol(symbol)
+        bar = self.klines[self.cursor]
+        day_start = np.searchsorted(self.klines[:, TS], bar[TS] - TIMEFRAME_MS['1d'], side='right')
+        window = self.klines[day_start:self.cursor + 1]
+        return {
+            'symbol': self.symbol,
+            'timestamp': int(bar[TS]),
+            'datetime': _iso8601(bar[TS]),
+            'open': window[0, OPEN],
+            'high': window[:, HIGH].max(),
+            'low': window[:, LOW].min(),
+            'close': bar[CLOSE],
+            'last': bar[CLOSE],
+            'bid': self._best_bid(),
+            'ask': self._best_ask(),
+            'baseVolume': window[:, VOLUME].sum(),
+        }
+
+    # Account -------------------------------------------------------
+
+    def fetch_balance(self, params=None):
+        """Returns free/used/total balances in the ccxt layout."""
+        balance = {'free': dict(self.free), 'used': dict(self.used), 'total': {}}
+        for asset in self.free:
+            total = self.free[asset] + self.used[asset]
+            balance['total'][asset] = total
+            balance[asset] = {'free': self.free[asset], 'used': self.used[asset], 'total': total}
+        return balance
+
+    # Orders --------------------------------------------------------
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, 'limit', 'buy', amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, 'limit', 'sell', amount, price, params)
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        """Places a limit order; marketable orders fill at once at the last price."""
+        self._check_symbol(symbol)
+        if type != 'limit':
+            raise InvalidOrder("Paper exchange only supports limit orders.")
+        if side not in ('buy', 'sell'):
+            raise InvalidOrder(f"Unknown order side '{side}'.")
+        amount, price = float(amount), float(price or 0)
+        if amount <= 0 or price <= 0:
+            raise InvalidOrder(f"Amount and price must be positive (amount={amount}, price={price}).")
+
+        asset, reserve = (self.quote, amount * price) if side == 'buy' else (self.base, amount)
+        if self.free.get(asset, 0.0) < reserve:
+            raise InsufficientFunds(f"Need {reserve:.8f} {asset}, free {self.free.get(asset, 0.0):.8f}.")
+        self.free[asset] -= reserve
+        self.used[asset] += reserve
+
+        order_id = str(next(self._ids))
+        order = {
+            'id': order_id, 'clientOrderId': None,
+            'timestamp': self.now_ms, 'datetime': _iso8601(self.now_ms), 'lastTradeTimestamp': None,
+            'symbol': self.symbol, 'type': 'limit', 'side': side,
+            'price': price, 'amount': amount, 'filled': 0.0, 'remaining': amount,
+            'cost': 0.0, 'average': None, 'status': 'open', 'fee': None, 'trades': [],
+        }
+        self.orders[order_id] = order
+
+        last = self.last_price
+        if (side == 'buy' and price >= last) or (side == 'sell' and price <= last):
+            self._fill(order, last)
+        elif side == 'buy':
+            heapq.heappush(self._bids, (-price, next(self._seq), order_id))
+        else:
+            heapq.heappush(self._asks, (price, next(self._seq), order_id))
+        return dict(order)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        """Cancels an open order and releases its reservation (book entry is dropped lazily)."""
+        order = self._get_order(id)
+        if order['status'] != 'open':
+            raise OrderNotFound(f"Order {id} is {order['status']}, cannot cancel.")
+        asset, reserve = self._reservation(order)
+        self.used[asset] -= reserve
+        self.free[asset] += reserve
+        order['status'] = 'canceled'
+        return dict(order)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        return dict(self._get_order(id))
+
+    def fetch_orders(self, symbol=None, since=None, limit=None, params=None):
+        return self._filter_orders(None, symbol, since, limit)
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        return self._filter_orders('open', symbol, since, limit)
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        return self._filter_orders('closed', symbol, since, limit)
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None):
+        self._check_symbol(symbol)
+        trades = [t for t in self.trades if since is None or t['timestamp'] >= since]
+        return trades[-limit:] if limit else trades
+
+    def _get_order(self, order_id):
+        order = self.orders.get(str(order_id))
+        if order is None:
+            raise OrderNotFound(f"Order {order_id} not found.")
+        return order
+
+    def _filter_orders(self, status, symbol, since, limit):
+        self._check_symbol(symbol)
+        orders = [dict(o) for o in self.orders.values()
+                  if (status is None or o['status'] == status) and (since is None or o['timestamp'] >= since)]
+        return orders[-limit:] if limit else orders
+
+    @staticmethod
+    def _reservation(order):
+        if order['side'] == 'buy':
+            return order['symbol'].split('/')[1], order['remaining'] * order['price']
+        return order['symbol'].split('/')[0], order['remaining']
+
+    # Matching engine -----------------------------------------------
+
+    def _best_bid(self):
+        self._drop_inactive(self._bids)
+        return -self._bids[0][0] if self._bids else None
+
+    def _best_ask(self):
+        self._drop_inactive(self._asks)
+        return self._asks[0][0] if self._asks else None
+
+    def _drop_inactive(self, book):
+        while book and self.orders[book[0][2]]['status'] != 'open':
+            heapq.heappop(book)
+
+    def _fill(self, order, fill_price):
+        """Fills the whole remaining quantity of an order at fill_price."""
+        amount = order['remaining']
+        cost = amount * fill_price
+        fee_cost = (amount if order['side'] == 'buy' else cost) * self.fee_rate
+        asset, reserve = self._reservation(order)
+        self.used[asset] -= reserve
+        if order['side'] == 'buy':
+            self.free[self.quote] += reserve - cost  # refund price improvement
+            self.free[self.base] += amount - fee_cost
+            fee = {'cost': fee_cost, 'currency': self.base}
+        else:
+            self.free[self.quote] += cost - fee_cost
+            fee = {'cost': fee_cost, 'currency': self.quote}
+
+        trade = {
+            'id': str(len(self.trades) + 1), 'order': order['id'],
+            'timestamp': self.now_ms, 'datetime': _iso8601(self.now_ms),
+            'symbol': self.symbol, 'type': 'limit', 'side': order['side'],
+            'price': fill_price, 'amount': amount, 'cost': cost, 'fee': fee,
+        }
+        self.trades.append(trade)
+        order.update({
+            'filled': order['filled'] + amount, 'remaining': 0.0, 'cost': order['cost'] + cost,
+            'average': fill_price, 'status': 'closed', 'fee': fee, 'lastTradeTimestamp': self.now_ms,
+        })
+        order['trades'].append(trade)
+        return trade
+
+    def _match_bar(self, index):
+        """Fills resting orders crossed by bar `index`, best price first, then by arrival."""
+        bar = self.klines[index]
+        fills = []
+        while self._asks:
+            price, _, order_id = self._asks[0]
+            order = self.orders[order_id]
+            if order['status'] != 'open':
+                heapq.heappop(self._asks)
+                continue
+            if price > bar[HIGH]:
+                break
+            heapq.heappop(self._asks)
+            fills.append(self._fill(order, max(price, bar[OPEN])))
+        while self._bids:
+            neg_price, _, order_id = self._bids[0]
+            order = self.orders[order_id]
+            if order['status'] != 'open':
+                heapq.heappop(self._bids)
+                continue
+            if -neg_price < bar[LOW]:
+                break
+            heapq.heappop(self._bids)
+            fills.append(self._fill(order, min(-neg_price, bar[OPEN])))
+        return fills
+
+    def _next_touch(self, start, stop):
+        """Index of the first bar in [start, stop) that can fill the best bid or ask, else stop."""
+        best_bid, best_ask = self._best_bid(), self._best_ask()
+        if best_bid is None and best_ask is None:
+            return stop
+        for chunk_start in range(start, stop, SEARCH_CHUNK):
+            chunk = self.klines[chunk_start:min(chunk_start + SEARCH_CHUNK, stop)]
+            touched = np.zeros(len(chunk), dtype=bool)
+            if best_ask is not None:
+                touched |= chunk[:, HIGH] >= best_ask
+            if best_bid is not None:
+                touched |= chunk[:, LOW] <= best_bid
+            hit = touched.argmax()
+            if touched[hit]:
+                return chunk_start + hit
+        return stop
+
+    def advance(self, num_bars=1, stop_on_fill=True):
+        """Replays up to num_bars bars and returns the trades they produced.
+
+        Bars that cannot touch the best bid/ask are skipped with a vectorized search,
+        so quiet stretches cost almost nothing. With stop_on_fill the replay pauses
+        right after the first bar that filled something, letting the strategy react.
+        """
+        stop = min(self.cursor + 1 + num_bars, len(self.klines))
+        fills = []
+        index = self.cursor + 1
+        while index < stop:
+            index = self._next_touch(index, stop)
+            if index >= stop:
+                break
+            self.cursor = index
+            fills.extend(self._match_bar(index))
+            if fills and stop_on_fill:
+                return fills
+            index += 1
+        self.cursor = max(self.cursor, stop - 1)
+        return fills
+
+    def finished(self):
+        return self.cursor >= len(self.klines) - 1
+
+# --- Benchmark ---
+
+def run_grid_benchmark(exchange, num_levels=20, step_pct=0.5, order_amount=0.001):
+    """Runs a reactive grid (each fill re-posts the opposite order one step away) to the end of the data."""
+    price = exchange.last_price
+    step = price * step_pct / 100
+    for i in range(1, num_levels // 2 + 1):
+        exchange.create_limit_buy_order(exchange.symbol, order_amount, price - i * step)
+        exchange.create_limit_sell_order(exchange.symbol, order_amount, price + i * step)
+    while not exchange.finished():
+        for trade in exchange.advance(len(exchange.klines)):
+            try:
+                if trade['side'] == 'buy':
+                    exchange.create_limit_sell_order(exchange.symbol, order_amount, trade['price'] + step)
+                else:
+                    exchange.create_limit_buy_order(exchange.symbol, order_amount, trade['price'] - step)
+            except InsufficientFunds:
+                pass  # grid ran out of inventory on that side
+    return exchange
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay klines through the paper exchange with a simple grid.")
+    parser.add_argument("--klines", type=str, help="Kline file (.npy or Binance/ccxt CSV). Default: synthetic data")
+    parser.add_argument("--days", type=int, default=180, help="Days of synthetic 1m data when --klines is not given")
+    parser.add_argument("--levels", type=int, default=20, help="Number of grid levels")
+    parser.add_argument("--step-pct", type=float, default=0.5, help="Grid step in percent of start price")
+    args = parser.parse_args()
+
+    klines = load_klines(args.klines) if args.klines else generate_random_klines(args.days * 1440, seed=42)
+    paper = PaperExchange(klines, timeframe=kline_timeframe(klines) or DEFAULT_TIMEFRAME)
+    start_value = paper.free['USDT'] + paper.free['BTC'] * paper.last_price
+
+    started = time.perf_counter()
+    run_grid_benchmark(paper, args.levels, args.step_pct)
+    elapsed = time.perf_counter() - started
+
+    balance = paper.fetch_balance()['total']
+    end_value = balance['USDT'] + balance['BTC'] * paper.last_price
+    print(f"Replayed {len(klines)} bars in {elapsed:.3f}s ({len(klines) / max(elapsed, 1e-9):,.0f} bars/s)")
+    print(f"Fills: {len(paper.trades)}, open orders: {len(paper.fetch_open_orders())}")
+    print(f"Balances: {balance['BTC']:.8f} BTC, {balance['USDT']:.4f} USDT")
+    print(f"Portfolio value: {start_value:.2f} -> {end_value:.2f} USDT")
@@ -0,0 +1,193 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from regime import RegimeClassifier
+
+# --- Configuration ---
+
+CACHE_MAX_ENTRIES = 256         # Indicator results kept (least recently used are evicted)
+VOLATILITY_Z = 1.959964         # Two-sided 95% z-score used by the volatility range
+
+# --- Candles ---
+
+class Candles:
+    """OHLC arrays of one kline frame, plus the data version the indicator cache is keyed by.
+
+    The version is (symbol, interval, last candle, number of candles); the first
+    and last close are added so frames passed without a symbol cannot collide.
+    """
+
+    __slots__ = ('open', 'high', 'low', 'close', 'version')
+
+    def __init__(self, high, low, close, open_=None, symbol='', interval='', last_candle=None):
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.open = self.close if open_ is None else np.asarray(open_, dtype=np.float64)
+        ends = (float(self.close[0]), float(self.close[-1])) if len(self.close) else (None, None)
+        self.version = (symbol, interval, last_candle, len(self.close), *ends)
+
+    def __len__(self):
+        return len(self.close)
+
+    @classmethod
+    def from_dataframe(cls, df, symbol='', interval=''):
+        """From a kline DataFrame with Open/High/Low/Close columns (any capitalisation)."""
+        columns = {str(c).lower(): c for c in df.columns}
+        values = {name: df[columns[name]].to_numpy(dtype=np.float64) for name in ('open', 'high', 'low', 'close')
+                  if name in columns}
+        if 'timestamp' in columns and len(df):
+            last_candle = int(df[columns['timestamp']].iloc[-1])
+        else:
+            last_candle = str(df.index[-1]) if len(df) else None
+        return cls(values['high'], values['low'], values['close'], values.get('open'), symbol, interval, last_candle)
+
+    @classmethod
+    def from_closes(cls, closes, symbol='', interval=''):
+        """From a plain price series (high = low = close)."""
+        closes = np.asarray(closes, dtype=np.float64)
+        return cls(closes, closes, closes, symbol=symbol, interval=interval)
+
+# --- Indicator Cache ---
+
+class IndicatorCache:
+    """Memoized indicator results keyed by (data version, indicator, params), least recently used evicted."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, candles, name, params, compute):
+        key = (candles.version, name, params)
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+indicator_cache = IndicatorCache()
+
+# --- Indicators ---
+
+def true_range(candles):
+    """True range of every candle (NaN for the first, which has no previous close)."""
+    def compute():
+        prev_close = np.r_[np.nan, candles.close[:-1]]
+        tr = np.maximum(candles.high - candles.low,
+                        np.maximum(np.abs(candles.high - prev_close), np.abs(candles.low - prev_close)))
+        tr[:1] = np.nan
+        return tr
+    return indicator_cache.get(candles, 'true_range', (), compute)
+
+def atr(candles, period):
+    """Wilder ATR series, as pandas_ta's default (adjusted EWM with alpha = 1/period); NaN until `period` ranges."""
+    def compute():
+        tr = true_range(candles)
+        out = np.full(len(tr), np.nan)
+        decay, weighted_sum, weight, count = 1.0 - 1.0 / period, 0.0, 0.0, 0
+        for i in range(1, len(tr)):
+            weighted_sum = tr[i] + decay * weighted_sum
+            weight = 1.0 + decay * weight
+            count += 1
+            if count >= period:
+                out[i] = weighted_sum / weight
+        return out
+    return indicator_cache.get(candles, 'atr', (period,), compute)
+
+def latest_atr(candles, period):
+    """Most recent ATR value, or None if there are not enough candles."""
+    if len(candles) < period + 1:
+        return None
+    value = atr(candles, period)[-1]
+    return None if np.isnan(value) else float(value)
+
+def lookback_range(candles, window):
+    """Lowest low and highest high over the last `window` candles."""
+    def compute():
+        return float(candles.low[-window:].min()), float(candles.high[-window:].max())
+    return indicator_cache.get(candles, 'lookback_range', (window,), compute)
+
+def return_volatility(candles, window=None):
+    """Standard deviation of simple close-to-close returns (over the last `window` returns if given)."""
+    def compute():
+        closes = candles.close if window is None else candles.close[-(window + 1):]
+        return float(np.std(np.diff(closes) / closes[:-1]))
+    return indicator_cache.get(candles, 'return_volatility', (window,), compute)
+
+def regime_params(candles, short_window, long_window, base_range, base_density):
+    """(regime, base_range, base_density) at the last candle, from regime.py's classifier."""
+    def compute():
+        classifier = RegimeClassifier(short_window, long_window, base_range=base_range, base_density=base_density)
+        return classifier.fit(candles.close).params_at()
+    return indicator_cache.get(candles, 'regime', (short_window, long_window, base_range, base_density), compute)
+
+# --- Range Algorithms ---
+
+RANGE_ALGORITHMS = {}
+
+def register_range_algorithm(name, **defaults):
+    """Decorator adding fn(candles, current_price, **params) -> (min_price, max_price, info) to the registry."""
+    def decorator(fn):
+        RANGE_ALGORITHMS[name] = (fn, defaults)
+        return fn
+    return decorator
+
+def suggest_range(name, candles, current_price, **params):
+    """Runs a registered range algorithm. Returns (min_price, max_price, info); the prices are None on failure.
+
+    `info` holds the parameters used and the indicator values behind the range.
+    """
+    if name not in RANGE_ALGORITHMS:
+        raise ValueError(f"Unknown range algorithm {name!r} (known: {', '.join(RANGE_ALGORITHMS)})")
+    fn, defaults = RANGE_ALGORITHMS[name]
+    if candles is None or not len(candles) or current_price is None:
+        return None, None, dict(defaults, **params)
+    return fn(candles, current_price, **dict(defaults, **params))
+
+@register_range_algorithm('ATR', period=14, factor=2.0)
+def atr_range(candles, current_price, period, factor):
+    """current_price +/- factor * latest ATR."""
+    value = latest_atr(candles, period)
+    info = {'atr_period': period, 'atr_factor': factor, 'latest_atr': value if value else 'N/A'}
+    if not value:
+        return None, None, info
+    return current_price - factor * value, current_price + factor * value, info
+
+@register_range_algorithm('Historical', lookback=180)
+def historical_range(candles, current_price, lookback):
+    """Lowest low to highest high of the last `lookback` candles (all of them if there are fewer)."""
+    if len(candles) < lookback:
+        print(f"Warning: Not enough historical data ({len(candles)} candles) for lookback {lookback}.", file=sys.stderr)
+    min_price, max_price = lookback_range(candles, min(lookback, len(candles)))
+    return min_price, max_price, {'hist_lookback': lookback}
+
+@register_range_algorithm('volatility', z=VOLATILITY_Z, window=None, density_bounds=(5, 20))
+def volatility_range(candles, current_price, z, window, density_bounds):
+    """current_price * (1 +/- z * return volatility); density shrinks as volatility grows."""
+    if len(candles) < 3:
+        return None, None, {'z': z}
+    volatility = return_volatility(candles, window)
+    base_range = z * volatility
+    base_density = int(np.clip(int(10 / (volatility * 100)) if volatility > 0 else density_bounds[1], *density_bounds))
+    info = {'z': z, 'volatility': volatility, 'base_range': base_range, 'base_density': base_density}
+    return current_price * (1 - base_range), current_price * (1 + base_range), info
+
+@register_range_algorithm('regime', short_window=7, long_window=30, base_range=0.1, base_density=10)
+def regime_range(candles, current_price, short_window, long_window, base_range, base_density):
+    """current_price * (1 +/- range) with range and density adjusted for the trending/ranging regime."""
+    regime, range_frac, density = regime_params(candles, short_window, long_window, base_range, base_density)
+    info = {'regime': regime, 'base_range': range_frac, 'base_density': density}
+    return current_price * (1 - range_frac), current_price * (1 + range_frac), info
@@ -0,0 +1,135 @@
+import numpy as np
+
+# --- Configuration ---
+
+SHORT_WINDOW = 7                # Candles in the short moving average
+LONG_WINDOW = 30                # Candles in the long moving average and the volatility window
+TREND_THRESHOLD = 0.05          # |MA_short - MA_long| / MA_long above this is a trending market
+BASE_RANGE = 0.1                # Grid range (fraction of price) before the regime adjustment
+BASE_DENSITY = 10               # Grid count before the regime adjustment
+# Regime adjustments (range multiplier, density multiplier)
+TRENDING_ADJUST = (0.6, 0.7)
+RANGING_ADJUST = (1.3, 1.4)
+RANGE_BOUNDS = (0.05, 0.3)
+DENSITY_BOUNDS = (8, 25)
+
+TRENDING, RANGING, UNKNOWN = 'trending', 'ranging', 'unknown'
+
+# --- Rolling Features ---
+
+def _rolling_mean(values, window):
+    """Trailing mean over `window` values via cumulative sums (NaN until the window is full)."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.r_[0.0, values])
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+def rolling_features(closes, short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+    """Trend strength and volatility (std of log returns) at every candle, in one vectorized pass."""
+    closes = np.asarray(closes, dtype=np.float64)
+    ma_short = _rolling_mean(closes, short_window)
+    ma_long = _rolling_mean(closes, long_window)
+    trend = np.abs(ma_short - ma_long) / ma_long
+    returns = np.r_[np.nan, np.diff(np.log(closes))]
+    mean_r = _rolling_mean(np.nan_to_num(returns[1:]), long_window - 1)
+    mean_r2 = _rolling_mean(np.nan_to_num(returns[1:]) ** 2, long_window - 1)
+    vol = np.r_[np.nan, np.sqrt(np.maximum(mean_r2 - mean_r ** 2, 0.0))]
+    return trend, vol
+
+# --- Classifier ---
+
+class RegimeClassifier:
+    """Trend/volatility regime for every candle of a series, with grid parameters derived from it.
+
+    Features are computed for the whole history at once and then extended one
+    candle at a time. The range and density for a candle depend only on the
+    features at that candle, never on earlier adjustments, so any timestamp
+    (live or inside a backtest) gets the same answer.
+    """
+
+    _FIELDS = ('timestamps', 'closes', 'trend', 'volatility')
+
+    def __init__(self, short_window=SHORT_WINDOW, long_window=LONG_WINDOW, trend_threshold=TREND_THRESHOLD,
+                 base_range=BASE_RANGE, base_density=BASE_DENSITY):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.trend_threshold = trend_threshold
+        self.base_range = base_range
+        self.base_density = base_density
+        self._size = 0
+        self._buffers = {name: np.empty(0, dtype=np.int64 if name == 'timestamps' else np.float64)
+                         for name in self._FIELDS}
+
+    def __len__(self):
+        return self._size
+
+    # Views of the filled part of each buffer
+    timestamps = property(lambda self: self._buffers['timestamps'][:self._size])
+    closes = property(lambda self: self._buffers['closes'][:self._size])
+    trend = property(lambda self: self._buffers['trend'][:self._size])
+    volatility = property(lambda self: self._buffers['volatility'][:self._size])
+
+    def fit(self, closes, timestamps=None):
+        """Replaces the history and recomputes every feature."""
+        closes = np.asarray(closes, dtype=np.float64)
+        timestamps = np.arange(len(closes)) if timestamps is None else timestamps
+        trend, vol = rolling_features(closes, self.short_window, self.long_window)
+        self._buffers = {'timestamps': np.asarray(timestamps, dtype=np.int64).copy(), 'closes': closes.copy(),
+                         'trend': trend, 'volatility': vol}
+        self._size = len(closes)
+        return self
+
+    def update(self, close, timestamp=None):
+        """Appends one closed candle; only the new candle's features are computed. False if already seen."""
+        if timestamp is None:
+            timestamp = self.timestamps[-1] + 1 if self._size else 0
+        if self._size and timestamp <= self.timestamps[-1]:
+            return False
+        if self._size == len(self._buffers['closes']):  # grow geometrically: appends stay O(1) amortised
+            for name, buf in self._buffers.items():
+                grown = np.empty(max(2 * len(buf), 64), dtype=buf.dtype)
+                grown[:self._size] = buf[:self._size]
+                self._buffers[name] = grown
+        tail = np.r_[self.closes[-self.long_window:], float(close)]
+        trend, vol = rolling_features(tail, self.short_window, self.long_window)
+        for name, value in zip(self._FIELDS, (timestamp, close, trend[-1], vol[-1])):
+            self._buffers[name][self._size] = value
+        self._size += 1
+        return True
+
+    def extend(self, closes, timestamps):
+        """Feeds the candles newer than the last one seen (a full fit if the classifier is empty)."""
+        if not self._size:
+            self.fit(closes, timestamps)
+            return self._size
+        return sum(self.update(close, timestamp) for close, timestamp in zip(closes, timestamps))
+
+    def regimes(self):
+        """Regime label of every candle."""
+        trend = self.trend
+        out = np.full(len(trend), UNKNOWN, dtype=object)
+        known = ~np.isnan(trend)
+        out[known] = np.where(trend[known] > self.trend_threshold, TRENDING, RANGING)
+        return out
+
+    def params_series(self):
+        """(base_range, base_density) arrays for every candle; the unadjusted base where the regime is unknown."""
+        regimes = self.regimes()
+        trending, ranging = regimes == TRENDING, regimes == RANGING
+        range_mult = np.select([trending, ranging], [TRENDING_ADJUST[0], RANGING_ADJUST[0]], 1.0)
+        density_mult = np.select([trending, ranging], [TRENDING_ADJUST[1], RANGING_ADJUST[1]], 1.0)
+        ranges = np.clip(self.base_range * range_mult, *RANGE_BOUNDS)
+        densities = np.clip((self.base_density * density_mult).astype(int), *DENSITY_BOUNDS)
+        return ranges, densities
+
+    def params_at(self, timestamp=None):
+        """(regime, base_range, base_density) in effect at `timestamp` (the latest candle if None)."""
+        i = self._size - 1 if timestamp is None else int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1
+        if i < 0 or np.isnan(self.trend[i]):
+            regime = UNKNOWN
+        else:
+            regime = TRENDING if self.trend[i] > self.trend_threshold else RANGING
+        range_mult, density_mult = {TRENDING: TRENDING_ADJUST, RANGING: RANGING_ADJUST}.get(regime, (1.0, 1.0))
+        return (regime, float(np.clip(self.base_range * range_mult, *RANGE_BOUNDS)),
+                int(np.clip(int(self.base_density * density_mult), *DENSITY_BOUNDS)))
@@ -0,0 +1,83 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pytest
+
+import data_sources
+import kline_store
+from data_sources import RecordingSource, ReplaySource, request_key, set_source
+from kline_store import INTERVAL_MS, KlineStore, fetch_binance_klines
+
+HOUR_MS = INTERVAL_MS['1h']
+RECORDED_AT = 1_700_000_000.0
+
+
+class _KlineHandler(BaseHTTPRequestHandler):
+    """Binance-style /api/v3/klines: one deterministic bar per hour in [startTime, endTime]."""
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        start, end, limit = int(query['startTime']), int(query['endTime']), int(query['limit'])
+        first = -(-start // HOUR_MS) * HOUR_MS
+        rows = [[ts, '1.0', '2.0', '0.5', str(1 + ts / 1e13), '10.0', ts + HOUR_MS - 1]
+                for ts in range(first, end + 1, HOUR_MS)][:limit]
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def kline_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _KlineHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(kline_store, 'KLINE_API_URL', f'http://127.0.0.1:{server.server_port}/api/v3/klines')
+    yield
+    server.shutdown()
+    set_source(None)
+
+
+def _at(monkeypatch, seconds):
+    monkeypatch.setattr(kline_store.time, 'time', lambda: seconds)
+
+
+def test_request_key_ignores_time_window():
+    base = {'symbol': 'BTCUSDT', 'interval': '1h', 'limit': 1000}
+    key_a, canonical_a = request_key('GET', kline_store.KLINE_API_URL, dict(base, startTime=1, endTime=2))
+    key_b, _ = request_key('GET', kline_store.KLINE_API_URL, dict(base, startTime=3, endTime=4))
+    key_c, _ = request_key('GET', kline_store.KLINE_API_URL, dict(base, interval='1d', startTime=1, endTime=2))
+    assert key_a == key_b != key_c
+    assert 'startTime=1' in canonical_a
+
+
+def test_klines_replay_at_a_later_wall_clock_time(tmp_path, monkeypatch, kline_server):
+    start_ms = int(RECORDED_AT * 1000) - 1500 * HOUR_MS  # two pages
+
+    set_source(RecordingSource(str(tmp_path)))
+    _at(monkeypatch, RECORDED_AT)
+    recorded = fetch_binance_klines('BTCUSDT', '1h', start_ms)
+    recording_store = KlineStore('BTCUSDT', '1h', cache_dir=None)
+    assert recording_store.ensure_history('1h', 200)
+    assert len(recorded) == 1500
+
+    set_source(ReplaySource(str(tmp_path)))
+    _at(monkeypatch, RECORDED_AT + 3600.5)
+    replayed = fetch_binance_klines('BTCUSDT', '1h', start_ms + HOUR_MS)
+    np.testing.assert_array_equal(replayed, recorded)
+    replay_store = KlineStore('BTCUSDT', '1h', cache_dir=None)
+    assert replay_store.ensure_history('1h', 200)
+    np.testing.assert_array_equal(replay_store.get('1h'), recording_store.get('1h'))
+
+
+def test_unrecorded_request_is_a_replay_miss(tmp_path):
+    source = ReplaySource(str(tmp_path))
+    with pytest.raises(data_sources.ReplayMiss):
+        source.get('https://api.binance.com/api/v3/ticker/price', params={'symbol': 'ETHUSDT'})
@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import market_data_hub
+import multi_monitor
+from exchange_filters import SymbolFilters
+from market_data_hub import fetch_bulk_prices
+from multi_monitor import MultiMonitor
+
+TICKER_PRICES = {'BTCUSDT': '100.00', 'ETHUSDT': '5.00'}
+
+
+class _TickerHandler(BaseHTTPRequestHandler):
+    """Binance-style /api/v3/ticker/price: a 400 for the whole list if any requested symbol is unknown."""
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        symbols = json.loads(query['symbols']) if 'symbols' in query else list(TICKER_PRICES)
+        if any(symbol not in TICKER_PRICES for symbol in symbols):
+            status, body = 400, json.dumps({'code': -1121, 'msg': 'Invalid symbol.'}).encode()
+        else:
+            status, body = 200, json.dumps([{'symbol': s, 'price': TICKER_PRICES[s]} for s in symbols]).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ticker_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TickerHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(market_data_hub, 'BULK_PRICE_API_URL', f"http://127.0.0.1:{server.server_port}/api/v3/ticker/price")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(multi_monitor, 'ALERT_COOLDOWN_SECONDS', 0)
+    # Levels at 95, 100 and 105; hysteresis 0.5% re-arms BUY:100 at 100.5 and SELL:100 at 99.5
+    return MultiMonitor([('g', 'BTCUSDT', 90, 110, 3)], {'BTCUSDT': SymbolFilters('BTCUSDT', '0.01', '0.00001')})
+
+
+def test_first_price_only_sets_the_band(monitor):
+    assert monitor.on_prices({'BTCUSDT': 101.0}) == []
+    assert (monitor.below[0], monitor.above[0]) == (10000, 10500)
+    assert monitor.on_prices({'XRPUSDT': 1.0}) == []
+
+
+def test_crossings_and_rearm(monitor):
+    gate = monitor.grids[0].gate
+    monitor.on_prices({'BTCUSDT': 101.0})
+    assert monitor.on_prices({'BTCUSDT': 99.0}) == [('g', 'BTCUSDT', 'BUY', '100.00', 99.0)]
+    assert monitor.on_prices({'BTCUSDT': 100.2}) == [('g', 'BTCUSDT', 'SELL', '100.00', 100.2)]
+    # Back through 100 inside the hysteresis band: both keys are still disarmed
+    assert monitor.on_prices({'BTCUSDT': 99.8}) == []
+    assert monitor.on_prices({'BTCUSDT': 100.2}) == []
+    # No level crossed, but 100.6 clears BUY:100's re-arm price
+    assert monitor.rearm_up[0] == pytest.approx(100.5)
+    assert monitor.on_prices({'BTCUSDT': 100.6}) == []
+    assert gate.is_armed('BUY:100.00') and not gate.is_armed('SELL:100.00')
+    assert monitor.on_prices({'BTCUSDT': 99.9}) == [('g', 'BTCUSDT', 'BUY', '100.00', 99.9)]
+
+
+def test_unlisted_symbols_are_not_polled():
+    filters = {'BTCUSDT': SymbolFilters('BTCUSDT', '0.01', '0.00001')}
+    monitor = MultiMonitor([('a', 'BTCUSDT', 90, 110, 3), ('b', 'BTCUSDX', 90, 110, 3)], filters)
+    assert monitor.unlisted == {'BTCUSDX'}
+    # Without any filters (exchangeInfo unreachable) every symbol is still polled
+    assert MultiMonitor([('b', 'BTCUSDX', 90, 110, 3)], {}).unlisted == set()
+
+
+def test_bulk_prices_fall_back_when_a_symbol_is_invalid(ticker_server):
+    assert fetch_bulk_prices(['BTCUSDT', 'ETHUSDT']) == {'BTCUSDT': 100.0, 'ETHUSDT': 5.0}
+    assert fetch_bulk_prices(['BTCUSDT', 'BTCUSDX']) == {'BTCUSDT': 100.0}
+    assert fetch_bulk_prices(['BTCUSDX']) is None
@@ -0,0 +1,145 @@
+import atexit
+import glob
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# --- Configuration ---
+
+DEFAULT_LOG_DIR = 'tick_logs'
+FLUSH_ROWS = 1024               # Rows buffered in memory before a chunk is compressed and written
+FLUSH_SECONDS = 60              # ... or this long after the first buffered row, whichever comes first
+ROTATE_SECONDS = 86400          # Start a new file after this long
+ROTATE_BYTES = 64 * 1024 * 1024 # ... or once the file is this large
+COMPRESS_LEVEL = 6
+
+# Event types and price sources stored with each row
+EVENT_TICK, EVENT_BUY, EVENT_SELL = 0, 1, 2
+SOURCES = {'unknown': 0, 'hub': 1, 'http': 2, 'hedged': 3, 'replay': 4}
+
+# Columns in file order
+COLUMNS = (('ts', np.int64), ('price', np.float64), ('level', np.float64),
+           ('latency_ms', np.float32), ('source', np.uint8), ('event', np.uint8))
+
+FILE_MAGIC = b'GTRK\x01'
+CHUNK_HEADER = struct.Struct('<I' + 'I' * len(COLUMNS))  # row count, compressed size of each column
+FILE_SUFFIX = '.gtrk'
+
+# --- Writer ---
+
+class TickRecorder:
+    """Appends ticks and signals to a compressed, columnar, append-only log.
+
+    Rows go into preallocated arrays (a few assignments per call). When the
+    buffer fills or ages, each column is zlib-compressed and written as one
+    chunk, so a crash loses at most the unflushed buffer and every complete
+    chunk stays readable. Files rotate by age or size.
+    """
+
+    def __init__(self, directory=DEFAULT_LOG_DIR, prefix='ticks', flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS,
+                 rotate_seconds=ROTATE_SECONDS, rotate_bytes=ROTATE_BYTES):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rotate_seconds = rotate_seconds
+        self.rotate_bytes = rotate_bytes
+        self.buffers = {name: np.empty(flush_rows, dtype=dtype) for name, dtype in COLUMNS}
+        self.size = 0
+        self.first_buffered = None
+        self.file = None
+        self.file_opened = None
+        self.path = None
+        atexit.register(self.close)  # e.g. Ctrl+C out of a monitor loop still writes the buffer
+
+    def record_tick(self, price, source='unknown', latency_ms=0.0, ts=None):
+        self._append(EVENT_TICK, price, np.nan, source, latency_ms, ts)
+
+    def record_signal(self, side, level, price, source='unknown', latency_ms=0.0, ts=None):
+        """Records a signal and flushes, so the ticks leading up to it are on disk right away."""
+        self._append(EVENT_BUY if side == 'BUY' else EVENT_SELL, price, level, source, latency_ms, ts)
+        self.flush()
+
+    def _append(self, event, price, level, source, latency_ms, ts):
+        now = time.time()
+        i = self.size
+        b = self.buffers
+        b['ts'][i] = int(now * 1000) if ts is None else ts
+        b['price'][i] = price
+        b['level'][i] = level
+        b['latency_ms'][i] = latency_ms
+        b['source'][i] = SOURCES.get(source, 0)
+        b['event'][i] = event
+        self.size = i + 1
+        if self.first_buffered is None:
+            self.first_buffered = now
+        if self.size == self.flush_rows or now - self.first_buffered >= self.flush_seconds:
+            self.flush()
+
+    def _open_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+        self.path = os.path.join(self.directory, f"{self.prefix}-{stamp}{FILE_SUFFIX}")
+        self.file = open(self.path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+        self.file_opened = time.time()
+
+    def flush(self):
+        """Compresses the buffered rows into one chunk and writes it."""
+        if not self.size:
+            return
+        if self.file is not None and (time.time() - self.file_opened >= self.rotate_seconds
+                                      or self.file.tell() >= self.rotate_bytes):
+            self.file.close()
+            self.file = None
+        if self.file is None:
+            self._open_file()
+        blobs = [zlib.compress(self.buffers[name][:self.size].tobytes(), COMPRESS_LEVEL) for name, _ in COLUMNS]
+        self.file.write(CHUNK_HEADER.pack(self.size, *(len(blob) for blob in blobs)) + b''.join(blobs))
+        self.file.flush()
+        self.size = 0
+        self.first_buffered = None
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- Reader ---
+
+def read_log(path):
+    """Loads one log file as a dict of NumPy arrays (one per column). A truncated last chunk is ignored."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(FILE_MAGIC):
+        raise ValueError(f"{path} is not a tick log.")
+    parts = {name: [] for name, _ in COLUMNS}
+    offset = len(FILE_MAGIC)
+    while offset + CHUNK_HEADER.size <= len(data):
+        rows, *sizes = CHUNK_HEADER.unpack_from(data, offset)
+        end = offset + CHUNK_HEADER.size + sum(sizes)
+        if end > len(data):
+            break
+        offset += CHUNK_HEADER.size
+        for (name, dtype), size in zip(COLUMNS, sizes):
+            parts[name].append(np.frombuffer(zlib.decompress(data[offset:offset + size]), dtype=dtype, count=rows))
+            offset += size
+    return {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+            for (name, dtype), chunks in zip(COLUMNS, parts.values())}
+
+def read_logs(directory=DEFAULT_LOG_DIR, prefix='ticks'):
+    """All of a recorder's files, oldest first, concatenated into one dict of arrays."""
+    logs = [read_log(path) for path in sorted(glob.glob(os.path.join(directory, f"{prefix}-*{FILE_SUFFIX}")))]
+    return {name: np.concatenate([log[name] for log in logs]) if logs else np.empty(0, dtype=dtype)
+            for name, dtype in COLUMNS}
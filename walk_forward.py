@@ -0,0 +1,220 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import grid_planner as planner
+from minute_store import DAY_MS, get_minute_store, intrabar_path
+from monte_carlo import bars_to_path, plan_to_slots, simulate_slots
+
+# --- Configuration ---
+
+DEFAULT_YEARS = 3               # Years of daily history to walk through
+REBALANCE_DAYS = 30             # A new range is computed every N days and traded until the next one
+STARTING_CAPITAL_USDT = 10000.0 # Notional account, split 50/50 between BTC and USDT at each rebalance
+WALK_FORWARD_CACHE_DIR = '.walk_forward_cache'
+ALGORITHMS = ['ATR', 'Historical']
+# Each rebalance only sees a fixed trailing window, so a window's inputs (and cache key) do not
+# change when the overall history is fetched from a later start date
+TRAIN_BARS = max(planner.HISTORICAL_LOOKBACK_DAYS, 10 * planner.ATR_PERIOD)
+
+# --- Window Evaluation ---
+
+def _test_days_ms(df_test):
+    """UTC day start (ms) of each daily bar; the planner's frames are indexed by bar close time."""
+    close_ms = (df_test.index - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+    return (np.asarray(close_ms, dtype=np.int64) // DAY_MS) * DAY_MS
+
+def _window_key(algorithm, df_train, df_test, params, minute_days=None):
+    """Cache key: algorithm, parameters, the exact bars the window saw and which test days had 1m data."""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([algorithm, params, minute_days], sort_keys=True).encode())
+    for frame in (df_train, df_test):
+        digest.update(frame[['Open', 'High', 'Low', 'Close']].to_numpy(dtype=np.float64).tobytes())
+        digest.update(str(frame.index[-1]).encode())
+    return digest.hexdigest()
+
+def suggest_window_range(algorithm, df_train, current_price):
+    """Runs one of the planner's range algorithms on the data available at the rebalance."""
+    if algorithm == 'ATR':
+        min_price, max_price, _ = planner.suggest_range_atr(df_train, current_price, planner.ATR_PERIOD, planner.ATR_FACTOR)
+    else:
+        min_price, max_price = planner.suggest_range_historical(df_train, planner.HISTORICAL_LOOKBACK_DAYS)
+    return min_price, max_price
+
+def evaluate_window(job):
+    """Plans a grid at the end of df_train and trades it through df_test. Returns a result dict."""
+    algorithm, df_train, df_test, capital, intrabar, filters = job
+    current_price = float(df_train['Close'].iloc[-1])
+    result = {'algorithm': algorithm, 'start': str(df_test.index[0]), 'end': str(df_test.index[-1]),
+              'pnl_pct': None, 'excess_pct': None, 'fills': 0, 'in_range_pct': None, 'broke_out': None,
+              'intrabar_days': 0}
+
+    min_price, max_price = suggest_window_range(algorithm, df_train.copy(), current_price)
+    if min_price is None or max_price is None or min_price >= max_price:
+        return result
+    num_grids = planner.suggest_total_grids(min_price, max_price, planner.TARGET_PROFIT_PER_GRID_PCT, planner.FEE_PCT)
+    if num_grids is None:
+        return result
+    user_btc, user_usdt = capital / 2 / current_price, capital / 2
+    plan, _, _ = planner.generate_grid_plan(min_price, max_price, num_grids, current_price, user_btc, user_usdt, filters)
+    if not plan:
+        return result
+
+    slots = plan_to_slots(plan)
+    if intrabar:
+        # Replay the 1m bars of every day that touched a slot price, so fills within a day happen in true order
+        lower, upper = slots[0], slots[1]
+        levels = np.union1d(lower[np.isfinite(lower)], upper[np.isfinite(upper)])
+        path, result['intrabar_days'] = intrabar_path(get_minute_store(planner.SYMBOL), _test_days_ms(df_test),
+                                                      df_test['Open'], df_test['High'], df_test['Low'], df_test['Close'],
+                                                      levels)
+        path = path[None, :]
+    else:
+        path = bars_to_path(df_test['Open'], df_test['High'], df_test['Low'], df_test['Close'])[None, :]
+    base, quote, fills = simulate_slots(path, *slots, fee_pct=planner.FEE_PCT)
+    final_price = float(df_test['Close'].iloc[-1])
+    _, _, holds_base, base_qty, quote_qty = slots
+    initial_base, initial_quote = base_qty[holds_base].sum(), quote_qty[~holds_base].sum()
+    initial_value = initial_quote + initial_base * current_price
+    final_value = quote[0] + base[0] * final_price
+    hold_value = initial_quote + initial_base * final_price
+    closes = df_test['Close'].to_numpy()
+
+    result.update({
+        'min_price': float(min_price), 'max_price': float(max_price), 'num_grids': int(num_grids),
+        'pnl_pct': float((final_value / initial_value - 1) * 100),
+        'excess_pct': float((final_value - hold_value) / initial_value * 100),
+        'fills': int(fills[0]),
+        'in_range_pct': float(((closes >= min_price) & (closes <= max_price)).mean() * 100),
+        'broke_out': bool(df_test['Low'].min() < min_price or df_test['High'].max() > max_price),
+    })
+    return result
+
+# --- Walk-Forward Driver ---
+
+def build_jobs(df_history, rebalance_days, capital, algorithms, intrabar=False, filters=None):
+    """Rolling windows: each rebalance sees the previous TRAIN_BARS bars and trades the next rebalance_days bars.
+
+    Rebalance dates are pinned to the calendar (day number divisible by rebalance_days),
+    so reruns on a longer or later history line up with the cached windows.
+    """
+    day_numbers = ((df_history.index - pd.Timestamp(0)) // pd.Timedelta(days=1)).to_numpy()
+    jobs = []
+    for start in range(TRAIN_BARS, len(df_history) - rebalance_days + 1):
+        if day_numbers[start] % rebalance_days:
+            continue
+        df_train = df_history.iloc[start - TRAIN_BARS:start]
+        df_test = df_history.iloc[start:start + rebalance_days]
+        for algorithm in algorithms:
+            jobs.append((algorithm, df_train, df_test, capital, intrabar, filters))
+    return jobs
+
+def run_walk_forward(df_history, rebalance_days=REBALANCE_DAYS, capital=STARTING_CAPITAL_USDT,
+                     algorithms=ALGORITHMS, workers=None, cache_dir=WALK_FORWARD_CACHE_DIR, intrabar=False):
+    """Evaluates every (window, algorithm) pair in parallel, reusing cached windows. Returns result dicts.
+
+    With intrabar=True, days that touched a grid price are replayed from the local
+    1m store (see minute_store.py) instead of guessing the order within the daily bar.
+    """
+    # Loaded once here rather than in every worker; whether (and how) plans were snapped is part of the cache key
+    filters = planner.load_plan_filters()
+    jobs = build_jobs(df_history, rebalance_days, capital, algorithms, intrabar, filters)
+    params = {'atr_period': planner.ATR_PERIOD, 'atr_factor': planner.ATR_FACTOR,
+              'lookback': planner.HISTORICAL_LOOKBACK_DAYS, 'target_pct': planner.TARGET_PROFIT_PER_GRID_PCT,
+              'fee_pct': planner.FEE_PCT, 'capital': capital, 'intrabar': intrabar,
+              'snap': filters.to_dict() if filters else None}
+    store = get_minute_store(planner.SYMBOL) if intrabar else None
+    keys = [_window_key(job[0], job[1], job[2], params,
+                        [store.has_day(day) for day in _test_days_ms(job[2])] if store else None)
+            for job in jobs]
+
+    results = [None] * len(jobs)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for i, key in enumerate(keys):
+            path = os.path.join(cache_dir, f"{key}.json")
+            if os.path.exists(path):
+                try:
+                    with open(path) as f:
+                        results[i] = json.load(f)
+                except (OSError, ValueError):
+                    pass
+    todo = [i for i, r in enumerate(results) if r is None]
+    print(f"Walk-forward: {len(jobs)} windows, {len(jobs) - len(todo)} cached, {len(todo)} to compute")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, result in zip(todo, pool.map(evaluate_window, [jobs[i] for i in todo], chunksize=4)):
+                results[i] = result
+                if cache_dir:
+                    with open(os.path.join(cache_dir, f"{keys[i]}.json"), 'w') as f:
+                        json.dump(result, f)
+    return results
+
+def summarize(results):
+    """Per-algorithm statistics over all windows that produced a plan."""
+    summary = {}
+    for algorithm in sorted({r['algorithm'] for r in results}):
+        done = [r for r in results if r['algorithm'] == algorithm and r['pnl_pct'] is not None]
+        if not done:
+            summary[algorithm] = {'windows': 0}
+            continue
+        pnl = np.array([r['pnl_pct'] for r in done])
+        summary[algorithm] = {
+            'windows': len(done),
+            'mean_pnl_pct': pnl.mean(),
+            'median_pnl_pct': np.median(pnl),
+            'compounded_pct': (np.prod(1 + pnl / 100) - 1) * 100,
+            'win_rate': (pnl > 0).mean(),
+            'mean_excess_pct': np.mean([r['excess_pct'] for r in done]),
+            'mean_fills': np.mean([r['fills'] for r in done]),
+            'mean_in_range_pct': np.mean([r['in_range_pct'] for r in done]),
+            'breakout_rate': np.mean([r['broke_out'] for r in done]),
+        }
+    return summary
+
+def display_summary(summary, rebalance_days):
+    print("\n" + "="*60)
+    print(f"--- Walk-Forward Comparison (rebalance every {rebalance_days} days) ---")
+    for algorithm, stats in summary.items():
+        print("-"*60)
+        print(f"{algorithm}:")
+        if not stats['windows']:
+            print("  No window produced a plan.")
+            continue
+        print(f"  Windows: {stats['windows']}, Win Rate: {stats['win_rate']:.0%}")
+        print(f"  PnL/Window: mean {stats['mean_pnl_pct']:+.2f}%, median {stats['median_pnl_pct']:+.2f}%, "
+              f"compounded {stats['compounded_pct']:+.2f}%")
+        print(f"  vs. Holding: {stats['mean_excess_pct']:+.2f}% per window")
+        print(f"  Fills/Window: {stats['mean_fills']:.1f}, Closes In Range: {stats['mean_in_range_pct']:.0f}%, "
+              f"Breakout Rate: {stats['breakout_rate']:.0%}")
+    print("="*60)
+
+# --- Main Execution ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward comparison of the planner's range algorithms.")
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS, help=f"Years of daily history (default: {DEFAULT_YEARS})")
+    parser.add_argument("--rebalance", type=int, default=REBALANCE_DAYS, help=f"Days between rebalances (default: {REBALANCE_DAYS})")
+    parser.add_argument("--capital", type=float, default=STARTING_CAPITAL_USDT, help="Notional capital per window in USDT")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every window")
+    parser.add_argument("--intrabar", action="store_true",
+                        help="Resolve fills within daily bars from the local 1m store (build it with minute_store.py)")
+    args = parser.parse_args()
+
+    df_history = planner.get_historical_data(planner.SYMBOL, '1d', args.years * 365)
+    if df_history is None or len(df_history) < TRAIN_BARS + 2 * args.rebalance:
+        print("Not enough historical data for a walk-forward run. Exiting.", file=sys.stderr)
+        sys.exit(1)
+    df_history = df_history.iloc[:-1] # Drop the still-open daily bar
+
+    results = run_walk_forward(df_history, args.rebalance, args.capital, workers=args.workers,
+                               cache_dir=None if args.no_cache else WALK_FORWARD_CACHE_DIR, intrabar=args.intrabar)
+    display_summary(summarize(results), args.rebalance)